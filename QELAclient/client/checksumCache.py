@@ -0,0 +1,103 @@
+'''
+Persistent cache of file checksums
+
+Checksums are stored in an sqlite database keyed by
+(path, size, mtime, inode), so an unchanged file is only hashed once.
+'''
+import os
+import sqlite3
+
+import client
+from client import hashing
+
+N_BATCH = 500  # max. number of sql variables per query
+# increase if tables change:
+VERSION = 2
+
+
+def fileStat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime, st.st_ino
+
+
+class ChecksumCache(object):
+    '''
+    sqlite connections cannot be shared between threads,
+    so create this object in the thread that uses it
+    '''
+
+    def __init__(self, path=None):
+        if path is None:
+            path = client.PATH.join('checksums.db')
+        self._db = db = sqlite3.connect(path)
+        if db.execute('PRAGMA user_version').fetchone()[0] != VERSION:
+            db.execute('DROP TABLE IF EXISTS sums')
+            db.execute('PRAGMA user_version=%i' % VERSION)
+        db.execute('''CREATE TABLE IF NOT EXISTS sums (
+                      path TEXT, algorithm TEXT, size INTEGER, mtime REAL,
+                      inode INTEGER, checksum TEXT,
+                      PRIMARY KEY (path, algorithm))''')
+
+    def get(self, paths, stats, algorithm=hashing.DEFAULT):
+        '''
+        return {index: checksum} of all paths that are cached and unchanged
+        stats ... [(size, mtime, inode), ...] as returned by fileStat
+        '''
+        out = {}
+        index = {str(p): i for i, p in enumerate(paths)}
+        keys = list(index)
+        for i in range(0, len(keys), N_BATCH):
+            batch = keys[i:i + N_BATCH]
+            cur = self._db.execute(
+                'SELECT path, size, mtime, inode, checksum FROM sums '
+                'WHERE algorithm=? AND path IN (%s)'
+                % ','.join('?' * len(batch)), [algorithm] + batch)
+            for path, size, mtime, inode, checksum in cur:
+                j = index[path]
+                if stats[j] == (size, mtime, inode):
+                    out[j] = checksum
+        return out
+
+    def put(self, entries, algorithm=hashing.DEFAULT):
+        '''
+        entries ... [(path, (size, mtime, inode), checksum), ...]
+        '''
+        self._db.executemany(
+            'INSERT OR REPLACE INTO sums VALUES (?,?,?,?,?,?)',
+            [(str(p), algorithm) + tuple(st) + (checksum,)
+             for p, st, checksum in entries
+             if st is not None and checksum is not None])
+        self._db.commit()
+
+    def checkSums(self, paths, isCanceled=lambda: False,
+                  algorithm=hashing.DEFAULT, fnProgress=None):
+        '''
+        return checksums of all [paths], only hash files not in cache
+        checksum is None for missing files
+        fnProgress(ndone, ntotal) ... [optional]
+        '''
+        stats = [fileStat(p) for p in paths]
+        out = [None] * len(paths)
+        for i, checksum in self.get(paths, stats, algorithm).items():
+            out[i] = checksum
+        todo = [i for i, st in enumerate(stats)
+                if out[i] is None and st is not None]
+        ncached = len(paths) - len(todo)
+        progress = None
+        if fnProgress is not None:
+            fnProgress(ncached, len(paths))
+
+            def progress(n, _ntotal):
+                fnProgress(ncached + n, len(paths))
+        sums = hashing.hashFiles([paths[i] for i in todo], algorithm,
+                                 fnProgress=progress, isCanceled=isCanceled)
+        for i, checksum in zip(todo, sums):
+            out[i] = checksum
+        self.put([(paths[i], stats[i], out[i]) for i in todo], algorithm)
+        return out
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,256 @@
+'''
+Batched server calls
+
+The client asks the server many small questions one after another
+(isReady, projectName, remainingCredit, userPlan, stateProcessing, ...),
+every one costing a full round trip. BatchedServer wraps the server
+connection and sends several calls with one request:
+
+    server.callBatch([(name, args, kwargs), ...]) -> [(ok, result), ...]
+
+result is the error message if not ok.
+
+* batch(...) sends calls at once and waits for their results
+* later(...) queues a call - all calls queued within one cycle of the
+  event loop are sent together. Requests are sent one after another
+  from one sender thread over the same connection (pipelining), so the
+  GUI is never blocked and the next batch leaves while the results of
+  the last one are still dispatched.
+
+Servers without callBatch (raising AttributeError or NotImplementedError,
+or not returning one result per call) get every call as single request.
+All other attributes are passed to the wrapped server.
+'''
+import queue
+import threading
+import time
+
+from PyQt5 import QtCore
+
+N_BATCH = 50  # max. number of calls per request
+
+
+def callAll(obj, calls):
+    '''
+    execute [calls] one by one
+    return [(ok, result or error message), ...]
+    '''
+    out = []
+    for name, args, kwargs in calls:
+        try:
+            out.append((True, getattr(obj, name)(*args, **kwargs)))
+        except Exception as e:
+            out.append((False, str(e) or type(e).__name__))
+    return out
+
+
+class _Dispatcher(QtCore.QObject):
+    sigResults = QtCore.pyqtSignal(object, object)  # [fn], [(ok, result)]
+
+
+class BatchedServer(object):
+    '''
+    server = BatchedServer(server)
+    project, credit = server.batch(('projectName',), ('remainingCredit',))
+    server.later('userPlan', fn=showPlan)
+    server.later('stateProcessing', fn=showState, ifReady=True)
+    '''
+
+    def __init__(self, server, nmax=N_BATCH):
+        if isinstance(server, BatchedServer):
+            server = server.server
+        self.server = server
+        self.nmax = nmax
+        self._batching = True
+        self._pending = []  # [((name, args, kwargs), fn, ifReady), ...]
+        self._queue = queue.Queue()
+        self._sender = None
+        self._dispatcher = _Dispatcher()
+        self._dispatcher.sigResults.connect(self._dispatch)
+
+    def __getattr__(self, name):
+        # all other calls go directly to the server:
+        return getattr(self.server, name)
+
+    def batch(self, *calls):
+        '''
+        send [calls] with one request and return their results
+        call ... (name, arg0, arg1, ...)
+        '''
+        out = []
+        for ok, result in self._send([(c[0], c[1:], {}) for c in calls]):
+            if not ok:
+                raise Exception(result)
+            out.append(result)
+        return out
+
+    def later(self, name, *args, fn=None, ifReady=False, **kwargs):
+        '''
+        queue a call, send it together with all other calls of this
+        event-loop cycle
+        fn(result) ... [optional] called in the GUI thread
+        ifReady ... only execute the call if server.isReady()
+                    (asked within the same request)
+        '''
+        if not self._pending:
+            QtCore.QTimer.singleShot(0, self.flush)
+        self._pending.append(((name, args, kwargs), fn, ifReady))
+
+    def flush(self):
+        '''
+        send all queued calls now
+        '''
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.nmax):
+            self._queue.put(pending[i:i + self.nmax])
+        if pending and self._sender is None:
+            self._sender = threading.Thread(target=self._run, daemon=True)
+            self._sender.start()
+
+    def _send(self, calls):
+        if self._batching and len(calls) > 1:
+            try:
+                results = self.server.callBatch(calls)
+            except (AttributeError, NotImplementedError):
+                # old server
+                self._batching = False
+            else:
+                if (isinstance(results, (list, tuple)) and
+                        len(results) == len(calls)):
+                    return results
+                # e.g. error message of a server not knowing callBatch:
+                self._batching = False
+        return callAll(self.server, calls)
+
+    def _run(self):
+        while True:
+            pending = self._queue.get()
+            try:
+                fns, results = self._sendPending(pending)
+            except Exception as e:
+                # connection problem
+                fns = [fn for _c, fn, _r in pending]
+                results = [(False, str(e) or type(e).__name__)] * len(fns)
+            self._dispatcher.sigResults.emit(fns, results)
+
+    def _sendPending(self, pending):
+        calls = [c for c, _fn, _r in pending]
+        fns = [fn for _c, fn, _r in pending]
+        if not any(r for _c, _fn, r in pending):
+            return fns, self._send(calls)
+        isReady = ('isReady', (), {})
+        if self._batching:
+            # ask together with all other calls:
+            results = self._send([isReady] + calls)
+            (ok, ready), results = results[0], results[1:]
+        else:
+            (ok, ready), = callAll(self.server, [isReady])
+            results = None
+        if not (ok and ready):
+            # ignore calls only valid if ready:
+            keep = [i for i, (_c, _fn, r) in enumerate(pending) if not r]
+            calls = [calls[i] for i in keep]
+            fns = [fns[i] for i in keep]
+            if results is not None:
+                results = [results[i] for i in keep]
+        if results is None:
+            results = self._send(calls)
+        return fns, results
+
+    def _dispatch(self, fns, results):
+        # GUI thread
+        for fn, (ok, result) in zip(fns, results):
+            if not ok:
+                sigError = getattr(self.server, 'sigError', None)
+                if sigError is not None:
+                    sigError.emit(result)
+            elif fn is not None:
+                fn(result)
+
+
+class LocalTransport(object):
+    '''
+    stand-in server connection for tests and benchmarks
+    calls the methods of [obj] - every request takes [latency] seconds
+    and is counted in [nrequests]
+    '''
+
+    def __init__(self, obj, latency=0.05, batching=True):
+        self.obj = obj
+        self.latency = latency
+        self.batching = batching
+        self.nrequests = 0
+        self._lock = threading.Lock()
+
+    def _request(self):
+        with self._lock:
+            self.nrequests += 1
+        time.sleep(self.latency)
+
+    def callBatch(self, calls):
+        if not self.batching:
+            raise AttributeError('callBatch')
+        self._request()
+        return callAll(self.obj, calls)
+
+    def __getattr__(self, name):
+        fn = getattr(self.obj, name)
+
+        def call(*args, **kwargs):
+            self._request()
+            return fn(*args, **kwargs)
+        return call
+
+
+if __name__ == '__main__':
+    import sys
+
+    class _Api(object):
+        '''
+        some answers of the real server
+        '''
+
+        def isReady(self):
+            return True
+
+        def projectName(self):
+            return 'Project 1'
+
+        def remainingCredit(self):
+            return '12.50 $'
+
+        def userPlan(self):
+            return 3, 100, 0.2, 10
+
+        def stateProcessing(self):
+            return 'Correct Images 50%'
+
+        def priceCurrentJob(self):
+            return '0 $'
+
+    # usage: python batching.py
+    # count round trips of a typical GUI update with and without batching
+    app = QtCore.QCoreApplication(sys.argv)
+    for batching in (True, False):
+        transport = LocalTransport(_Api(), latency=0.02, batching=batching)
+        server = BatchedServer(transport)
+        t0 = time.time()
+        # window title:
+        project, credit = server.batch(('projectName',), ('remainingCredit',))
+        assert (project, credit) == ('Project 1', '12.50 $')
+        # upload tab, 10 updates, 3 calls each:
+        results = []
+        for i in range(10):
+            for name in ('userPlan', 'stateProcessing', 'priceCurrentJob'):
+                server.later(name, fn=results.append, ifReady=True)
+            while len(results) < 3 * (i + 1):
+                app.processEvents()
+                time.sleep(0.001)
+        dt = time.time() - t0
+        print('batching: %s\n  requests: %i\n  time: %.2f s'
+              % (batching, transport.nrequests, dt))
+        if batching:
+            assert transport.nrequests == 1 + 10, transport.nrequests
+        else:
+            # + isReady for every update:
+            assert transport.nrequests == 2 + 40, transport.nrequests
@@ -0,0 +1,163 @@
+'''
+Versioned listings (available files, check tree)
+
+Instead of the full listing the client sends the version it knows
+and receives only what changed since, as zlib compressed json:
+
+    {"version": 12, "full": false,
+     "set": [[key, value], ...], "removed": [key, ...]}
+
+If the server doesn't know the version (None at start, other project)
+"full" is true and "set" holds the whole listing (see encode).
+Keys are lists: [path] for files, [ID] or [ID, meas, current]
+for the check tree.
+
+Full listings of older servers are diffed locally (see setListing).
+'''
+import json
+import zlib
+
+LEVEL = 6  # zlib compression level
+_MISSING = object()
+
+
+def fileEntries(files):
+    '''
+    [(path, date, size), ...] -> {(path,): [date, size]}
+    '''
+    return {(f,): [date, size] for f, date, size in files}
+
+
+def treeEntries(tree):
+    '''
+    [(ID, data, [(meas, [(current, data), ...]), ...]), ...]
+    -> {(ID,): data, (ID, meas, current): data}
+    '''
+    out = {}
+    for ID, data, meas in tree:
+        out[(ID,)] = data
+        for m, currents in meas:
+            for current, cdata in currents:
+                out[(ID, m, current)] = cdata
+    return out
+
+
+def encode(entries, version, old=None):
+    '''
+    server side: compressed changes from [old] to [entries]
+    entries, old ... {key: value}, all of [entries] if old is None
+    '''
+    if old is None:
+        d = {'version': version, 'full': True, 'removed': [],
+             'set': [[list(k), v] for k, v in entries.items()]}
+    else:
+        d = {'version': version, 'full': False,
+             'removed': [list(k) for k in old if k not in entries],
+             'set': [[list(k), v] for k, v in entries.items()
+                     if old.get(k, _MISSING) != v]}
+    return zlib.compress(json.dumps(d, separators=(',', ':')).encode(),
+                         LEVEL)
+
+
+class Delta(object):
+    '''
+    changes of a listing
+    changed ... {key: value} of new or changed entries
+    removed ... {key, ...}
+    '''
+
+    def __init__(self, changed=None, removed=()):
+        self.changed = {} if changed is None else changed
+        self.removed = set(removed)
+
+    def __bool__(self):
+        return bool(self.changed or self.removed)
+
+    def update(self, other):
+        '''
+        merge with the following Delta [other]
+        '''
+        for k in other.removed:
+            self.changed.pop(k, None)
+        self.removed |= other.removed
+        self.removed -= set(other.changed)
+        self.changed.update(other.changed)
+
+
+class Snapshot(object):
+    '''
+    client side state of one listing
+    '''
+
+    def __init__(self):
+        self.version = None
+        self.entries = {}
+
+    def reset(self):
+        '''
+        ask for the full listing next time
+        '''
+        self.version = None
+
+    def apply(self, payload):
+        '''
+        apply compressed changes from the server, return Delta
+        '''
+        d = json.loads(zlib.decompress(payload).decode())
+        changed = {tuple(k): v for k, v in d['set']}
+        if d['full']:
+            removed = set(self.entries) - set(changed)
+            changed = {k: v for k, v in changed.items()
+                       if self.entries.get(k, _MISSING) != v}
+        else:
+            removed = {tuple(k) for k in d['removed']}
+        self.version = d['version']
+        return self._apply(Delta(changed, removed))
+
+    def setListing(self, entries):
+        '''
+        full listing {key: value} of an older server, return Delta
+        '''
+        old = self.entries
+        return self._apply(Delta(
+            {k: v for k, v in entries.items() if old.get(k, _MISSING) != v},
+            set(old) - set(entries)))
+
+    def _apply(self, delta):
+        for k in delta.removed:
+            self.entries.pop(k, None)
+        self.entries.update(delta.changed)
+        return delta
+
+
+if __name__ == '__main__':
+    import time
+    # usage: python delta.py
+    # bytes transferred for a big project, where few files change
+    nfiles, nchanged = 50000, 20
+    files = [('ID%i/meas%i/EL_%i.tiff' % (i // 100, i % 100, i),
+              1.5e9 + i, '%i MB' % (i % 30)) for i in range(nfiles)]
+    old = fileEntries(files)
+    for i in range(nchanged):
+        files[i * 1000] = (files[i * 1000][0], 1.6e9, '1 MB')
+    files.append(('ID9999/meas0/EL_0.tiff', 1.6e9, '2 MB'))
+    new = fileEntries(files)
+
+    full = json.dumps(files).encode()
+    print('full listing, json:    %10i bytes' % len(full))
+    print('full listing, zlib:    %10i bytes' % len(encode(new, 1)))
+    payload = encode(new, 2, old)
+    print('delta, zlib:           %10i bytes' % len(payload))
+
+    snap = Snapshot()
+    snap.apply(encode(old, 1))
+    t0 = time.time()
+    delta = snap.apply(payload)
+    print('apply delta:           %10.2f ms' % (1000 * (time.time() - t0)))
+    assert len(delta.changed) == nchanged + 1 and not delta.removed
+    assert snap.entries == new and snap.version == 2
+    # same result without server support:
+    snap2 = Snapshot()
+    snap2.setListing(old)
+    delta2 = snap2.setListing(new)
+    assert delta2.changed == delta.changed and snap2.entries == new
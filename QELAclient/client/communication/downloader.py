@@ -0,0 +1,296 @@
+'''
+Concurrent file download
+
+Files are downloaded by up to <nstreams> worker threads via
+server.downloadChunk(path, offset, size) -> bytes. Every file is queued
+with a priority, so files opened interactively are downloaded before files
+of a running background sync.
+
+Every file is written into a hidden temp file next to its destination and
+hashed while its chunks arrive. Completed files are renamed into place, so
+an interrupted transfer never leaves a truncated file. An interrupted
+transfer continues from the end of its temp file, if the server version
+(date, size) stored next to it is still the same - else it starts again.
+The checksum is stored in the ChecksumCache, so verifying the file doesn't
+need to read it again.
+
+Jobs with extra arguments (e.g. cmd=...) and servers without downloadChunk
+use server.download(path, localpath, **kwargs) for the whole file.
+'''
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+
+from PyQt5 import QtCore
+
+from client import hashing
+from client.checksumCache import ChecksumCache, fileStat
+
+N_STREAMS = 4  # default number of parallel downloads
+CHUNK_SIZE = 2 ** 20  # bytes
+PRIORITY_HIGH = 0  # e.g. file opened by user
+PRIORITY_LOW = 10  # e.g. sync all files
+
+
+class DownloadJob(QtCore.QObject):
+    '''
+    one call of Downloader.download - a list of files
+    sigDone is emitted with all downloaded local paths
+    (single path, if [paths] is not a list)
+    '''
+    sigDone = QtCore.pyqtSignal(object)
+
+    def __init__(self, paths, root, versions=None, **kwargs):
+        super().__init__()
+        # paths tuple/list -> multiple files, str/Pathstr -> single file
+        self.single = type(paths) not in (tuple, list)
+        if self.single:
+            paths = [paths]
+            versions = [versions]
+        self.paths = paths
+        # server (date, size) of every path - None: unknown
+        self.versions = versions or [None] * len(paths)
+        if len(paths) == 1 and root.isFileLike():
+            # local file = root
+            self.localpaths = [root]
+        else:
+            # local  file = root\relFilePath
+            self.localpaths = [root.join(f) for f in paths]
+        self.kwargs = kwargs
+        self.errors = [None] * len(paths)
+        self.ndone = 0
+
+    def files(self):
+        '''
+        return all successfully downloaded local paths
+        '''
+        return [p for p, e in zip(self.localpaths, self.errors) if not e]
+
+
+class _Canceled(Exception):
+    pass
+
+
+def partPath(localpath):
+    '''
+    hidden temp file of a running download
+    '''
+    d, name = os.path.split(localpath)
+    return os.path.join(d, '.%s.part' % name)
+
+
+def versionPath(localpath):
+    '''
+    server version (date, size) the temp file of [localpath] belongs to
+    '''
+    d, name = os.path.split(localpath)
+    return os.path.join(d, '.%s.partversion' % name)
+
+
+def removePart(localpath):
+    '''
+    delete what an unfinished download of [localpath] left
+    '''
+    for p in (partPath(localpath), versionPath(localpath)):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def _canResume(localpath, version):
+    '''
+    whether the temp file of [localpath] is a beginning of [version]
+    '''
+    part = partPath(localpath)
+    if version is None or not os.path.exists(part):
+        return False
+    try:
+        with open(versionPath(localpath)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (stored == list(version)
+            and os.path.getsize(part) <= version[1])
+
+
+class Downloader(QtCore.QObject):
+    sigFileDone = QtCore.pyqtSignal(str, str)  # local path, error ('' if OK)
+    sigProgress = QtCore.pyqtSignal(int, int)  # n files done, n files total
+    sigJobDone = QtCore.pyqtSignal(object)  # DownloadJob
+    sigIdle = QtCore.pyqtSignal()  # all files downloaded
+
+    def __init__(self, server, nstreams=N_STREAMS):
+        super().__init__()
+        self.server = server
+        self.nstreams = nstreams
+        self._queue = queue.PriorityQueue()
+        self._count = itertools.count()  # keep FIFO order for same priority
+        self._lock = threading.Lock()
+        self._canceled = set()
+        self._running = set()
+        self._nworkers = 0
+        self.algorithm = hashing.DEFAULT  # for checksum cache
+        self.cachePath = None  # of checksum cache, None=default
+        self._chunked = True  # server supports downloadChunk
+        self._ndone, self._ntotal = 0, 0
+
+    def download(self, paths, root, priority=PRIORITY_LOW, versions=None,
+                 **kwargs):
+        '''
+        queue files for download
+        versions ... server (date, size) of [paths], an interrupted
+                     download is only continued for the same version
+        kwargs are passed to server.download
+        returns DownloadJob
+        '''
+        job = DownloadJob(paths, root, versions, **kwargs)
+        with self._lock:
+            self._ntotal += len(job.paths)
+            # canceled before - download again:
+            self._canceled.difference_update(job.localpaths)
+        for i in range(len(job.paths)):
+            self._queue.put((priority, next(self._count), job, i))
+        with self._lock:
+            while self._nworkers < self.nstreams:
+                self._nworkers += 1
+                threading.Thread(target=self._work, daemon=True).start()
+        return job
+
+    def cancel(self, localpath):
+        '''
+        don't download [localpath]
+        a running download is stopped after its current chunk
+        '''
+        self._canceled.add(localpath)
+
+    def cancelAll(self):
+        # stop running downloads after their current chunk:
+        self._canceled.update(self._running)
+        while True:
+            try:
+                _prio, _count, job, i = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._finished(job, i, 'canceled')
+
+    def isActive(self):
+        return self._ndone < self._ntotal
+
+    def _work(self):
+        while True:
+            with self._lock:
+                try:
+                    _prio, _count, job, i = self._queue.get_nowait()
+                except queue.Empty:
+                    # decrease in lock, so download() starts a new worker
+                    # for files queued from now on:
+                    self._nworkers -= 1
+                    return
+            path, localpath = job.paths[i], job.localpaths[i]
+            err = ''
+            if localpath in self._canceled:
+                err = 'canceled'
+            else:
+                self._running.add(localpath)
+                try:
+                    self._fetch(path, localpath, job.versions[i],
+                                job.kwargs)
+                except _Canceled:
+                    err = 'canceled'
+                except Exception as e:
+                    err = str(e) or type(e).__name__
+                finally:
+                    self._running.discard(localpath)
+            self._finished(job, i, err)
+
+    def _fetch(self, path, localpath, version, kwargs):
+        d = os.path.dirname(localpath)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        part = partPath(localpath)
+        if not kwargs and self._chunked:
+            try:
+                checksum = self._fetchChunks(path, localpath, part,
+                                             version)
+            except (AttributeError, NotImplementedError):
+                # old server
+                self._chunked = False
+        if kwargs or not self._chunked:
+            checksum = self._fetchFile(path, localpath, part, kwargs)
+        os.replace(part, localpath)
+        removePart(localpath)
+
+        cache = ChecksumCache(self.cachePath)
+        try:
+            cache.put([(localpath, fileStat(localpath), checksum)],
+                      self.algorithm)
+        finally:
+            cache.close()
+
+    def _fetchFile(self, path, localpath, part, kwargs):
+        '''
+        download the whole file into [part] via server.download
+        '''
+        if localpath in self._canceled:
+            raise _Canceled()
+        removePart(localpath)
+        self.server.download(path, part, **kwargs)
+        if not os.path.exists(part):
+            raise IOError('%s could not be downloaded' % path)
+        return hashing.fileHash(part, self.algorithm)
+
+    def _fetchChunks(self, path, localpath, part, version):
+        '''
+        download into [part] via server.downloadChunk
+        continue from its end, if it belongs to the same [version]
+        '''
+        if not _canResume(localpath, version):
+            # changed on the server or unknown version - start again:
+            removePart(localpath)
+            if version is not None:
+                with open(versionPath(localpath), 'w') as f:
+                    json.dump(list(version), f)
+        h = hashlib.new(self.algorithm)
+        with open(part, 'ab+') as f:
+            # continue interrupted download - hash what is already there:
+            f.seek(0)
+            for block in iter(lambda: f.read(hashing.BLOCK_SIZE), b''):
+                h.update(block)
+            offs = f.tell()
+            while True:
+                if localpath in self._canceled:
+                    # keep temp file to continue later
+                    raise _Canceled()
+                data = self.server.downloadChunk(path, offs, CHUNK_SIZE)
+                f.write(data)
+                # written bytes are confirmed - continue from here if
+                # interrupted:
+                f.flush()
+                h.update(data)
+                offs += len(data)
+                if len(data) < CHUNK_SIZE:
+                    break
+            os.fsync(f.fileno())
+        return h.hexdigest()
+
+    def _finished(self, job, i, err):
+        with self._lock:
+            job.errors[i] = err
+            job.ndone += 1
+            self._ndone += 1
+            ndone, ntotal = self._ndone, self._ntotal
+            jobDone = job.ndone == len(job.paths)
+            idle = ndone == ntotal
+            if idle:
+                self._ndone, self._ntotal = 0, 0
+                self._canceled.clear()
+        self.sigFileDone.emit(job.localpaths[i], err)
+        self.sigProgress.emit(ndone, ntotal)
+        if jobDone:
+            self.sigJobDone.emit(job)
+        if idle:
+            self.sigIdle.emit()
@@ -0,0 +1,297 @@
+'''
+Change subscriptions
+
+Instead of every tab polling the server with its own timer, one thread
+asks for changes of all subscribed topics at once:
+
+    server.waitChanges(topics, timeout, versions) -> {topic: new value}
+
+The server holds this request until a topic changes or [timeout] passes
+(long-poll). Older servers are polled with the single requests in POLL,
+with an interval growing while nothing changes.
+
+Files and check tree are versioned listings: the server only sends
+compressed changes since [versions] and subscribers get a delta.Delta
+(see communication.delta).
+
+Changes are dispatched to the subscribers in the GUI thread.
+'''
+import threading
+
+from PyQt5 import QtCore
+
+from client.communication import delta
+
+FILES = 'files'  # value: Delta of server.availFiles()
+CHECK_TREE = 'checkTree'  # value: Delta of server.checkTree()
+PROCESSING = 'processing'  # value: server.stateProcessing()
+
+# fallback for servers without long-poll: {topic: fn(server) -> value}
+# None means 'no change'
+POLL = {FILES: lambda s: s.availFiles() if s.hasNewFiles() else None,
+        CHECK_TREE: lambda s: s.checkTree() if s.hasNewCheckTree() else None,
+        PROCESSING: lambda s: s.stateProcessing()}
+# full listings of POLL -> {key: value}:
+LISTINGS = {FILES: delta.fileEntries,
+            CHECK_TREE: delta.treeEntries}
+
+LONG_POLL_TIMEOUT = 25  # sec
+MIN_INTERVAL = 1  # sec between two polls after a change
+MAX_INTERVAL = 30  # sec between two polls if nothing changes
+BACKOFF = 1.5  # interval growth while nothing changes
+
+
+class Subscriptions(QtCore.QObject):
+    '''
+    s = Subscriptions(server)
+    s.subscribe(FILES, fn)  # fn(Delta) is called on every change
+    s.start()
+    '''
+    _sigChanged = QtCore.pyqtSignal(str, object)  # topic, value
+
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+        self._subs = {}  # {topic: [fn, ...]}
+        self._last = {}  # {topic: value} last dispatched value
+        self.snapshots = {t: delta.Snapshot() for t in LISTINGS}
+        # {topic: n} - increased on every reset, results of polls sent
+        # before are dropped:
+        self._resets = {}
+        # subscriptions and snapshots are changed in the GUI thread:
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._longPoll = True
+        self.interval = MIN_INTERVAL
+        self._sigChanged.connect(self._dispatch)
+
+    def subscribe(self, topic, fn):
+        with self._lock:
+            self._subs.setdefault(topic, []).append(fn)
+        # new topic - ask immediately:
+        self.interval = MIN_INTERVAL
+        self._wake.set()
+
+    def unsubscribe(self, topic, fn):
+        with self._lock:
+            fns = self._subs.get(topic, [])
+            if fn in fns:
+                fns.remove(fn)
+            if not fns:
+                self._subs.pop(topic, None)
+                self._reset(topic)
+                if topic in self.snapshots:
+                    self.snapshots[topic] = delta.Snapshot()
+
+    def refresh(self, topic):
+        '''
+        ask for [topic] soon and dispatch its value, even if unchanged
+        listings are requested in full, but only changes are dispatched
+        '''
+        with self._lock:
+            self._reset(topic)
+            if topic in self.snapshots:
+                self.snapshots[topic].reset()
+        self.interval = MIN_INTERVAL
+        self._wake.set()
+
+    def _reset(self, topic):
+        self._last.pop(topic, None)
+        self._resets[topic] = self._resets.get(topic, 0) + 1
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+
+    def _dispatch(self, topic, value):
+        # GUI thread
+        with self._lock:
+            fns = list(self._subs.get(topic, ()))
+        for fn in fns:
+            fn(value)
+
+    def _changed(self, changes, resets):
+        '''
+        dispatch new values, return True if anything changed
+        resets ... self._resets when the poll was sent
+        '''
+        out = False
+        for topic, value in changes.items():
+            with self._lock:
+                if (value is None or topic not in self._subs or
+                        self._resets.get(topic) != resets.get(topic)):
+                    # reset in the meantime - ask again:
+                    continue
+                snap = self.snapshots.get(topic)
+                if snap is not None:
+                    if isinstance(value, bytes):
+                        value = snap.apply(value)
+                    else:
+                        # full listing:
+                        value = snap.setListing(LISTINGS[topic](value))
+                    if not value:
+                        continue
+                elif self._last.get(topic) == value:
+                    continue
+                self._last[topic] = value
+            self._sigChanged.emit(topic, value)
+            out = True
+        return out
+
+    def _poll(self, topics):
+        if self._longPoll:
+            with self._lock:
+                versions = {t: s.version for t, s in self.snapshots.items()}
+            try:
+                return self.server.waitChanges(
+                    topics, LONG_POLL_TIMEOUT, versions)
+            except (AttributeError, NotImplementedError):
+                # old server
+                self._longPoll = False
+        return {t: POLL[t](self.server) for t in topics if t in POLL}
+
+    def _run(self):
+        while not self._stop:
+            with self._lock:
+                topics = list(self._subs)
+                resets = dict(self._resets)
+            changed = False
+            if topics:
+                try:
+                    if not self.server.isReady():
+                        raise IOError('server not ready')
+                    changes = self._poll(topics)
+                    if self._stop:
+                        break
+                    changed = self._changed(changes, resets)
+                except Exception:
+                    # connection problem - try again later
+                    pass
+                else:
+                    if self._longPoll:
+                        # server already waited for changes:
+                        self.interval = MIN_INTERVAL
+                        continue
+            if changed:
+                self.interval = MIN_INTERVAL
+            else:
+                self.interval = min(self.interval * BACKOFF, MAX_INTERVAL)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    class _LocalServer(object):
+        '''
+        stand-in server, values change every [dt] seconds
+        '''
+
+        def __init__(self, longPoll, dt=0.5):
+            self.longPoll = longPoll
+            self.dt = dt
+            self.t0 = time.time()
+            self.nrequests = 0
+            self._seen = {}  # files/tree version already delivered
+            self._history = {t: {} for t in LISTINGS}  # {version: entries}
+
+        def _version(self):
+            return int((time.time() - self.t0) / self.dt)
+
+        def _listingVersion(self, topic):
+            v = self._version()
+            return v if topic == FILES else v // 2
+
+        def isReady(self):
+            return True
+
+        def _values(self):
+            v = self._version()
+            return {FILES: [('file%i' % i, 0, 0) for i in range(v)],
+                    CHECK_TREE: [('ID%i' % i, {}, [('meas0', [('c0', {})])])
+                                 for i in range(v // 2)],
+                    PROCESSING: 'Correct Images %i%%' % min(100, 10 * v)}
+
+        def _new(self, topic):
+            val = self._values()[topic]
+            if self._seen.get(topic) == val:
+                return None
+            self._seen[topic] = val
+            return val
+
+        def hasNewFiles(self):
+            self.nrequests += 1
+            return self._seen.get(FILES) != self._values()[FILES]
+
+        def availFiles(self):
+            self.nrequests += 1
+            return self._new(FILES)
+
+        def hasNewCheckTree(self):
+            self.nrequests += 1
+            return self._seen.get(CHECK_TREE) != self._values()[CHECK_TREE]
+
+        def checkTree(self):
+            self.nrequests += 1
+            return self._new(CHECK_TREE)
+
+        def stateProcessing(self):
+            self.nrequests += 1
+            return self._values()[PROCESSING]
+
+        def _delta(self, topic, version):
+            v = self._listingVersion(topic)
+            if v == version:
+                return None
+            entries = LISTINGS[topic](self._values()[topic])
+            self._history[topic][v] = entries
+            return delta.encode(entries, v, self._history[topic].get(version))
+
+        def waitChanges(self, topics, timeout, versions):
+            if not self.longPoll:
+                raise AttributeError('waitChanges')
+            self.nrequests += 1
+            t0 = time.time()
+            while time.time() - t0 < timeout:
+                out = {t: self._delta(t, versions[t]) if t in LISTINGS
+                       else self._new(t) for t in topics}
+                out = {t: v for t, v in out.items() if v is not None}
+                if out:
+                    return out
+                time.sleep(0.01)
+            return {}
+
+    # usage: python subscriptions.py
+    # run against a stand-in server with and without long-poll
+    app = QtCore.QCoreApplication(sys.argv)
+    for longPoll in (True, False):
+        server = _LocalServer(longPoll)
+        s = Subscriptions(server)
+        nchanges = {}
+        files = set()
+
+        def count(topic, nchanges=nchanges, files=files):
+            def fn(value):
+                nchanges[topic] = nchanges.get(topic, 0) + 1
+                if topic == FILES:
+                    # only new files are sent:
+                    assert not files & set(value.changed)
+                    files.update(value.changed)
+            return fn
+        for topic in (FILES, CHECK_TREE, PROCESSING):
+            s.subscribe(topic, count(topic))
+        s.start()
+        t0 = time.time()
+        while time.time() - t0 < 5:
+            app.processEvents()
+            time.sleep(0.01)
+        s.stop()
+        print('long-poll: %s\n  changes: %s\n  requests: %i'
+              % (longPoll, nchanges, server.nrequests))
+        assert files == set(s.snapshots[FILES].entries)
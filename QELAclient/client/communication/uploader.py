@@ -0,0 +1,344 @@
+'''
+Parallel, chunked image upload
+
+Every file is split into chunks of CHUNK_SIZE bytes which are sent
+via server.uploadChunk(new_path, offset, data, total_size).
+Up to <nstreams> chunks are in flight at the same time, so throughput
+scales with the link and not with the latency of every single request.
+
+Confirmed chunks are recorded in an UploadJournal, so an interrupted
+upload can be continued after a restart.
+
+Servers without uploadChunk receive whole files via server.upload.
+'''
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore
+
+CHUNK_SIZE = 8 * 1024 ** 2  # bytes
+N_STREAMS = 4  # default number of parallel upload streams
+SAVE_INTERVAL = 1  # sec between two writes of the upload journal
+
+
+class UploadJournal(object):
+    '''
+    record which byte ranges of which files are confirmed by the server
+    stored as json file, e.g. in PATH_USER/upload_journal.json
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.agenda = None
+        self.skipped = []  # table rows of images, the server already holds
+        self.files = []  # {row, path, new_path, size, mtime, done:[[a,b],...]}
+        self._lastSave = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def new(cls, path, agenda, rows, paths, new_paths, skipped):
+        j = cls(path)
+        j.agenda = agenda
+        j.skipped = list(skipped)
+        for row, p, n in zip(rows, paths, new_paths):
+            st = os.stat(p)
+            j.files.append({'row': row, 'path': str(p), 'new_path': n,
+                            'size': st.st_size, 'mtime': st.st_mtime,
+                            'done': []})
+        j.save()
+        return j
+
+    @classmethod
+    def load(cls, path):
+        '''
+        return journal stored in [path] or None
+        '''
+        try:
+            with open(path, 'r') as f:
+                d = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        j = cls(path)
+        j.agenda = d['agenda']
+        j.skipped = d['skipped']
+        j.files = d['files']
+        for f in j.files:
+            # file modified since last session -> upload it again:
+            try:
+                st = os.stat(f['path'])
+            except OSError:
+                continue
+            if (st.st_size, st.st_mtime) != (f['size'], f['mtime']):
+                f['size'], f['mtime'], f['done'] = st.st_size, st.st_mtime, []
+        return j
+
+    def save(self, force=True):
+        with self._lock:
+            t = time.time()
+            if not force and t - self._lastSave < SAVE_INTERVAL:
+                return
+            self._lastSave = t
+            s = json.dumps({'agenda': self.agenda, 'skipped': self.skipped,
+                            'files': self.files})
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(s)
+        # never leave a half written journal:
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def confirm(self, index, offs, nbytes):
+        '''
+        mark bytes [offs, offs+nbytes] of file [index] as uploaded
+        '''
+        with self._lock:
+            done = self.files[index]['done']
+            done.append([offs, offs + nbytes])
+            done.sort()
+            # merge adjacent ranges:
+            merged = [done[0]]
+            for a, b in done[1:]:
+                if a <= merged[-1][1]:
+                    merged[-1][1] = max(b, merged[-1][1])
+                else:
+                    merged.append([a, b])
+            self.files[index]['done'] = merged
+        self.save(force=False)
+
+    def isConfirmed(self, index, offs, nbytes):
+        for a, b in self.files[index]['done']:
+            if a <= offs and offs + nbytes <= b:
+                return True
+        return False
+
+    def nbytesDone(self, index):
+        return sum(b - a for a, b in self.files[index]['done'])
+
+    def isDone(self):
+        return all(self.isConfirmed(i, 0, f['size'])
+                   for i, f in enumerate(self.files))
+
+
+class _TokenBucket(object):
+    '''
+    limit the upload rate of all streams together
+    rate ... bytes/s, 0 = unlimited
+    '''
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self._tokens = 0
+        self._t = time.time()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes, isCanceled):
+        # streams wait one after the other, so they share the budget:
+        with self._lock:
+            rate = self.rate
+            t = time.time()
+            if not rate:
+                self._t = t
+                return
+            # allow bursts of max. 1 sec:
+            self._tokens = min(self._tokens + (t - self._t) * rate, rate)
+            self._t = t
+            self._tokens -= nbytes
+            tend = t - self._tokens / rate
+            while time.time() < tend and not isCanceled():
+                time.sleep(min(0.1, tend - time.time()))
+
+
+class Uploader(QtCore.QThread):
+    sigUpdate = QtCore.pyqtSignal(int, int)  # file index, progress[%]
+    sigDone = QtCore.pyqtSignal()
+    sigError = QtCore.pyqtSignal(str)
+
+    def __init__(self, server, nstreams=N_STREAMS, chunksize=CHUNK_SIZE):
+        super().__init__()
+        self.server = server
+        self.nstreams = nstreams
+        self.chunksize = chunksize
+        self._cancel = False
+        self._chunked = True  # server supports uploadChunk
+        self._paths, self._new_paths = [], []
+        self._journal = None
+        self._bucket = _TokenBucket()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def bandwidth(self):
+        '''
+        max. upload rate in bytes/s, 0 = unlimited
+        can be changed during upload
+        '''
+        return self._bucket.rate
+
+    @bandwidth.setter
+    def bandwidth(self, rate):
+        self._bucket.rate = rate
+
+    def upload(self, paths, new_paths, fnUpdate=None, fnDone=None,
+               fnError=None, journal=None):
+        '''
+        same signature as server.upload:
+        paths ... local file paths
+        new_paths ... anonymized file names as given in the agenda
+        fnUpdate(index, progress[%]), fnDone(), fnError(msg)
+        journal ... [optional] UploadJournal with the same file order
+                    chunks confirmed in there are not uploaded again
+        '''
+        self._paths, self._new_paths = paths, new_paths
+        self._journal = journal
+        self._cancel = False
+        self._running.set()
+        for sig, fn in ((self.sigUpdate, fnUpdate),
+                        (self.sigDone, fnDone),
+                        (self.sigError, fnError)):
+            try:
+                sig.disconnect()
+            except TypeError:
+                pass
+            if fn is not None:
+                sig.connect(fn)
+        self.start()
+
+    def cancel(self):
+        self._cancel = True
+        self._running.set()
+
+    def isCanceled(self):
+        return self._cancel
+
+    def pause(self):
+        '''
+        stop sending new chunks until resume() is called
+        '''
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def isPaused(self):
+        return not self._running.is_set()
+
+    def _chunks(self, index, size):
+        '''yield (index, offset, nbytes) for all chunks of one file'''
+        if not size:
+            # empty files still need to be registered on the server
+            chunks = [(index, 0, 0)]
+        else:
+            chunks = ((index, offs, min(self.chunksize, size - offs))
+                      for offs in range(0, size, self.chunksize))
+        for chunk in chunks:
+            if self._journal is None or not self._journal.isConfirmed(*chunk):
+                yield chunk
+
+    def _sendChunk(self, index, offs, nbytes, total):
+        self._running.wait()
+        if self._cancel or not self._chunked:
+            return 0
+        self._bucket.consume(nbytes, self.isCanceled)
+        if self._cancel:
+            return 0
+        with open(self._paths[index], 'rb') as f:
+            f.seek(offs)
+            data = f.read(nbytes)
+        try:
+            res = self.server.uploadChunk(self._new_paths[index],
+                                          offs, data, total)
+        except (AttributeError, NotImplementedError):
+            # old server
+            self._chunked = False
+            return 0
+        if res != 'OK':
+            raise IOError(res)
+        return nbytes
+
+    def run(self):
+        sizes = [os.path.getsize(p) for p in self._paths]
+        j = self._journal
+        sent = [0] * len(sizes) if j is None else [
+            min(j.nbytesDone(i), s) for i, s in enumerate(sizes)]
+        lock = threading.Lock()
+        # limit number of chunks waiting in the queue,
+        # so memory stays bounded for large agendas:
+        slots = threading.BoundedSemaphore(2 * self.nstreams)
+        errors = []
+
+        def fnDone(future, index, offs):
+            slots.release()
+            try:
+                nbytes = future.result()
+            except Exception as e:
+                errors.append(str(e))
+                self._cancel = True
+                return
+            if self._cancel or not self._chunked:
+                return
+            if j is not None:
+                j.confirm(index, offs, nbytes)
+            with lock:
+                sent[index] += nbytes
+                total = sizes[index]
+                progress = 100 if not total else int(
+                    100 * sent[index] / total)
+            self.sigUpdate.emit(index, progress)
+
+        with ThreadPoolExecutor(max_workers=self.nstreams) as pool:
+            for index, size in enumerate(sizes):
+                if sent[index] == size and size:
+                    # already uploaded in an earlier session:
+                    self.sigUpdate.emit(index, 100)
+                for chunk in self._chunks(index, size):
+                    slots.acquire()
+                    if self._cancel or not self._chunked:
+                        slots.release()
+                        break
+                    fut = pool.submit(self._sendChunk, *chunk, size)
+                    fut.add_done_callback(
+                        lambda fut, index=index, offs=chunk[1]:
+                            fnDone(fut, index, offs))
+                if self._cancel or not self._chunked:
+                    break
+
+        if not self._chunked and not self._cancel and not errors:
+            self._uploadFiles([i for i, s in enumerate(sizes)
+                               if not s or sent[i] < s], sizes, errors)
+        if j is not None:
+            j.save()
+        if errors:
+            self.sigError.emit(errors[0])
+        elif not self._cancel:
+            self.sigDone.emit()
+
+    def _uploadFiles(self, indices, sizes, errors):
+        '''
+        upload files [indices] as a whole via server.upload
+        for servers without uploadChunk
+        '''
+        done = threading.Event()
+
+        def fnUpdate(i, progress):
+            self.sigUpdate.emit(indices[i], progress)
+            if progress == 100 and self._journal is not None:
+                index = indices[i]
+                self._journal.confirm(index, 0, sizes[index])
+
+        def fnError(msg):
+            errors.append(msg)
+            done.set()
+
+        self.server.upload([self._paths[i] for i in indices],
+                           [self._new_paths[i] for i in indices],
+                           fnUpdate, done.set, fnError)
+        while not done.wait(0.1) and not self._cancel:
+            pass
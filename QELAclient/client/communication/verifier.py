@@ -0,0 +1,101 @@
+'''
+Background verification of local files
+
+Checksums of local files (see checksumCache) are sent to the server
+in batches via
+    server.verifyFiles([(path, checksum), ...], algorithm) -> [bool, ...]
+instead of one request per file.
+Servers without verifyFiles are asked per file via server.verifyFile,
+which only knows checksums of the default algorithm (sha256).
+'''
+from PyQt5 import QtCore
+
+from client import hashing
+from client.checksumCache import ChecksumCache
+
+N_VERIFY = 200  # files verified with one server request
+
+
+class VerifyThread(QtCore.QThread):
+    '''
+    results: True ... verified, False ... not verified or missing,
+             None ... server could not be asked (or canceled)
+    '''
+    sigVerified = QtCore.pyqtSignal(object, object)  # [index], [result]
+    sigDone = QtCore.pyqtSignal(object)  # [result] of all files
+    sigError = QtCore.pyqtSignal(str)
+
+    def __init__(self, server, paths, localpaths, cachePath=None,
+                 algorithm=hashing.DEFAULT):
+        super().__init__()
+        self.server = server
+        self.algorithm = algorithm
+        self.paths = paths
+        self.localpaths = localpaths
+        self.cachePath = cachePath
+        self._cancel = False
+        self._batch = True  # server supports verifyFiles
+
+    def kill(self):
+        self._cancel = True
+
+    def run(self):
+        n = len(self.paths)
+        out = [None] * n
+        cache = ChecksumCache(self.cachePath)
+        try:
+            for i in range(0, n, N_VERIFY):
+                indices = list(range(i, min(n, i + N_VERIFY)))
+                sums = cache.checkSums([self.localpaths[j] for j in indices],
+                                       lambda: self._cancel, self.algorithm)
+                if self._cancel:
+                    break
+                # missing local files cannot be verified:
+                ask = [(j, s) for j, s in zip(indices, sums) if s is not None]
+                for j, s in zip(indices, sums):
+                    if s is None:
+                        out[j] = False
+                if ask:
+                    try:
+                        res = self._verify(ask, cache)
+                    except Exception as e:
+                        self.sigError.emit(
+                            'Could not verify files: %s' % (str(e) or
+                                                            type(e).__name__))
+                        res = [None] * len(ask)
+                    for (j, _s), r in zip(ask, res):
+                        out[j] = r
+                self.sigVerified.emit(indices, [out[j] for j in indices])
+        finally:
+            cache.close()
+            # also if canceled, so the caller can continue:
+            self.sigDone.emit(out)
+
+    def _verify(self, ask, cache):
+        '''
+        ask ... [(index, checksum), ...] checksums made with self.algorithm
+        '''
+        indices = [j for j, _s in ask]
+        paths = [self.paths[j] for j in indices]
+        if self._batch:
+            try:
+                return self.server.verifyFiles(
+                    [(p, s) for p, (_j, s) in zip(paths, ask)],
+                    self.algorithm)
+            except (AttributeError, NotImplementedError):
+                # old server
+                self._batch = False
+        if self.algorithm == hashing.DEFAULT:
+            sums = [s for _j, s in ask]
+        else:
+            # verifyFile only knows the default algorithm:
+            sums = cache.checkSums([self.localpaths[j] for j in indices],
+                                   lambda: self._cancel, hashing.DEFAULT)
+        res = []
+        for path, checksum in zip(paths, sums):
+            if self._cancel:
+                break
+            # None: removed in the meantime
+            res.append(checksum is not None and
+                       self.server.verifyFile(path, checksum))
+        return res
@@ -0,0 +1,186 @@
+'''
+Persistent index of local files
+
+Walking a big project folder and reading size and date of every file
+is slow. The index (sqlite) stores relative path, size, modification
+date and server date of all files.
+On update only directories with a changed modification time are listed
+again - adding, removing or renaming a file changes the modification
+time of its directory.
+Files changed in place (e.g. overwritten by a download) have to be
+registered with FileIndex.touch().
+'''
+import os
+import sqlite3
+import time
+
+
+# directories changed less than [MIN_AGE] seconds ago are listed again on the
+# next update - file system time stamps can be coarse (e.g. 2 s on FAT):
+MIN_AGE = 2
+# increase if tables change:
+VERSION = 2
+
+
+class FileIndex(object):
+    '''
+    index = FileIndex('files.db')
+    for relpath, size, date, serverdate in index.update(root):
+        ...
+    size in bytes, date and server date as epoch (server date nan if unknown)
+    '''
+
+    def __init__(self, path):
+        self._db = db = sqlite3.connect(str(path))
+        if db.execute('PRAGMA user_version').fetchone()[0] != VERSION:
+            db.executescript('''
+                DROP TABLE IF EXISTS dirs;
+                DROP TABLE IF EXISTS files;''')
+            db.execute('PRAGMA user_version=%i' % VERSION)
+        db.executescript('''
+            CREATE TABLE IF NOT EXISTS dirs (
+                root TEXT, dir TEXT, parent TEXT, mtime REAL,
+                PRIMARY KEY (root, dir));
+            CREATE TABLE IF NOT EXISTS files (
+                root TEXT, dir TEXT, name TEXT, size INTEGER, mtime REAL,
+                serverdate REAL, PRIMARY KEY (root, dir, name));''')
+
+    def update(self, root):
+        '''
+        synchronise index with file system and return
+        [(relative path, size, date, server date), ...] of all files in [root]
+        '''
+        root = str(root)
+        db = self._db
+        known, subdirs = {}, {}
+        for d, parent, mtime in db.execute(
+                'SELECT dir, parent, mtime FROM dirs WHERE root=?', (root,)):
+            known[d] = mtime
+            subdirs.setdefault(parent, []).append(d)
+
+        seen = set()
+        stack = ['']
+        now = time.time()
+        with db:
+            while stack:
+                d = stack.pop()
+                try:
+                    mtime = os.stat(os.path.join(root, d)).st_mtime
+                except OSError:
+                    continue
+                seen.add(d)
+                if known.get(d) == mtime:
+                    # unchanged - subdirectories are known:
+                    stack.extend(subdirs.get(d, ()))
+                    continue
+                stack.extend(self._scanDir(root, d))
+                if now - mtime < MIN_AGE:
+                    mtime = None
+                db.execute('INSERT OR REPLACE INTO dirs VALUES (?,?,?,?)',
+                           (root, d, os.path.dirname(d) if d else None,
+                            mtime))
+            # remove deleted directories:
+            for d in set(known) - seen:
+                db.execute('DELETE FROM dirs WHERE root=? AND dir=?',
+                           (root, d))
+                db.execute('DELETE FROM files WHERE root=? AND dir=?',
+                           (root, d))
+        return self.files(root)
+
+    def _scanDir(self, root, d):
+        '''
+        update all files in directory [d], return its subdirectories
+        '''
+        db = self._db
+        serverdates = dict(db.execute(
+            'SELECT name, serverdate FROM files WHERE root=? AND dir=?',
+            (root, d)))
+        rows, dirs = [], []
+        for entry in os.scandir(os.path.join(root, d)):
+            if entry.is_dir():
+                dirs.append(os.path.join(d, entry.name))
+            elif not entry.name.startswith('.'):
+                st = entry.stat()
+                rows.append((root, d, entry.name, st.st_size, st.st_mtime,
+                             serverdates.get(entry.name)))
+        db.execute('DELETE FROM files WHERE root=? AND dir=?', (root, d))
+        db.executemany('INSERT INTO files VALUES (?,?,?,?,?,?)', rows)
+        return dirs
+
+    def touch(self, root, relpaths):
+        '''
+        read size and date of given files again
+        '''
+        root = str(root)
+        with self._db as db:
+            for p in relpaths:
+                d, name = os.path.split(os.path.normpath(p))
+                try:
+                    st = os.stat(os.path.join(root, d, name))
+                except OSError:
+                    db.execute('DELETE FROM files WHERE root=? AND dir=? '
+                               'AND name=?', (root, d, name))
+                    continue
+                args = (st.st_size, st.st_mtime, root, d, name)
+                if not db.execute(
+                        'UPDATE files SET size=?, mtime=? '
+                        'WHERE root=? AND dir=? AND name=?', args).rowcount:
+                    db.execute('INSERT INTO files (size, mtime, root, dir, '
+                               'name) VALUES (?,?,?,?,?)', args)
+
+    def setServerDates(self, root, dates):
+        '''
+        dates ... [(relative path, server date as epoch), ...]
+        '''
+        root = str(root)
+        with self._db as db:
+            db.executemany(
+                'UPDATE files SET serverdate=? WHERE root=? AND dir=? '
+                'AND name=?',
+                ((date,) + (root,) + os.path.split(os.path.normpath(p))
+                 for p, date in dates))
+
+    def files(self, root):
+        return [(os.path.join(d, name), size, mtime,
+                 float('nan') if serverdate is None else serverdate)
+                for d, name, size, mtime, serverdate in self._db.execute(
+                    'SELECT dir, name, size, mtime, serverdate '
+                    'FROM files WHERE root=?', (str(root),))]
+
+    def close(self):
+        self._db.close()
+
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+    # benchmark: full walk vs. index update
+    # usage: python fileIndex.py [FOLDER]
+    # without argument a folder with 20k files is generated
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+    else:
+        folder = tempfile.mkdtemp()
+        for i in range(200):
+            d = os.path.join(folder, 'mod%i' % (i // 20), 'meas%i' % i)
+            os.makedirs(d)
+            for j in range(100):
+                open(os.path.join(d, 'file%i.txt' % j), 'w').close()
+        time.sleep(MIN_AGE)
+
+    t0 = time.time()
+    nwalk = 0
+    for d, _dirs, files in os.walk(folder):
+        for f in files:
+            p = os.path.join(d, f)
+            os.path.getsize(p)
+            os.path.getmtime(p)
+            nwalk += 1
+    t1 = time.time()
+    index = FileIndex(os.path.join(tempfile.mkdtemp(), 'files.db'))
+    n = len(index.update(folder))
+    t2 = time.time()
+    assert n == len(index.update(folder)) == nwalk
+    t3 = time.time()
+    print('%i files\n  walk: %.3f s\n  first index update: %.3f s'
+          '\n  index update: %.3f s' % (n, t1 - t0, t2 - t1, t3 - t2))
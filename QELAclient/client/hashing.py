@@ -0,0 +1,151 @@
+'''
+Multi-core file hashing
+
+Files are hashed in parallel threads - hashlib releases the GIL
+while hashing large buffers. Files are read through mmap in big blocks,
+so no python-level copy of the file content is made.
+
+BLAKE2b is much faster than sha256 on 64 bit CPUs without sha
+instructions (SHA-NI). The fastest algorithm on this machine that the
+server supports is used for verification (see negotiate),
+sha256 otherwise.
+'''
+import hashlib
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+DEFAULT = 'sha256'  # fallback, supported by every server
+ALGORITHMS = ('blake2b', 'sha256')
+BLOCK_SIZE = 16 * 2 ** 20  # bytes hashed with one update call
+N_THREADS = os.cpu_count() or 1
+
+
+@lru_cache()
+def fastest():
+    '''
+    return ALGORITHMS sorted by speed on this machine
+    '''
+    buf = bytes(4 * 2 ** 20)
+
+    def speed(a):
+        h = hashlib.new(a)
+        t0 = time.perf_counter()
+        h.update(buf)
+        return time.perf_counter() - t0
+    return sorted(ALGORITHMS, key=speed)
+
+
+def negotiate(server):
+    '''
+    return the fastest hash algorithm supported by the server
+    server.hashAlgorithms() -> ['sha256', ...]
+    '''
+    try:
+        supported = server.hashAlgorithms()
+    except Exception:
+        # old server
+        return DEFAULT
+    for a in fastest():
+        if a in supported:
+            return a
+    return DEFAULT
+
+
+def fileHash(path, algorithm=DEFAULT, blocksize=BLOCK_SIZE):
+    '''
+    return hex digest of file at [path]
+    '''
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty file or file system without mmap support:
+            buf = bytearray(blocksize)
+            view = memoryview(buf)
+            n = f.readinto(buf)
+            while n:
+                h.update(view[:n])
+                n = f.readinto(buf)
+        else:
+            with m:
+                view = memoryview(m)
+                try:
+                    for i in range(0, len(m), blocksize):
+                        h.update(view[i:i + blocksize])
+                finally:
+                    view.release()
+    return h.hexdigest()
+
+
+def hashFiles(paths, algorithm=DEFAULT, nthreads=N_THREADS,
+              fnProgress=None, isCanceled=lambda: False):
+    '''
+    return hex digests of all [paths] hashed in parallel threads
+    digest is None for missing/unreadable files or if canceled
+    fnProgress(ndone, ntotal) ... [optional] called after every file
+    '''
+    def _hash(path):
+        if isCanceled():
+            return None
+        try:
+            return fileHash(path, algorithm)
+        except OSError:
+            return None
+
+    out = []
+    if nthreads < 2 or len(paths) < 2:
+        results = map(_hash, paths)
+        pool = None
+    else:
+        pool = ThreadPoolExecutor(min(nthreads, len(paths)))
+        results = pool.map(_hash, paths)
+    try:
+        for r in results:
+            out.append(r)
+            if fnProgress is not None:
+                fnProgress(len(out), len(paths))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return out
+
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+    import time
+    from fancytools.os.fileCheckSum import fileCheckSum
+    # throughput benchmark
+    # usage: python hashing.py [FILE ...]
+    # without arguments some 64 MB files are generated
+    paths = sys.argv[1:]
+    if not paths:
+        d = tempfile.mkdtemp()
+        for i in range(max(4, N_THREADS)):
+            p = os.path.join(d, 'file%i' % i)
+            with open(p, 'wb') as f:
+                f.write(os.urandom(64 * 2 ** 20))
+            paths.append(p)
+    mb = sum(os.path.getsize(p) for p in paths) / 2 ** 20
+
+    def bench(name, fn, ncores=1):
+        fn()  # warm up file cache
+        t0 = time.time()
+        fn()
+        dt = time.time() - t0
+        print('%-32s %8.0f MB/s %8.0f MB/s per core'
+              % (name, mb / dt, mb / dt / ncores))
+
+    print('%i files, %.0f MB, %i cores, fastest: %s'
+          % (len(paths), mb, N_THREADS, fastest()[0]))
+    bench('fileCheckSum (64 KB generator)',
+          lambda: [fileCheckSum(p) for p in paths])
+    for a in ALGORITHMS:
+        bench('%s, mmap, 1 thread' % a,
+              lambda: hashFiles(paths, a, nthreads=1))
+        bench('%s, mmap, %i threads' % (a, N_THREADS),
+              lambda: hashFiles(paths, a), N_THREADS)
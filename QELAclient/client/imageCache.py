@@ -0,0 +1,139 @@
+'''
+Decoded images shared by all viewers and editors
+
+Images are read through imageCache.imread(path). Decoded arrays are kept
+in memory keyed by (path, mtime), so a modified file is decoded again.
+Memory is bounded by a byte budget, least recently used images are
+dropped first.
+
+readAhead(paths) decodes images in background, e.g. the next and
+previous image of a table, so flipping through images doesn't wait
+for decoding.
+
+Cached arrays are shared - they are read-only, copy before modifying.
+Large TIFFs are read as memory map or TiffRegions (see client.imread).
+They are not cached, so no file stays open.
+'''
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from client import imread as _imread
+
+BUDGET = 512 * 2 ** 20  # bytes
+N_THREADS = 2
+IMAGE_TYPES = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+
+def _nbytes(img):
+    '''
+    memory held by [img] - a view keeps its whole buffer alive
+    (e.g. RGB view of a padded 32 bit QImage, see qImageToArray)
+    '''
+    while isinstance(img.base, np.ndarray):
+        img = img.base
+    return img.nbytes
+
+
+def _key(path):
+    try:
+        return str(path), os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class ImageCache(object):
+
+    def __init__(self, budget=BUDGET, nthreads=N_THREADS):
+        self.budget = budget
+        self.nbytes = 0
+        self._images = OrderedDict()  # (path, mtime): array
+        self._keys = {}  # path: (path, mtime) of cached version
+        self._loading = {}  # (path, mtime): Future
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(nthreads)
+
+    def setBudget(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._shrink()
+
+    def imread(self, path):
+        '''
+        return decoded image at [path] from memory or read it
+        '''
+        key = _key(path)
+        if key is None:
+            # let imread raise the error:
+            return _imread.imread(path)
+        with self._lock:
+            img = self._images.get(key)
+            if img is not None:
+                self._images.move_to_end(key)
+                return img
+            future = self._loading.get(key)
+        if future is not None:
+            # already read in background:
+            return future.result()
+        return self._load(key)
+
+    def readAhead(self, paths):
+        '''
+        decode images at [paths] in background, other files are ignored
+        '''
+        for path in paths:
+            if not str(path).lower().endswith(IMAGE_TYPES):
+                continue
+            key = _key(path)
+            if key is None:
+                continue
+            with self._lock:
+                if key in self._images or key in self._loading:
+                    continue
+                self._loading[key] = self._pool.submit(self._load, key)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._keys.clear()
+            self.nbytes = 0
+
+    def _load(self, key):
+        try:
+            img = _imread.imread(key[0])
+            # memory maps and TiffRegions hold the file:
+            if type(img) is np.ndarray:
+                img.flags.writeable = False
+                self._put(key, img)
+            return img
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    def _put(self, key, img):
+        with self._lock:
+            if key in self._images or _nbytes(img) > self.budget:
+                return
+            # older version of the same file:
+            old = self._keys.get(key[0])
+            if old is not None and old in self._images:
+                self.nbytes -= _nbytes(self._images.pop(old))
+            self._keys[key[0]] = key
+            self._images[key] = img
+            self.nbytes += _nbytes(img)
+            self._shrink()
+
+    def _shrink(self):
+        while self.nbytes > self.budget:
+            (path, _mtime), img = self._images.popitem(last=False)
+            self._keys.pop(path, None)
+            self.nbytes -= _nbytes(img)
+
+
+# one cache for the whole process:
+CACHE = ImageCache()
+imread = CACHE.imread
+readAhead = CACHE.readAhead
@@ -5,18 +5,38 @@ from PyQt5 import QtGui
 # https://kogs-www.informatik.uni-hamburg.de/~meine/software/vigraqt/qimage2ndarray.py
 
 
-def qImageToArray(qimage, dtype='array'):
+class _QImageBuffer(object):
+    '''
+    exposes the pixel buffer of [qimage] to numpy without copying
+    arrays created from it keep the QImage alive (array.base)
+    '''
+
+    def __init__(self, qimage):
+        self.qimage = qimage
+        # constBits doesn't detach (copy) shared image data:
+        self.__array_interface__ = {
+            'shape': (qimage.byteCount(),),
+            'typestr': '|u1',
+            'data': (int(qimage.constBits()), True),  # read-only
+            'version': 3}
+
+
+def qImageToArray(qimage, dtype='array', copy=False):
     """Convert QImage to numpy.ndarray.  The dtype defaults to uint8
     for QImage.Format_Indexed8 or `bgra_dtype` (i.e. a record array)
     for 32bit color images.  You can pass a different dtype to use, or
-    'array' to get a 3D uint8 array for color images."""
+    'array' to get a 3D uint8 array for color images.
+
+    copy=False returns a read-only view on the QImage buffer,
+    do not modify [qimage] while using the array.
+    copy=True returns an independent, contiguous array."""
 
     result_shape = (qimage.height(), qimage.width())
     temp_shape = (qimage.height(),
                   qimage.bytesPerLine() * 8 // qimage.depth())
 
-    buf = qimage.bits().asstring(qimage.byteCount())
-    
+    buf = np.asarray(_QImageBuffer(qimage))
+
     if qimage.format() in (QtGui.QImage.Format_ARGB32_Premultiplied,
                            QtGui.QImage.Format_ARGB32,
                            QtGui.QImage.Format_RGB32):
@@ -34,13 +54,14 @@ def qImageToArray(qimage, dtype='array'):
     elif  qimage.format() == 1:  # boolean(1bit) image
         dtype = np.uint8
         temp_shape2 = (qimage.height(), qimage.bytesPerLine() // qimage.depth())
-        result = np.frombuffer(buf, dtype).reshape(temp_shape2)
+        result = buf.view(dtype).reshape(temp_shape2)
+        # unpackbits always creates a new array:
         return np.unpackbits(result).reshape(temp_shape)
     else:
         raise ValueError("qimage2numpy only supports 32bit, 8bit and 1bit images")
-    
+
     # FIXME: raise error if alignment does not match
-    result = np.frombuffer(buf, dtype).reshape(temp_shape)
+    result = buf.view(dtype).reshape(temp_shape)
     if result_shape != temp_shape:
         result = result[:, :result_shape[1]]
     if qimage.format() == QtGui.QImage.Format_RGB32 and dtype == np.uint8:
@@ -48,4 +69,50 @@ def qImageToArray(qimage, dtype='array'):
         result = result[..., :3]
         # byteorder == 'big' -> get ARGB
         result = result[..., ::-1]
+    if copy:
+        result = np.ascontiguousarray(result)
     return result
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    # usage: python qImageToArray.py
+    # compare with copying the buffer into bytes first for a 24 MP image
+    app = QtGui.QGuiApplication(sys.argv)
+
+    def qImageToArrayBytes(qimage):
+        # previous implementation
+        buf = qimage.bits().asstring(qimage.byteCount())
+        result = np.frombuffer(buf, np.uint8).reshape(
+            qimage.height(), qimage.bytesPerLine() // 4, 4)
+        return result[:, :qimage.width(), :3][..., ::-1]
+
+    def bench(name, fn, n=10):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(n):
+            out = fn()
+        dt = (time.perf_counter() - t0) / n
+        print('%-36s %9.2f ms' % (name, 1000 * dt))
+        return out
+
+    for fmt in ('Format_RGB32', 'Format_Grayscale8'):
+        qimage = QtGui.QImage(6000, 4000, getattr(QtGui.QImage, fmt))
+        qimage.fill(QtGui.QColor(10, 20, 30))
+        print('%s, 24 MP' % fmt)
+        if fmt == 'Format_RGB32':
+            a = bench('  bytes copy (old)',
+                      lambda: qImageToArrayBytes(qimage))
+        b = bench('  zero copy', lambda: qImageToArray(qimage))
+        c = bench('  zero copy + copy=True',
+                  lambda: qImageToArray(qimage, copy=True))
+        assert np.array_equal(b, c) and not b.flags.writeable
+        assert np.shares_memory(b, np.asarray(_QImageBuffer(qimage)))
+        if fmt == 'Format_RGB32':
+            assert np.array_equal(a, b)
+            assert tuple(b[0, 0]) == (10, 20, 30)
+    # the array keeps its QImage alive:
+    arr = qImageToArray(qimage)
+    del qimage
+    assert arr.sum() == arr.size * QtGui.qGray(10, 20, 30)
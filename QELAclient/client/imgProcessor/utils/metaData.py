@@ -3,30 +3,236 @@ Created on 9 Feb 2018
 
 @author: serkgb
 '''
+import struct
 import exifread
 from fractions import Fraction
 
+# EXIF tags needed by metaData:
+_DATE, _EXPTIME, _ISO, _FNUMBER = 0x9003, 0x829A, 0x8827, 0x829D
+_EXIF_IFD = 0x8769  # pointer from IFD0 to EXIF sub-IFD
+# TIFF type -> (struct format, size)
+_TYPES = {1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 5: ('LL', 8),
+          7: ('B', 1), 9: ('l', 4), 10: ('ll', 8)}
+_MAX_ENTRIES = 1000  # IFDs with more entries are considered broken
+_MAX_APP1 = 0xFFFF  # max. size of a JPEG segment
+
+
+class _Reader(object):
+    '''
+    bounded random access reads from either an open file
+    or a buffer (e.g. JPEG APP1 segment)
+    '''
+
+    def __init__(self, f, offs=0, buf=None):
+        self.f = f
+        self.offs = offs
+        self.buf = buf
+
+    def read(self, pos, n):
+        if self.buf is not None:
+            out = self.buf[pos:pos + n]
+        else:
+            self.f.seek(self.offs + pos)
+            out = self.f.read(n)
+        if len(out) != n:
+            raise ValueError('unexpected end of file')
+        return out
+
+
+def _readIFD(r, endian, pos, wanted):
+    '''
+    return {tag: (type, count, raw value bytes)} for all tags in [wanted]
+    only the value bytes of wanted tags are read
+    '''
+    n = struct.unpack(endian + 'H', r.read(pos, 2))[0]
+    if n > _MAX_ENTRIES:
+        raise ValueError('broken IFD')
+    entries = r.read(pos + 2, 12 * n)
+    out = {}
+    for i in range(n):
+        tag, typ, count = struct.unpack_from(endian + 'HHL', entries, 12 * i)
+        if tag not in wanted or typ not in _TYPES:
+            continue
+        size = _TYPES[typ][1] * count
+        if size <= 4:
+            val = entries[12 * i + 8:12 * i + 8 + size]
+        else:
+            offs = struct.unpack_from(endian + 'L', entries, 12 * i + 8)[0]
+            val = r.read(offs, size)
+        out[tag] = typ, count, val
+    return out
+
+
+def _value(endian, typ, count, val):
+    '''
+    format tag value the way exifread does
+    '''
+    if typ == 2:
+        return val.split(b'\x00', 1)[0].decode('latin-1').strip()
+    fmt = _TYPES[typ][0]
+    n = len(val) // struct.calcsize(endian + fmt)
+    vals = struct.unpack(endian + fmt * n, val)
+    if typ in (5, 10):
+        vals = [Fraction(vals[i], vals[i + 1]) for i in range(0, len(vals), 2)]
+    if count == 1:
+        return str(vals[0])
+    return str(list(vals))
+
+
+def _tiffTags(r):
+    '''
+    read EXIF tags from a TIFF structure (TIFF file or JPEG APP1 segment)
+    '''
+    head = r.read(0, 8)
+    endian = {b'II': '<', b'MM': '>'}.get(head[:2])
+    if endian is None or struct.unpack(endian + 'H', head[2:4])[0] != 42:
+        # not a TIFF or BigTIFF:
+        raise ValueError('unsupported format')
+    wanted = {_EXIF_IFD, _DATE, _EXPTIME, _ISO, _FNUMBER}
+    tags = _readIFD(r, endian, struct.unpack(endian + 'L', head[4:])[0],
+                    wanted)
+    exif = tags.pop(_EXIF_IFD, None)
+    if exif is not None:
+        pos = struct.unpack(endian + 'L', exif[2][:4])[0]
+        tags.update(_readIFD(r, endian, pos, wanted))
+    return {tag: _value(endian, *v) for tag, v in tags.items()}
+
+
+def _jpegTags(f):
+    '''
+    walk JPEG segments until the EXIF APP1 segment is found
+    '''
+    pos = 2
+    while True:
+        f.seek(pos)
+        head = f.read(4)
+        if len(head) < 4 or head[0] != 0xFF:
+            return {}
+        marker, size = head[1], struct.unpack('>H', head[2:])[0]
+        if marker in (0xDA, 0xD9):
+            # start of scan / end of image: no EXIF data
+            return {}
+        if marker == 0xE1:
+            buf = f.read(min(size, _MAX_APP1) - 2)
+            if buf[:6] == b'Exif\x00\x00':
+                return _tiffTags(_Reader(None, buf=buf[6:]))
+        pos += 2 + size
+
+
+def fastTags(path):
+    '''
+    read DateTimeOriginal, ExposureTime, ISOSpeedRatings and FNumber
+    of JPEG and TIFF files only reading the image header region
+    returns {tag: str} (formatted like exifread)
+
+    raises ValueError if file format is not supported
+    '''
+    with open(path, 'rb') as f:
+        sig = f.read(4)
+        if sig[:2] == b'\xff\xd8':
+            return _jpegTags(f)
+        return _tiffTags(_Reader(f))
+
+
+def _exifreadTags(path):
+    with open(path, 'rb') as f:
+        # Return Exif tags
+        tags = exifread.process_file(f, details=False)
+    return {tag: str(tags[name]) for tag, name in (
+        (_DATE, 'EXIF DateTimeOriginal'), (_EXPTIME, 'EXIF ExposureTime'),
+        (_ISO, 'EXIF ISOSpeedRatings'), (_FNUMBER, 'EXIF FNumber'))
+        if name in tags}
+
 
 def metaData(path):
     '''
     returns images meta data (date, expTime, iso, fnumber)
        e.g. '2016/08/16 13:56:36', 5.0, 1600, 1.8
     '''
-    # Open image file for reading (binary mode)
-    with open(path, 'rb') as f:
-        # Return Exif tags
-        tags = exifread.process_file(f)
-        # e.g. '2016:08:16 13:56:36'
-        date = str(tags.get('EXIF DateTimeOriginal', ''))
-        try:
-            i = date.index(' ')
-        except ValueError:
-            return '', '', '', ''
-        date = date[:i].replace(':', '/') + date[i:]
-        expTime = str(tags.get('EXIF ExposureTime', ''))  # e.g. '5'
-        iso = str(tags.get('EXIF ISOSpeedRatings', ''))  # e.g. '1600'
-        fnumber = str(tags.get('EXIF FNumber', ''))
-        if fnumber:
-            fnumber = str(float(Fraction(fnumber)))  # '9/5' --> '1.8'
-
-        return date, expTime, iso, fnumber
+    try:
+        tags = fastTags(path)
+    except (ValueError, struct.error, ZeroDivisionError):
+        # unknown or broken format - let exifread try:
+        tags = _exifreadTags(path)
+    # e.g. '2016:08:16 13:56:36'
+    date = tags.get(_DATE, '')
+    try:
+        i = date.index(' ')
+    except ValueError:
+        return '', '', '', ''
+    date = date[:i].replace(':', '/') + date[i:]
+    expTime = tags.get(_EXPTIME, '')  # e.g. '5'
+    iso = tags.get(_ISO, '')  # e.g. '1600'
+    fnumber = tags.get(_FNUMBER, '')
+    if fnumber:
+        fnumber = str(float(Fraction(fnumber)))  # '9/5' --> '1.8'
+
+    return date, expTime, iso, fnumber
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import tempfile
+    import timeit
+    # micro benchmark: header-only reader vs. exifread
+    # usage: python metaData.py [IMAGE ...]
+    # without arguments a JPEG and a multi-page TIFF are generated
+
+    def _ifd(entries, offs, nextIFD=0):
+        # entries ... [(tag, type, count, value bytes)], sorted by tag
+        # returns IFD bytes and data area, IFD placed at [offs]
+        data = b''
+        dpos = offs + 2 + 12 * len(entries) + 4
+        out = struct.pack('<H', len(entries))
+        for tag, typ, count, val in entries:
+            if len(val) <= 4:
+                out += struct.pack('<HHL', tag, typ, count) + val.ljust(4, b'\0')
+            else:
+                out += struct.pack('<HHLL', tag, typ, count, dpos + len(data))
+                data += val
+        return out + struct.pack('<L', nextIFD) + data
+
+    def _tiff(npages=0, pagesize=0):
+        exif = [(_EXPTIME, 5, 1, struct.pack('<LL', 1, 60)),
+                (_FNUMBER, 5, 1, struct.pack('<LL', 9, 5)),
+                (_ISO, 3, 1, struct.pack('<H', 1600)),
+                (_DATE, 2, 20, b'2016:08:16 13:56:36\0')]
+        exif.sort()
+        ifd0len = 2 + 12 * 1 + 4
+        exifpos = 8 + ifd0len
+        exifbuf = _ifd(exif, exifpos)
+        page = exifpos + len(exifbuf)
+        ifd0 = _ifd([(_EXIF_IFD, 4, 1, struct.pack('<L', exifpos))], 8,
+                    page if npages else 0)
+        out = b'II*\0' + struct.pack('<L', 8) + ifd0 + exifbuf
+        # further pages: an IFD with some big pixel data each
+        for i in range(npages):
+            pos = len(out)
+            nxt = pos + 18 + pagesize if i < npages - 1 else 0
+            out += _ifd([(0x0100, 3, 1, struct.pack('<H', 1))], pos, nxt)
+            out += b'\0' * pagesize
+        return out
+
+    paths = sys.argv[1:]
+    if not paths:
+        d = tempfile.mkdtemp()
+        jpg = os.path.join(d, 'sample.jpg')
+        tif = os.path.join(d, 'sample.tif')
+        app1 = b'Exif\0\0' + _tiff()
+        with open(jpg, 'wb') as f:
+            f.write(b'\xff\xd8\xff\xe1' + struct.pack('>H', len(app1) + 2)
+                    + app1 + b'\xff\xda' + b'\0' * 2 ** 20 + b'\xff\xd9')
+        with open(tif, 'wb') as f:
+            f.write(_tiff(npages=50, pagesize=2 ** 20))
+        paths = [jpg, tif]
+
+    for p in paths:
+        fast = fastTags(p)
+        ref = _exifreadTags(p)
+        n = 20
+        t0 = timeit.timeit(lambda: fastTags(p), number=n) / n
+        t1 = timeit.timeit(lambda: _exifreadTags(p), number=n) / n
+        print('%s\n  equal: %s\n  header only: %.3f ms\n  exifread: %.3f ms'
+              '\n  speedup: x%.1f' % (os.path.basename(p), fast == ref,
+                                      1e3 * t0, 1e3 * t1, t1 / t0))
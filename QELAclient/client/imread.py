@@ -1,11 +1,208 @@
+'''
+Image reading
+
+Large TIFFs (e.g. stitched 16 bit module images with 100+ MP) are not
+read into memory at once:
+
+* uncompressed TIFFs are memory-mapped - only the parts used are read
+* compressed or tiled TIFFs are returned as TiffRegions - tiles (strips)
+  are only decoded within a requested region, in parallel threads
+
+Use overview(img) to display such images with bounded memory.
+Memory maps keep their file open - don't keep them longer than needed,
+e.g. on Windows, the file cannot be replaced in the meantime.
+TiffRegions only open the file while a region is read.
+'''
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tifffile
 from PyQt5 import QtGui
 from imgProcessor.reader.qImageToArray import qImageToArray
-from tifffile import imread as tiffimread
 
+LAZY_SIZE = 64 * 2 ** 20  # bytes, read smaller TIFFs into memory
+MAX_PIXELS = 4e6  # max. pixels of an overview
+N_THREADS = 4
 
-def imread(path):
+
+def imread(path, lazy=True):
+    '''
+    lazy ... large TIFFs are returned as np.memmap or TiffRegions
+    '''
     if path.endswith('tif') or path.endswith('tiff'):
-        return tiffimread(path)
+        if lazy:
+            img = _lazyTiff(path)
+            if img is not None:
+                return img
+        return tifffile.imread(path)
     # cv2 dll are huge - rather only use PyQt5
     qimage = QtGui.QImageReader(path).read()
     return qImageToArray(qimage)
+
+
+def _lazyTiff(path):
+    with tifffile.TiffFile(path) as tif:
+        page = tif.pages[0]
+        if np.prod(page.shape) * page.dtype.itemsize < LAZY_SIZE:
+            return None
+    try:
+        return tifffile.memmap(path, mode='r')
+    except ValueError:
+        # compressed or not contiguous
+        pass
+    try:
+        return TiffRegions(path)
+    except ValueError:
+        return None
+
+
+def overview(img, maxpixels=MAX_PIXELS):
+    '''
+    return img[::step, ::step] with at most [maxpixels] and step
+    for arrays, memory maps and TiffRegions
+    '''
+    step = max(1, int(math.ceil(math.sqrt(
+        img.shape[0] * img.shape[1] / maxpixels))))
+    if step == 1 and type(img) is np.ndarray:
+        return img, 1
+    # always a copy - memory maps are not referenced anymore:
+    return np.array(img[::step, ::step]), step
+
+
+# one thread pool for all TiffRegions (threads are started on demand):
+_POOL = ThreadPoolExecutor(N_THREADS)
+
+
+class TiffRegions(object):
+    '''
+    lazy reader of the first page of a compressed or tiled TIFF
+
+    t = TiffRegions(path)
+    roi = t[y0:y1, x0:x1]  # only decodes tiles within the region
+    small = t[::8, ::8]  # one row of tiles is held in memory at a time
+
+    the file is only open while a region is read
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            if page.imagedepth > 1 or (page.samplesperpixel > 1 and
+                                       page.planarconfig != 1):
+                raise ValueError('TIFF layout not supported')
+            self.shape = page.shape
+            self.dtype = page.dtype
+            if page.is_tiled:
+                self._th, self._tw = page.tilelength, page.tilewidth
+            else:
+                self._th = min(page.rowsperstrip or page.imagelength,
+                               page.imagelength)
+                self._tw = page.imagewidth
+            self._nx = -(-page.imagewidth // self._tw)
+        self.ndim = len(self.shape)
+
+    def _tiles(self, tif, indices):
+        '''
+        return decoded tiles [indices] of open [tif]
+        '''
+        page = tif.pages[0]
+        fh = tif.filehandle
+        data = []
+        for index in indices:
+            fh.seek(page.dataoffsets[index])
+            data.append((fh.read(page.databytecounts[index]), index))
+
+        def decode(args):
+            # released GIL while decompressing:
+            seg = page.decode(*args, jpegtables=page.jpegtables)[0]
+            seg = seg[0]  # -> (height, width, samples)
+            if self.ndim == 2:
+                seg = seg[..., 0]
+            return seg
+        return _POOL.map(decode, data)
+
+    @staticmethod
+    def _overlap(start, step, n, t0, t1):
+        '''
+        output indices [k0, k1) and tile slice of sampled positions
+        start + k * step within tile [t0, t1)
+        '''
+        k0 = max(0, -(-(t0 - start) // step))
+        k1 = min(n, -(-(t1 - start) // step))
+        if k1 <= k0:
+            return None
+        return k0, k1, slice(start + k0 * step - t0,
+                             start + (k1 - 1) * step - t0 + 1, step)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        key += (slice(None),) * (2 - len(key))
+        (ys, ye, sy), (xs, xe, sx) = (k.indices(n) for k, n in
+                                      zip(key[:2], self.shape[:2]))
+        if sy < 1 or sx < 1 or not all(isinstance(k, slice)
+                                       for k in key[:2]):
+            raise IndexError('only positive slices are supported')
+        ny, nx = len(range(ys, ye, sy)), len(range(xs, xe, sx))
+        out = np.empty((ny, nx) + self.shape[2:], dtype=self.dtype)
+        if not ny or not nx:
+            return out
+        with tifffile.TiffFile(self.path) as tif:
+            self._read(tif, out, ys, ye, sy, ny, xs, xe, sx, nx)
+        return out[(Ellipsis,) + key[2:]] if len(key) > 2 else out
+
+    def _read(self, tif, out, ys, ye, sy, ny, xs, xe, sx, nx):
+        th, tw = self._th, self._tw
+        cols = []
+        for i in range(xs // tw, (xe - 1) // tw + 1):
+            o = self._overlap(xs, sx, nx, i * tw, (i + 1) * tw)
+            if o is not None:
+                cols.append((i, o))
+        for j in range(ys // th, (ye - 1) // th + 1):
+            oy = self._overlap(ys, sy, ny, j * th, (j + 1) * th)
+            if oy is None:
+                continue
+            ky0, ky1, tsy = oy
+            # decode one row of tiles in parallel:
+            tiles = self._tiles(tif, [j * self._nx + i for i, _o in cols])
+            for tile, (_i, (kx0, kx1, tsx)) in zip(tiles, cols):
+                out[ky0:ky1, kx0:kx1] = tile[tsy, tsx]
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import time
+    import tracemalloc
+    # usage: python imread.py
+    # time and peak memory reading a 96 MP, 16 bit image
+    d = tempfile.mkdtemp()
+    img = (np.random.rand(8000, 12000) * 1000).astype(np.uint16)
+    raw = os.path.join(d, 'raw.tif')
+    tiled = os.path.join(d, 'tiled.tif')
+    tifffile.imwrite(raw, img)
+    tifffile.imwrite(tiled, img, tile=(512, 512), compression='zlib')
+
+    def bench(name, fn):
+        tracemalloc.start()
+        t0 = time.time()
+        out = fn()
+        dt = time.time() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('%-36s %8.3f s %8.1f MB' % (name, dt, peak / 2 ** 20))
+        return out
+
+    roi = (slice(3000, 4000), slice(5000, 6500))
+    for name, path in (('uncompressed', raw), ('tiled, zlib', tiled)):
+        print(name)
+        full = bench('  tifffile.imread', lambda: tifffile.imread(path))
+        lazy = imread(path)
+        a = bench('  %s ROI 1000x1500' % type(lazy).__name__,
+                  lambda: np.array(lazy[roi]))
+        assert np.array_equal(a, full[roi])
+        small, step = bench('  overview', lambda: overview(lazy))
+        assert np.array_equal(small, full[::step, ::step])
+        del full
@@ -0,0 +1,188 @@
+'''
+Parallel image meta data extraction with a persistent cache
+
+Results of imgProcessor.utils.metaData are stored in an sqlite database
+keyed by (path, size, mtime), so re-importing the same measurement folders
+doesn't need to open a single image again.
+'''
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from imgProcessor.utils.metaData import metaData
+
+import client
+
+EMPTY = ('', '', '', '')
+N_BATCH = 500  # max. number of sql variables per query
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+def _readMetaData(path):
+    '''
+    to be executed in worker process
+    return None for unreadable images, rather than stopping the pool
+    '''
+    try:
+        return tuple(metaData(path))
+    except Exception:
+        return None
+
+
+def _readMetaDataChunk(paths):
+    return [_readMetaData(p) for p in paths]
+
+
+class MetaDataCache(object):
+    '''
+    sqlite connections cannot be shared between threads,
+    so create this object in the thread that uses it
+    '''
+
+    def __init__(self, path=None):
+        if path is None:
+            path = client.PATH.join('metadata.db')
+        self._db = sqlite3.connect(path)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS meta (
+                            path TEXT PRIMARY KEY, size INTEGER, mtime REAL,
+                            date TEXT, exptime TEXT, iso TEXT, fnumber TEXT)''')
+
+    def get(self, paths, stats):
+        '''
+        return {index: meta} of all paths that are cached and unchanged
+        stats ... [(size, mtime), ...] as returned by _stat
+        '''
+        out = {}
+        index = {str(p): i for i, p in enumerate(paths)}
+        keys = list(index)
+        for i in range(0, len(keys), N_BATCH):
+            batch = keys[i:i + N_BATCH]
+            cur = self._db.execute(
+                'SELECT * FROM meta WHERE path IN (%s)'
+                % ','.join('?' * len(batch)), batch)
+            for path, size, mtime, *meta in cur:
+                j = index[path]
+                if stats[j] == (size, mtime):
+                    out[j] = tuple(meta)
+        return out
+
+    def put(self, entries):
+        '''
+        entries ... [(path, (size, mtime), meta), ...]
+        '''
+        self._db.executemany(
+            'INSERT OR REPLACE INTO meta VALUES (?,?,?,?,?,?,?)',
+            [(str(p), st[0], st[1]) + tuple(meta)
+             for p, st, meta in entries if st is not None])
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class MetaDataReader(object):
+    '''
+    read meta data of many images using all CPU cores
+
+    fnBatch(indices, metas) is called every <interval> seconds
+    with all values read in the meantime.
+    '''
+    interval = 0.1  # sec
+    chunksize = 8  # number of images send to a worker at once
+
+    def __init__(self, paths, fnBatch, cachePath=None):
+        self.paths = paths
+        self.fnBatch = fnBatch
+        self.cachePath = cachePath
+        self._kill = False
+
+    def kill(self):
+        self._kill = True
+
+    def run(self):
+        cache = MetaDataCache(self.cachePath)
+        try:
+            stats = [_stat(p) for p in self.paths]
+            known = cache.get(self.paths, stats)
+            if known:
+                self.fnBatch(list(known), list(known.values()))
+            todo = [i for i in range(len(self.paths)) if i not in known]
+            if todo:
+                for indices, metas in self._read(todo):
+                    # don't cache failures - e.g. file still being copied:
+                    cache.put([(self.paths[i], stats[i], m)
+                               for i, m in zip(indices, metas)
+                               if m is not None])
+                    self.fnBatch(indices, [EMPTY if m is None else m
+                                           for m in metas])
+        finally:
+            cache.close()
+
+    def _read(self, todo):
+        '''
+        yield batches of ([index,...], [meta,...])
+        '''
+        paths = [self.paths[i] for i in todo]
+        futures = []
+        if len(paths) < 2 * self.chunksize:
+            # not worth starting extra processes:
+            results = map(_readMetaData, paths)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor()
+            n = self.chunksize
+            futures = [pool.submit(_readMetaDataChunk, paths[i:i + n])
+                       for i in range(0, len(paths), n)]
+            results = (meta for f in futures for meta in f.result())
+        indices, metas = [], []
+        t0 = time.time()
+        try:
+            for i, meta in zip(todo, results):
+                if self._kill:
+                    break
+                indices.append(i)
+                metas.append(meta)
+                t1 = time.time()
+                if t1 - t0 > self.interval:
+                    yield indices, metas
+                    indices, metas = [], []
+                    t0 = t1
+        finally:
+            if pool is not None:
+                # don't start chunks not needed anymore:
+                for f in futures:
+                    f.cancel()
+                pool.shutdown(wait=not self._kill)
+        if indices:
+            yield indices, metas
+
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+    # usage: python metaDataCache.py IMAGE_FOLDER
+    # compare serial reading, process pool and cached reading
+    from fancytools.os.PathStr import PathStr
+    folder = PathStr(sys.argv[1])
+    paths = [folder.join(f) for f in folder.files()]
+    db = os.path.join(tempfile.mkdtemp(), 'metadata.db')
+
+    t0 = time.time()
+    [_readMetaData(p) for p in paths]
+    print('serial: %.2fs' % (time.time() - t0))
+
+    for name in ('process pool', 'cached'):
+        out = {}
+        r = MetaDataReader(paths, lambda ind, metas: out.update(
+            zip(ind, metas)), cachePath=db)
+        t0 = time.time()
+        r.run()
+        print('%s: %.2fs (%i images)' % (name, time.time() - t0, len(out)))
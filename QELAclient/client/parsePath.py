@@ -1,5 +1,6 @@
 import re
 from datetime import datetime
+from functools import lru_cache
 
 # def _numberAndName(row, index):
 #     ind = 1
@@ -152,6 +153,69 @@ def parsePath(path, style):  #    #n --> Measurement index
     return out
 
 
+def _converter(code, datetype=None):
+    typ = _DD.get(code, _pass)  # _float, _int...
+    if typ == _date:
+        return lambda s: _date(datetype, s)
+    return typ
+
+
+@lru_cache(maxsize=128)
+def compileStyle(style):
+    '''
+    return a function fn(path) -> {X:val}
+    giving the same result as parsePath(path, style), but translating
+    [style] only once into a regular expression:
+
+    literal text between two values is skipped by its length,
+    a value ends at the first occurrence of the following literal sign
+    '''
+    try:
+        pattern, fields = _toPattern(style)
+    except (ValueError, IndexError):
+        # invalid style - let parsePath raise the same errors as always
+        return lambda path: parsePath(path, style)
+    regex = re.compile(pattern, re.S)
+
+    def fn(path):
+        m = regex.match(path)
+        if m is None:
+            # e.g. separator not found in path - rare, so use slow version
+            return parsePath(path, style)
+        return {code: conv(val)
+                for (code, conv), val in zip(fields, m.groups())}
+    return fn
+
+
+def _toPattern(style):
+    '''
+    return regex pattern and [(value code, converter), ...]
+    '''
+    pattern = ''
+    fields = []
+    while '#' in style:
+        i0 = style.index('#')
+        # skip literal text:
+        pattern += '.{%i}' % i0
+        code = style[i0 + 1]
+        i = i0 + 2
+        datetype = None
+        if _DD.get(code) == _date:  # extract datetype the str between {}
+            iend = style[i + 2:].index('}') + i
+            datetype = style[i + 1:iend + 2]
+            i = iend + 3
+        fields.append((code, _converter(code, datetype)))
+        if i >= len(style):
+            # last value: rest of path
+            pattern += '(.*)'
+            break
+        # value ends with next letter:
+        c = re.escape(style[i])
+        pattern += '([^%s]*)(?=%s)' % (c, c)
+        style = style[i:]
+    return pattern, fields
+
+
 if __name__ == '__main__':
     D = [
         # PATH          STYLE        ANSWER
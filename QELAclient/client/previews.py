@@ -0,0 +1,111 @@
+'''
+Preview images of the check tab
+
+Every measurement folder holds two previews (.prev_A.jpg, .prev_B.jpg).
+Missing previews are downloaded and both images are decoded in a
+thread pool. Decoded images are kept in memory (LRU, see imageCache),
+so the check tab only swaps in arrays. While one measurement is
+checked, the previews of the next and previous items are prefetched.
+'''
+from collections import OrderedDict
+
+from PyQt5 import QtCore
+
+from client.imageCache import imread
+
+NAMES = ('.prev_A.jpg', '.prev_B.jpg')
+N_PREFETCH = 5  # items before and after the current one
+N_MEMORY = 4 * N_PREFETCH + 1  # number of decoded previews in memory
+N_THREADS = 2
+
+
+class _Signals(QtCore.QObject):
+    sigDone = QtCore.pyqtSignal(str, object)  # folder, (imgA, imgB) or None
+
+
+class _LoadPreviews(QtCore.QRunnable):
+
+    def __init__(self, server, root, folder, signals):
+        super().__init__()
+        self.setAutoDelete(False)  # can be taken back, see PreviewCache
+        self.server = server
+        self.root = root
+        self.folder = folder  # relative to root
+        self.signals = signals
+
+    def run(self):
+        path = self.root.join(self.folder)
+        imgs = None
+        try:
+            for name in NAMES:
+                p = path.join(name)
+                if not p.exists():
+                    rel = self.folder.join(name)
+                    self.server.download(rel, self.root.join(rel))
+            imgs = tuple(imread(path.join(name)) for name in NAMES)
+        except Exception as e:
+            print('error loading preview: ', e)
+        self.signals.sigDone.emit(path, imgs)
+
+
+class PreviewCache(QtCore.QObject):
+    '''
+    request(root, folder) returns (imgA, imgB) if already loaded,
+    otherwise they are loaded in background and
+    sigLoaded(path, (imgA, imgB)) is emitted
+    '''
+    sigLoaded = QtCore.pyqtSignal(str, object)
+
+    def __init__(self, server, nmemory=N_MEMORY, nthreads=N_THREADS):
+        super().__init__()
+        self.server = server
+        self.nmemory = nmemory
+        self._memory = OrderedDict()  # path: (imgA, imgB)
+        self._pending = {}  # path: _LoadPreviews
+
+        self._pool = QtCore.QThreadPool()
+        self._pool.setMaxThreadCount(nthreads)
+        self._signals = _Signals()
+        self._signals.sigDone.connect(self._loaded)
+
+    def get(self, path):
+        '''
+        return decoded previews from memory or None
+        '''
+        try:
+            imgs = self._memory.pop(path)
+        except KeyError:
+            return None
+        self._memory[path] = imgs  # move to end - most recently used
+        return imgs
+
+    def request(self, root, folder, priority=N_PREFETCH + 1):
+        path = root.join(folder)
+        imgs = self.get(path)
+        if imgs is None and path not in self._pending:
+            r = self._pending[path] = _LoadPreviews(
+                self.server, root, folder, self._signals)
+            self._pool.start(r, priority)
+        return imgs
+
+    def prefetch(self, root, folders):
+        '''
+        load previews of [folders] in background
+        folders ... current folder first, then neighbours by distance
+        queued folders, not in [folders] anymore are dropped
+        '''
+        paths = {root.join(f) for f in folders}
+        for path, r in list(self._pending.items()):
+            if path not in paths and self._pool.tryTake(r):
+                del self._pending[path]
+        for i, f in enumerate(folders):
+            self.request(root, f, priority=N_PREFETCH - (i + 1) // 2)
+
+    def _loaded(self, path, imgs):
+        self._pending.pop(path, None)
+        if imgs is None:
+            return
+        self._memory[path] = imgs
+        while len(self._memory) > self.nmemory:
+            self._memory.popitem(last=False)
+        self.sigLoaded.emit(path, imgs)
@@ -0,0 +1,185 @@
+'''
+Thumbnail service for image previews
+
+Images are decoded in a thread pool directly at thumbnail size
+(QImageReader.setScaledSize), which is much faster than decoding the full
+image and scaling it afterwards.
+Thumbnails are kept in memory (LRU) and on disk (client.PATH/thumbnails),
+so a preview is only decoded once. At startup, thumbnails on disk not used
+for MAX_AGE are removed, then the least recently used ones until they
+take at most MAX_DISK bytes.
+'''
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+from PyQt5 import QtCore, QtGui
+
+import client
+
+SIZE = 100  # px, max. width and height of a thumbnail
+N_MEMORY = 300  # number of thumbnails in memory
+N_THREADS = 2
+MAX_DISK = 100 * 2 ** 20  # bytes of thumbnails on disk
+MAX_AGE = 90 * 24 * 3600  # sec, remove thumbnails not used since then
+
+
+def _fileKey(path):
+    '''
+    (path, size, mtime) - changes if the image file is modified
+    None if the file doesn't exist
+    '''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (path, st.st_size, st.st_mtime)
+
+
+def _diskName(key):
+    '''
+    thumbnail file name of _fileKey [key]
+    '''
+    key = '%s|%i|%f' % key
+    return hashlib.md5(key.encode('utf-8')).hexdigest() + '.png'
+
+
+def prune(folder, maxbytes=MAX_DISK, maxage=MAX_AGE):
+    '''
+    remove old thumbnails in [folder]
+    mtime is the time of last use, see _LoadThumbnail
+    '''
+    files = []
+    try:
+        with os.scandir(folder) as it:
+            for e in it:
+                if e.name.endswith('.png'):
+                    st = e.stat()
+                    files.append((st.st_mtime, st.st_size, e.path))
+    except OSError:
+        return
+    files.sort()
+    total = sum(f[1] for f in files)
+    tmin = time.time() - maxage
+    for mtime, size, path in files:
+        if total <= maxbytes and mtime >= tmin:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+class _Signals(QtCore.QObject):
+    sigDone = QtCore.pyqtSignal(str, object, QtGui.QImage)  # path, key, img
+
+
+class _LoadThumbnail(QtCore.QRunnable):
+
+    def __init__(self, path, folder, signals):
+        super().__init__()
+        self.path = path
+        self.folder = folder
+        self.signals = signals
+
+    def run(self):
+        key = _fileKey(self.path)
+        if key is None:
+            return self.signals.sigDone.emit(self.path, key, QtGui.QImage())
+        cached = os.path.join(self.folder, _diskName(key))
+        img = QtGui.QImage(cached)
+        if not img.isNull():
+            # mark as recently used, see prune:
+            try:
+                os.utime(cached)
+            except OSError:
+                pass
+        else:
+            r = QtGui.QImageReader(self.path)
+            size = r.size()
+            if size.isValid():
+                # only decode at reduced size:
+                r.setScaledSize(size.scaled(SIZE, SIZE,
+                                            QtCore.Qt.KeepAspectRatio))
+            img = r.read()
+            if not img.isNull():
+                if not size.isValid():
+                    # image format doesn't support scaled reading:
+                    img = img.scaled(SIZE, SIZE, QtCore.Qt.KeepAspectRatio,
+                                     QtCore.Qt.SmoothTransformation)
+                img.save(cached)
+        self.signals.sigDone.emit(self.path, key, img)
+
+
+class _Prune(QtCore.QRunnable):
+
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+
+    def run(self):
+        prune(self.folder)
+
+
+class ThumbnailCache(QtCore.QObject):
+    '''
+    request(path) returns a thumbnail if already loaded, otherwise it is
+    loaded in background and sigLoaded(path, pixmap) is emitted
+    '''
+    sigLoaded = QtCore.pyqtSignal(str, QtGui.QPixmap)
+
+    def __init__(self, folder=None, nmemory=N_MEMORY, nthreads=N_THREADS):
+        super().__init__()
+        if folder is None:
+            folder = client.PATH.mkdir('thumbnails')
+        self.folder = folder
+        self.nmemory = nmemory
+        self._memory = OrderedDict()  # (path, size, mtime): QPixmap
+        self._pending = set()
+
+        self._pool = QtCore.QThreadPool()
+        self._pool.setMaxThreadCount(nthreads)
+        self._signals = _Signals()
+        self._signals.sigDone.connect(self._loaded)
+        # before any thumbnail is loaded:
+        self._pool.start(_Prune(folder), 2)
+
+    def get(self, path):
+        '''
+        return thumbnail from memory or None
+        '''
+        key = _fileKey(path)
+        try:
+            pm = self._memory.pop(key)
+        except KeyError:
+            return None
+        self._memory[key] = pm  # move to end - most recently used
+        return pm
+
+    def request(self, path, priority=1):
+        pm = self.get(path)
+        if pm is None and path not in self._pending:
+            self._pending.add(path)
+            self._pool.start(
+                _LoadThumbnail(path, self.folder, self._signals), priority)
+        return pm
+
+    def prefetch(self, paths):
+        '''
+        load thumbnails in background with lower priority
+        '''
+        for p in paths:
+            self.request(p, priority=0)
+
+    def _loaded(self, path, key, img):
+        # QPixmap can only be created in the GUI thread:
+        self._pending.discard(path)
+        pm = QtGui.QPixmap.fromImage(img)
+        if not pm.isNull():
+            # failed reads are tried again with the next request:
+            self._memory[key] = pm
+            while len(self._memory) > self.nmemory:
+                self._memory.popitem(last=False)
+        self.sigLoaded.emit(path, pm)
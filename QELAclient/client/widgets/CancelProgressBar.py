@@ -7,14 +7,32 @@ class CancelProgressBar(QtWidgets.QWidget):
         super().__init__()
         self.bar = QtWidgets.QProgressBar()
         self.btn = QtWidgets.QPushButton("Cancel")
+        self.btnPause = QtWidgets.QPushButton("Pause")
+        self.btnPause.setCheckable(True)
+        self.btnPause.toggled.connect(self._pauseToggled)
+        self.btnPause.hide()
         ll = QtWidgets.QHBoxLayout()
         ll.setContentsMargins(0, 0, 0, 0)
         self.setLayout(ll)
         ll.addWidget(self.bar)
+        ll.addWidget(self.btnPause, stretch=0)
         ll.addWidget(self.btn, stretch=0)
 #         self._cancel_active = False
 #         self.color = 'black'
         self.connectedFn = None
+        self._pauseFns = None
+
+    def setPause(self, fnPause, fnResume):
+        '''
+        enable pause button
+        fnPause, fnResume ... functions to execute at pause/resume
+        '''
+        self._pauseFns = fnPause, fnResume
+
+    def _pauseToggled(self, checked):
+        self.btnPause.setText('Resume' if checked else 'Pause')
+        if self._pauseFns:
+            self._pauseFns[not checked]()
 
     def setCancel(self, fn=None):
         '''
@@ -41,11 +59,18 @@ class CancelProgressBar(QtWidgets.QWidget):
             self.btn.show()
         else:
             self.btn.hide()
+        self.btnPause.setVisible(self._pauseFns is not None)
         super().show()
 
     def hide(self):
         super().hide()
         self.btn.hide()
+        self.btnPause.hide()
+        self.btnPause.blockSignals(True)
+        self.btnPause.setChecked(False)
+        self.btnPause.setText('Pause')
+        self.btnPause.blockSignals(False)
+        self._pauseFns = None
         self.bar.setValue(0)
         self.bar.setFormat('')
         self.bar.setStyleSheet('')
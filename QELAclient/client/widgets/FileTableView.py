@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from PyQt5 import QtWidgets, QtCore, QtGui
 
@@ -5,141 +6,226 @@ from fancytools.os.PathStr import PathStr
 from fancytools.os import fileSize as fs
 from fancytools.utils.dateStr import dateStr
 from client.widgets._Base import QMenu
+from client.widgets.base.ColumnTableModel import ColumnTableModel
+from client.widgets.base.ColumnSortProxyModel import ColumnSortProxyModel
+from client.communication.downloader import (PRIORITY_HIGH, PRIORITY_LOW,
+                                             removePart)
+from client import imageCache
+
+
+def _toBytes(size):
+    '''
+    file size in bytes from int or str, e.g. '1.5 MB'
+    '''
+    try:
+        return int(size)
+    except ValueError:
+        return int(fs.toBytes(size))
+
+
+class SortTable(QtWidgets.QTableView):
+    '''
+    table view sorted by all columns
+    - sort priority is given by the (movable) column order
+    - clicking on a header changes the sort order of this column
+    '''
+
+    def __init__(self, model):
+        super().__init__()
+        self.proxy = ColumnSortProxyModel()
+        self.proxy.setSourceModel(model)
+        self.setModel(self.proxy)
+        self._ascending = [True] * model.columnCount()
+        self._selected = []
 
-
-class SortTable(QtWidgets.QTableWidget):
-    #     filled = QtCore.pyqtSignal(bool)  # success
-    STRING_LEN = 30
-
-    def __init__(self, labels):
-        super().__init__(1, len(labels))
-
-        self._cols = list(range(len(labels)))
-
-        # set header:
-        for i, l in enumerate(labels):
-            item = QtWidgets.QTableWidgetItem(l)
-            item.setIcon(QtWidgets.QApplication.style().standardIcon(
-                QtWidgets.QStyle.SP_TitleBarUnshadeButton))
-            item.sortOrder = 1
-            self.setHorizontalHeaderItem(i, item)
+        st = QtWidgets.QApplication.style()
+        self._icons = {True: st.standardIcon(
+            QtWidgets.QStyle.SP_TitleBarUnshadeButton),
+            False: st.standardIcon(QtWidgets.QStyle.SP_TitleBarShadeButton)}
+        for i in range(model.columnCount()):
+            self.proxy.headerIcons[i] = self._icons[True]
 
         h = self.horizontalHeader()
         h.setSectionResizeMode(h.ResizeToContents)
         h.setStretchLastSection(True)
         h.setSectionsMovable(True)
 
-        h.sectionMoved.connect(self._saveColPoscols)
         h.sectionMoved.connect(self._sort)
         h.sectionClicked.connect(self._changeColSortOrder)
+        # rows added/filtered reset the proxy - keep selected rows:
+        self.proxy.modelAboutToBeReset.connect(self._saveSelection)
+        self.proxy.modelReset.connect(self._restoreSelection)
 
         self.setEditTriggers(self.NoEditTriggers)
-
-    def setData(self, data):
-        data = self.filter(data)
-        self.setRowCount(len(data))
-        for y, row in enumerate(data):
-            for x, t in enumerate(row):
-                item = QtWidgets.QTableWidgetItem()
-                item.setText(t)
-                self.setItem(y, x, item)
-
-    def _changeColSortOrder(self, col):
-        item = self.horizontalHeaderItem(col)
-        st = QtWidgets.QApplication.style()
-        if item.sortOrder == 1:
-            item.sortOrder = -1
-            item.setIcon(st.standardIcon(
-                QtWidgets.QStyle.SP_TitleBarShadeButton))
-        else:
-            item.sortOrder = 1
-            item.setIcon(st.standardIcon(
-                QtWidgets.QStyle.SP_TitleBarUnshadeButton))
-
+        self.proxy.setFilter(self.filter)
         self._sort()
 
-    def data(self):
-        rows, cols = self.rowCount(), self.columnCount()
-        out = np.empty(shape=(rows, cols),
-                       dtype="<U%i" % self.STRING_LEN)
-        for x in range(cols):
-            for y in range(rows):
-                out[y, x] = self.item(y, x).text()
-        return out
+    def rowCount(self):
+        return self.proxy.rowCount()
 
-    def filter(self, data):
-        # dont filter by default // method should be subclassed
-        return data
+    def currentRow(self):
+        return self.currentIndex().row()
 
-    def setData2(self, data):
-        rows, cols = data.shape
-        for x in range(cols):
-            for y in range(rows):
-                self.item(y, x).setText(data[y, x])
+    def _changeColSortOrder(self, col):
+        self._ascending[col] = not self._ascending[col]
+        self.proxy.headerIcons[col] = self._icons[self._ascending[col]]
+        self._sort()
 
-    def _saveColPoscols(self, _, ifrom, ito):
-        self._cols[ifrom], self._cols[ito] = self._cols[ito], self._cols[ifrom]
-#         print(ifrom, ito, self._cols)
+    def filter(self, model):
+        '''
+        return bool array of rows to show or None (show all)
+        dont filter by default // method should be subclassed
+        '''
+        return None
 
     def update(self):
-        data = self.filter(self.data())
-        self.setData2(data)
-        for r in range(len(data)):
-            self.setRowHidden(r, False)
-        for r in range(len(data), self.rowCount()):
-            self.setRowHidden(r, True)
+        # filter and sort again:
+        self.proxy.invalidate()
 
     def _sort(self):
-        c = self.rowCount()
-        m = self.selectionModel()
-        yselect = [index.row() for index in m.selectedRows()]
-        d = self.data()
-        ll = len(self._cols) - 1
-        ind2 = np.arange(c)
-        for i, col in zip(range(ll, -1, -1), self._cols[::-1]):
-            o = self.horizontalHeaderItem(col).sortOrder
-            ind = d[:, self.col(i)].argsort(kind='quicksort'
-                                            if i == ll
-                                            else 'mergesort')
-
-            d = d[ind][::o]
-            # TODO: only move selected indices and not all of them to save some
-            # time
-            ind2 = ind2[ind][::o]
-
-        self.setData2(d)
-        # select lastly selected rows:
-        self.clearSelection()
-        ss = self.selectionMode()
-        self.setSelectionMode(self.MultiSelection)
-        [self.selectRow(ind2[yi]) for yi in yselect]
-        self.setSelectionMode(ss)
-
-    def col(self, index):
-        return self._cols[index]
+        h = self.horizontalHeader()
+        cols = [h.logicalIndex(i) for i in range(h.count())]
+        self.proxy.setSortKeys([(c, self._ascending[c]) for c in cols])
+
+    def selectedSourceRows(self):
+        return [self.proxy.mapToSource(index).row()
+                for index in self.selectionModel().selectedRows()]
+
+    def _saveSelection(self):
+        self._selected = self.selectedSourceRows()
+
+    def _restoreSelection(self):
+        if not self._selected:
+            return
+        sel = QtCore.QItemSelection()
+        last = self.proxy.columnCount() - 1
+        for row in self.proxy.proxyRows(self._selected):
+            sel.select(self.proxy.index(row, 0),
+                       self.proxy.index(row, last))
+        self.selectionModel().select(sel,
+                                     QtCore.QItemSelectionModel.Select)
+        self._selected = []
+
+
+class _FileTableModel(ColumnTableModel):
+    '''
+    path names and file name ... str
+    local and server date ... epoch float (nan = no file)
+    size ... bytes
+    '''
+    UPTODATE, NOTEXISTANT, OUTDATED, UNVERIFIED = 0, 1, 2, 3
+
+    def __init__(self, header, n, colors):
+        self._n = n
+        super().__init__(header, [str] * (n + 1) + [float, float, int],
+                         readonlyCols=range(n + 4))
+        self._colors = colors  # {state: QColor}
+        self.state = np.zeros(0, dtype=np.uint8)
+        # local file could not be verified by the server:
+        self.unverified = np.zeros(0, dtype=bool)
+
+    def clear(self):
+        self.unverified = np.zeros(0, dtype=bool)
+        super().clear()
+
+    def removeRowList(self, rows):
+        keep = np.ones(len(self.unverified), dtype=bool)
+        keep[[r for r in rows if r < len(keep)]] = False
+        self.unverified = self.unverified[keep]
+        super().removeRowList(rows)
+
+    def setUnverified(self, rows, flags):
+        if not len(rows):
+            return
+        self.unverified[rows] = flags
+        self.dataChanged.emit(self.index(min(rows), 0),
+                              self.index(max(rows), self.columnCount() - 1),
+                              [QtCore.Qt.ForegroundRole,
+                               QtCore.Qt.ToolTipRole])
+
+    def updateState(self):
+        '''
+        compare local and server date of all files
+        '''
+        local = self.column(self._n + 1)
+        server = self.column(self._n + 2)
+        state = np.full(len(local), self.UPTODATE, dtype=np.uint8)
+        with np.errstate(invalid='ignore'):
+            state[local < server] = self.OUTDATED
+        state[np.isnan(local)] = self.NOTEXISTANT
+        self.state = state
+        # new rows:
+        self.unverified = np.concatenate((
+            self.unverified[:len(state)],
+            np.zeros(len(state) - len(self.unverified), dtype=bool)))
+        if len(state):
+            self.dataChanged.emit(
+                self.index(0, 0),
+                self.index(len(state) - 1, self.columnCount() - 1),
+                [QtCore.Qt.ForegroundRole])
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.ForegroundRole:
+            row = index.row()
+            if row < len(self.state):
+                if self.unverified[row]:
+                    return self._colors.get(self.UNVERIFIED)
+                return self._colors.get(self.state[row])
+            return None
+        if role == QtCore.Qt.ToolTipRole:
+            row = index.row()
+            if row < len(self.unverified) and self.unverified[row]:
+                return 'Local file could not be verified by our server'
+            return None
+        return super().data(index, role)
+
+    def text(self, row, col):
+        if col in (self._n + 1, self._n + 2):
+            val = self.column(col)[row]
+            return '' if np.isnan(val) else dateStr(val)
+        if col == self._n + 3:
+            return fs.toStr(self.column(col)[row])
+        return super().text(row, col)
 
 
 class FileTableView(SortTable):
     COL_OUTDATED = QtGui.QColor(229, 83, 0)  # dark orange
     COL_NOTEXISTANT = QtCore.Qt.darkGreen
+    COL_UNVERIFIED = QtCore.Qt.red
 
-    def __init__(self, labels, fnOpen, fnDownload, fnVerify=None):
+    def __init__(self, labels, fnOpen, fnDownload, fnVerify=None,
+                 fnCancel=None):
         self._n = len(labels)
         labels.extend(['File', 'Local date', 'Server date', 'Size'])
-        super().__init__(labels)
+        M = _FileTableModel
+        self.files = M(labels, self._n, {
+            M.NOTEXISTANT: QtGui.QBrush(self.COL_NOTEXISTANT),
+            M.OUTDATED: QtGui.QBrush(self.COL_OUTDATED),
+            M.UNVERIFIED: QtGui.QBrush(self.COL_UNVERIFIED)})
+        super().__init__(self.files)
         self.setSelectionBehavior(self.SelectRows)
-        
+
         self.fnOpen = fnOpen
         self.fnDownload = fnDownload
-        self.fnVerify = fnVerify        
-        
-        self._serverfiles = []
+        # fnVerify(paths, fnDone, fnVerified) verifies files in background:
+        self.fnVerify = fnVerify
+        # fnCancel(localpaths) stops downloading files:
+        self.fnCancel = fnCancel
+        # optional FileIndex - faster than reading all local files:
+        self.fileIndex = None
+
+        self._serverfiles = {}  # {path: (date, size)}
+        self._versions = {}  # {split path tuple: (date, size in bytes)}
+        self._rows = None  # see _fileRows
         self._menu = m = QMenu()
         m.addAction('Open selected file(s)').triggered.connect(
             self._openSelected)
         m.addAction("Open folder(s)").triggered.connect(self._openFolders)
         m.addAction("Copy selected file(s) into new folder").triggered.connect(
             self._copyToNewFolder)
+        if fnCancel is not None:
+            m.addAction("Cancel download of selected file(s)"
+                        ).triggered.connect(self._cancelSelected)
         self.horizontalHeader().setDefaultAlignment(QtCore.Qt.AlignLeft)
 
     def pathSplit(self, path):
@@ -149,8 +235,11 @@ class FileTableView(SortTable):
         return PathStr(pathlist[0]).join(*pathlist[1:])
 
     def setLocalPath(self, path):
-        data = self._pathToData(path)
-        self.setData(data)
+        columns = self._pathToData(path)
+        self._rows = None
+        self.files.clear()
+        self.files.appendRows(columns)
+        self.files.updateState()
 
     def _copyToNewFolder(self):
         f = QtWidgets.QFileDialog.getExistingDirectory()
@@ -161,13 +250,11 @@ class FileTableView(SortTable):
             done = self._openSelected(open=False, silent=True)
             if done:
                 self._docopyToNewFolder()
-            
-    def _docopyToNewFolder(self):
+
+    def _docopyToNewFolder(self, *_args):
         self.setEnabled(True)
         f = self._tempF
-        m = self.selectionModel()
-        for index in m.selectedRows():
-            y = index.row()
+        for y in self.selectedSourceRows():
             path = self._path2(y)
             self._root.join(path).copy(PathStr(f).join(path.basename()))
         QtGui.QDesktopServices.openUrl(QtCore.QUrl(f))
@@ -175,52 +262,62 @@ class FileTableView(SortTable):
         del self._tempF
         del self._downloadDone_backup
 
+    def _cancelSelected(self):
+        self.fnCancel([self._root.join(self._path2(y))
+                       for y in self.selectedSourceRows()])
+
     def _openFolders(self):
-        m = self.selectionModel()
-        for index in m.selectedRows():
-            y = index.row()
+        for y in self.selectedSourceRows():
             path = self._path2(y)
             fullpath = self._root.join(path).dirname()
             QtGui.QDesktopServices.openUrl(
                 QtCore.QUrl.fromLocalFile(fullpath))
 
+    def readAhead(self):
+        '''
+        decode images of the next and previous row in background
+        '''
+        r = self.currentRow()
+        rows = [self.proxy.sourceRow(i) for i in (r + 1, r - 1)
+                if 0 <= i < self.rowCount()]
+        imageCache.readAhead(
+            self._root.join(self._path2(y)) for y in rows
+            if self.files.state[y] != _FileTableModel.NOTEXISTANT)
+
     def _path2(self, y):
+        '''
+        relative file path of source row [y]
+        '''
         pp = []
         for x in range(self._n + 1):
-            txt = self.item(y, x).text()
+            txt = self.files.column(x)[y]
             if txt:
                 pp.append(txt)
         return self.pathJoin(pp)
 
+    def _rowKey(self, y):
+        '''
+        split path tuple of source row [y], see _fileRows
+        '''
+        return tuple(t for t in (self.files.column(x)[y]
+                                 for x in range(self._n + 1)) if t)
+
     def _openSelected(self, open=True, silent=False):  # TODO: rename
         '''
-        returns Flase if is downloading and True is is ready
+        returns Flase if is downloading/verifying and True is is ready
         '''
         toDownload, downIndices = [], []
+        toVerify, verifyIndices = [], []
 
-        def openFile(path):
-            if open:
-                fullpath = self._root.join(path)
-                self.fnOpen(fullpath)
-
-        def fileVerified(path):
-            # check signature of local file, if cannot be verified, download again
-            if self.fnVerify is None:
-                return True
-            return self.fnVerify(path)
-
-        def addDownload(path, y): 
-            toDownload.append(path)
-            downIndices.append(y)
-            
         QQ = QtWidgets.QMessageBox
-        
+        M = _FileTableModel
+
         m = self.selectionModel()
         for index in m.selectedRows():
-            y = index.row()
+            y = self.proxy.mapToSource(index).row()
             path = self._path2(y)
-            color = self.item(y, 0).foreground()
-            if color == self.COL_OUTDATED:  # file exists but is outdated
+            state = self.files.state[y]
+            if state == M.OUTDATED:  # file exists but is outdated
                 if silent:
                     ret = QQ.Yes
                 else:
@@ -234,159 +331,273 @@ class FileTableView(SortTable):
                     msgBox.setStandardButtons(QQ.Yes | QQ.No)
                     msgBox.setDefaultButton(QQ.Yes)
                     ret = msgBox.exec_()
-                if ret == QQ.Yes or not fileVerified(path):
-                    addDownload(path, y)
+                if ret == QQ.Yes:
+                    toDownload.append(path)
+                    downIndices.append(y)
                 else:
-                    openFile(path)
-                    
-            elif color == self.COL_NOTEXISTANT:  # no local file
-                addDownload(path, y)
+                    toVerify.append(path)
+                    verifyIndices.append(y)
+
+            elif state == M.NOTEXISTANT:  # no local file
+                toDownload.append(path)
+                downIndices.append(y)
             else:  # exists and is up-to-date
-                if not fileVerified(path):
-                    addDownload(path, y)
-                else:
-                    openFile(path)
-                
+                toVerify.append(path)
+                verifyIndices.append(y)
+
+        if toVerify and self.fnVerify is not None:
+            # check signature of local files, if cannot be verified,
+            # download again:
+            self.setEnabled(False)
+            self.fnVerify(
+                toVerify,
+                lambda results: self._verifyDone(
+                    toVerify, verifyIndices, results,
+                    toDownload, downIndices, open),
+                lambda ind, results: self.files.setUnverified(
+                    [verifyIndices[i] for i in ind],
+                    [r is False for r in results]))
+            return False
+        if open:
+            for path in toVerify:
+                self.fnOpen(self._root.join(path))
         if toDownload:
             self._download(toDownload, downIndices, open)
             return False
         return True
 
-    def sync(self):
-        toDownload, downIndices = [], []
-        for y in range(self.rowCount()):
-            path = self._path2(y)
-            col = self.item(y, 0).foreground()
-            if col in (self.COL_OUTDATED, self.COL_NOTEXISTANT):
+    def _verifyDone(self, paths, rows, results, toDownload, downIndices,
+                    openLater):
+        self.setEnabled(True)
+        failed = [p for p, r in zip(paths, results) if r is False]
+        again = failed and self._askDownloadAgain(failed)
+        for path, y, r in zip(paths, rows, results):
+            if r is False and again:
                 toDownload.append(path)
                 downIndices.append(y)
+            elif openLater:
+                self.fnOpen(self._root.join(path))
         if toDownload:
-            self._download(toDownload, downIndices, False)
+            self._download(toDownload, downIndices, openLater)
+        else:
+            # nothing to download - e.g. copy files, see _copyToNewFolder:
+            self._downloadDone([], [], False)
 
-    def _download(self, toDownload, downIndices, openLater=True):
-        self.setEnabled(False)
-#         self.setDynamic(False)
-        self._toDownload = toDownload
-        self.downIndices = downIndices
-        self._openLater = openLater
-        self.fnDownload(toDownload, self._root, self._downloadDone)
+    def _askDownloadAgain(self, paths):
+        QQ = QtWidgets.QMessageBox
+        txt = '\n'.join(paths[:10])
+        if len(paths) > 10:
+            txt += '\n...'
+        ret = QQ.warning(self, 'Verification error', '''{} file(s) 
+could  not be verified by our server. 
+It is possible, that they have been tampered with. 
+Would you like to  download them again?.
 
-    def rowColor(self, row, color):
-        for x in range(self.columnCount()):
-            self.item(row, x).setForeground(color)
+{}'''.format(len(paths), txt), QQ.Yes | QQ.No)
+        return ret == QQ.Yes
 
-    def _downloadDone(self):
+    def sync(self):
+        downIndices = np.flatnonzero(
+            self.files.state != _FileTableModel.UPTODATE).tolist()
+        toDownload = [self._path2(y) for y in downIndices]
+        if toDownload:
+            # background sync - files opened by the user are downloaded first:
+            self._download(toDownload, downIndices, False, PRIORITY_LOW)
+
+    def _download(self, toDownload, downIndices, openLater=True,
+                  priority=PRIORITY_HIGH):
+        if priority == PRIORITY_HIGH:
+            # table stays enabled during background sync, so files can be
+            # opened in the meantime
+            self.setEnabled(False)
+#         self.setDynamic(False)
+        fnDone = self._downloadDone  # can be exchanged, see _copyToNewFolder
+
+        def done(*_):
+            if self.fileIndex is not None:
+                # files can be overwritten without changing their folder date:
+                self.fileIndex.touch(self._root, toDownload)
+            self._updateLocalDates(toDownload, downIndices)
+            fnDone(toDownload, downIndices, openLater)
+
+        # an interrupted download is only continued for the same version:
+        versions = [self._versions.get(self._rowKey(y)) for y in downIndices]
+        self.fnDownload(toDownload, self._root, done, priority, versions)
+
+    def _updateLocalDates(self, paths, rows):
+        dates = []
+        for path in paths:
+            try:
+                dates.append(os.path.getmtime(self._root.join(path)))
+            except OSError:
+                dates.append(np.nan)
+        self.files.setColumn(self._n + 1, dates, rows)
+        self.files.updateState()
+        self.files.setUnverified(rows, False)
+
+    def _downloadDone(self, toDownload, downIndices, openLater):
         self.setEnabled(True)
-        for path, y in zip(self._toDownload, self.downIndices):
-            self.rowColor(y, QtCore.Qt.black)
-            if self._openLater:
+        if openLater:
+            for path in toDownload:
                 self.fnOpen(self._root.join(path))
 
-    def _sort(self):
-        super()._sort()
-        # set color depending on local and server file date:
-        for row in range(self.rowCount()):
-            localdate = self.item(row, self._n + 1).text()
-            serverdate = self.item(row, self._n + 2).text()
-            if localdate == '':
-                color = self.COL_NOTEXISTANT
-            elif localdate >= serverdate:
-                color = QtCore.Qt.black
-            else:
-                color = self.COL_OUTDATED
-            self.rowColor(row, color)
-
     def stats(self):
-        nlocal, nserver, noutdated = 0, 0, 0
-        slocal, sserver, soutdated = 0, 0, 0
-        for row in range(self.rowCount()):
-            itemSize = self.item(row, self._n + 3)
-            size = fs.toBytes(itemSize.text())
-
-            if itemSize.foreground() == self.COL_OUTDATED:
-                noutdated += 1
-                soutdated += size
-            elif itemSize.foreground() == self.COL_NOTEXISTANT:
-                nserver += 1
-                sserver += size
-            else:  # itemSize.foreground() == QtCore.Qt.black:
-                nlocal += 1
-                slocal += size
-        return (nlocal, nserver, noutdated,
-                fs.toStr(slocal), fs.toStr(sserver), fs.toStr(soutdated))
+        size = self.files.column(self._n + 3)
+        state = self.files.state
+        M = _FileTableModel
+        n, s = [], []
+        for st in (M.UPTODATE, M.NOTEXISTANT, M.OUTDATED):
+            ind = state == st
+            n.append(int(np.count_nonzero(ind)))
+            s.append(fs.toStr(int(size[ind].sum())))
+        return tuple(n + s)
+
+    def _fileRows(self):
+        '''
+        returns {split path tuple: source row}
+        built once for every new local path, new server files are added
+        '''
+        if self._rows is None:
+            rows = {}
+            names = zip(*(self.files.column(x) for x in range(self._n + 1)))
+            for y, key in enumerate(names):
+                rows.setdefault(tuple(t for t in key if t), y)
+            self._rows = rows
+        return self._rows
 
     def _findFile(self, ss):
-        c = self.columnCount() - 3
-        for y in range(self.rowCount()):
-            found = True
-            for x in range(len(ss)):
-                t = self.item(y, x).text()
-                if t == '':
-                    t = self.item(y, self.col(c - 1)).text()
-                if t != ss[x]:
-                    found = False
-                    break
-            if found:
-                return y
+        return self._fileRows().get(tuple(ss))
+
+    def _splitPaths(self, paths):
+        '''
+        pathSplit for many paths
+        all files in a folder share the same folder names - only split once
+        '''
+        dirs = {}
+        out = []
+        for p in paths:
+            d, name = os.path.split(p)
+            try:
+                dd = dirs[d]
+            except KeyError:
+                dd = dirs[d] = self.pathSplit(p)[:-1]
+            out.append(dd + [name])
+        return out
+
+    def _toColumns(self, names, localdates, serverdates, sizes):
+        '''
+        returns model columns
+        names ... [[folder0, folder1..., file name], ...]
+        '''
+        n = self._n
+        columns = [[''] * len(names) for _ in range(n + 1)]
+        for y, dd in enumerate(names):
+            for x, name in enumerate(dd[:-1][:n]):
+                columns[x][y] = name
+            columns[n][y] = dd[-1]
+        columns.append(np.array(localdates, dtype=float))
+        columns.append(np.array(serverdates, dtype=float))
+        columns.append(np.array(sizes, dtype=np.int64))
+        return columns
 
     def updateServerFiles(self, serverfiles=None):
-        if serverfiles is None:
-            serverfiles = self._serverfiles
-        self._serverfiles = serverfiles
-        ccc = self.columnCount()
-        cc = ccc - 3
-        changed = False
-        for f, date, size in serverfiles:
-            ss = self.pathSplit(f)
-            
-            date = dateStr(float(date))
-
-            row = self._findFile(ss)
+        '''
+        serverfiles ... [(path, date, size), ...] complete server listing
+                        None: apply last listing again
+        '''
+        if serverfiles is not None:
+            self._serverfiles = {f: (date, size)
+                                 for f, date, size in serverfiles}
+            self._versions = {}
+        self._setServerFiles([(f, date, size) for f, (date, size)
+                              in self._serverfiles.items()])
+
+    def applyServerDelta(self, delta):
+        '''
+        apply changes of the server listing (see communication.delta)
+        '''
+        for (f,) in delta.removed:
+            self._serverfiles.pop(f, None)
+        changed = []
+        for (f,), (date, size) in delta.changed.items():
+            self._serverfiles[f] = (date, size)
+            changed.append((f, date, size))
+        if delta.removed:
+            removed = [f for (f,) in delta.removed]
+            rows = self._fileRows()
+            keys = list(map(tuple, self._splitPaths(removed)))
+            for k in keys:
+                self._versions.pop(k, None)
+            found = [rows[k] for k in keys if k in rows]
+            for r in found:
+                # interrupted downloads cannot be continued any more:
+                removePart(self._root.join(self._path2(r)))
+            self.files.setColumn(self._n + 2, [np.nan] * len(found), found)
+            if self.fileIndex is not None:
+                self.fileIndex.setServerDates(
+                    self._root, [(f, None) for f in removed])
+            local = self.files.column(self._n + 1)
+            gone = [r for r in found if np.isnan(local[r])]
+            if gone:
+                # neither on server nor local:
+                self.files.removeRowList(gone)
+                self._rows = None
+        self._setServerFiles(changed)
+
+    def _setServerFiles(self, serverfiles):
+        rows = self._fileRows()
+        row0 = self.files.rowCount()
+        new, newdates, newsizes = [], [], []
+        found, founddates, dates = [], [], []
+        for (f, date, size), ss in zip(
+                serverfiles, self._splitPaths(f[0] for f in serverfiles)):
+            date, size = float(date), _toBytes(size)
+            key = tuple(ss)
+            self._versions[key] = (date, size)
+            row = rows.get(key)
             if row is None:
                 # no local file exist -  add new row:
-                changed = True
-                row = self.rowCount()
-                self.setRowCount(row + 1)
-                newss = ss[:-1]  # remove file size
-                if len(ss) < cc:
-                    newss.extend([''] * (cc - len(ss)))
-                newss.extend((ss[-1], '', date, size))
-                for x, si in enumerate(newss):
-                    item = QtWidgets.QTableWidgetItem()
-                    item.setText(si)
-                    self.setItem(row, self.col(x), item)
+                rows[key] = row0 + len(new)
+                new.append(ss)
+                newdates.append(date)
+                newsizes.append(size)
             else:
                 # add server date in found row
-                self.item(row, self._n + 2).setText(date)
+                found.append(row)
+                founddates.append(date)
+            dates.append((f, date))
 
-        if changed:
-            self._sort()
+        if self.fileIndex is not None:
+            self.fileIndex.setServerDates(self._root, dates)
 
-    def _pathToData(self, rootpath):
-        '''returns 2d array of all files in [rootpath], splitted by folder'''
-        self._root = rootpath
+        self.files.setColumn(self._n + 2, founddates, found)
+        if new:
+            # add all new rows at once:
+            self.files.appendRows(self._toColumns(
+                new, np.full(len(new), np.nan), newdates, newsizes))
+        self.files.updateState()
+
+    def _localFiles(self, rootpath):
+        '''
+        returns [(relative path, size, date, server date), ...] of all files
+        in [rootpath], date as epoch, server date is nan if unknown
+        '''
+        if self.fileIndex is not None:
+            return self.fileIndex.update(rootpath)
         f = list(PathStr(rootpath).nestedFiles(includeroot=False))
         f = [fi for fi in f if not fi.isHidden()]
-        data = [self.pathSplit(fi) for fi in f]
-        dates = [dateStr(rootpath.join(fi).date()) for fi in f]
-        sizes = [fs.toStr(rootpath.join(fi).size()) for fi in f]
-        # transform list of lists into array:
-#         lmax = max([len(d) for d in data])
-        data2 = np.zeros(shape=(len(data), self.columnCount()),
-                         dtype="<U%i" % self.STRING_LEN)
-
-        pathindices = np.array([self.col(ni) for ni in range(self._n)])
-        fileindex = self.col(self._n)
-        sizeindex = self.col(self._n + 3)
-        dateindex = self.col(self._n + 1)
-        for (dd, d2, date, size) in zip(data, data2, dates, sizes):
-            #             if 'DATA' in dd:
-            #                 print(dd)
-            d2[pathindices[:len(dd) - 1]] = dd[:-1]
-            d2[fileindex] = dd[-1]
-            d2[sizeindex] = size
-            d2[dateindex] = date
-        return data2
+        return [(fi, rootpath.join(fi).size(), rootpath.join(fi).date(),
+                 np.nan) for fi in f]
+
+    def _pathToData(self, rootpath):
+        '''returns columns of all files in [rootpath], splitted by folder'''
+        self._root = rootpath
+        files = self._localFiles(rootpath)
+        if not files:
+            return self._toColumns([], [], [], [])
+        paths, sizes, dates, serverdates = zip(*files)
+        return self._toColumns(self._splitPaths(paths), dates, serverdates,
+                               sizes)
 
     def mousePressEvent(self, event):
         '''open context menu'''
@@ -400,10 +611,6 @@ class FileTableView(SortTable):
 
 
 if __name__ == '__main__':
-    a = np.array([['A', 'B', 'C', 'A', 'B', 'C'],
-                  ['1', '1', '2', '2', '3', '1'],
-                  ['AA', 'BB', 'cc', 'dd', 'ee', 'ff']])
-
     import sys
     #######################
     # temporary fix: app crack doesnt through exception
@@ -9,7 +9,8 @@ from pyqtgraph_karl.imageview.ImageView import ImageView
 
 from dataArtist.items.PerspectiveGridROIbase import PerspectiveGridROI as PGROI
 # LOCAL
-from client.imread import imread
+from client.imageCache import imread
+from client.imread import overview
 from imgProcessor.transformations import toGray
 
 pg.setConfigOption('foreground', 'k')
@@ -43,6 +44,16 @@ class ImageView2(ImageView):
         self.ui.roiPlot.setMouseEnabled(False, False)
         self.ui.roiPlot.hide()
 
+    def setOverview(self, img, gray=False, **kwargs):
+        '''
+        show a downscaled [img] for large images
+        coordinates stay those of the full image
+        '''
+        small, step = overview(img)
+        if gray:
+            small = toGray(small)
+        self.setImage(small, scale=(step, step), **kwargs)
+
 
 class GridEditor(QtWidgets.QWidget):
     gridChanged = QtCore.pyqtSignal(str, object)
@@ -139,8 +150,8 @@ class GridEditorDialog(QtWidgets.QDialog):
 
         self.editor = GridEditor(*args, **kwargs)
         # set image
-        img = toGray(imread(imagepath))  # , 'gray')
-        self.editor.imageview.setImage(img)
+        img = imread(imagepath)
+        self.editor.imageview.setOverview(img, gray=True)
 
         if 'vertices' not in kwargs:
             # set vertices
@@ -177,12 +188,20 @@ class CompareGridEditor(GridEditor):
         self.layout().addWidget(self.imageview2, 1, 1)
 
     def readImg1(self, path):
-        img = imread(path)
-        self.imageview.setImage(img, autoRange=False)
+        self.setImg1(imread(path))
 
     def readImg2(self, path):
-        img = imread(path)
-        self.imageview2.setImage(img, autoRange=False)
+        self.setImg2(imread(path))
+
+    def setImg1(self, img):
+        self.imageview.setOverview(img, autoRange=False)
+
+    def setImg2(self, img):
+        self.imageview2.setOverview(img, autoRange=False)
+
+    def clearImgs(self):
+        self.imageview.clear()
+        self.imageview2.clear()
 
 
 if __name__ == '__main__':
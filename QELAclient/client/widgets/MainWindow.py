@@ -8,11 +8,15 @@ from PyQt5 import QtWidgets, QtGui, QtCore
 from fancywidgets.pyQtBased.StatusBar import StatusBar
 
 from fancytools.os.yieldOtherProgramInstances import yieldOtherProgramInstances
-from fancytools.os.fileCheckSum import fileCheckSum
 from fancytools.os.PathStr import PathStr
 # LOCAL:
 import client
+from client import hashing
 from client.communication import dataArtist
+from client.communication.downloader import Downloader, PRIORITY_HIGH
+from client.communication.verifier import VerifyThread
+from client.communication.subscriptions import Subscriptions
+from client.communication.batching import BatchedServer
 from client.widgets.TabUpload import TabUpload
 from client.widgets.TabDownload import TabDownload
 from client.widgets.TabConfig import TabConfig
@@ -29,47 +33,6 @@ from client.widgets.Account import Account
 from client.widgets.Tour import Tour
 
 
-class _DownloadThread(QtCore.QThread):
-    sigUpdate = QtCore.pyqtSignal(int)
-    sigDone = QtCore.pyqtSignal(object)
-
-    def __init__(self, gui, dfiles, root, **kwargs):
-        super().__init__()
-        self.gui = gui
-        self._dFiles = dfiles
-        self._cancel = False
-        self._root = root
-        self.kwargs = kwargs
-        
-    def run(self):
-        df = self._dFiles
-        if not type(df) in (tuple, list):
-            df = [df]
-        ll = len(df)
-        files = []
-
-        for i, f in enumerate(df):
-            if self._cancel:
-                break
-            if ll == 1 and self._root.isFileLike():
-                # local file = root 
-                localpath = self._root
-            else:
-                # local  file = root\relFilePath
-                localpath = self._root.join(f)
-            self.gui.server.download(f, localpath, **self.kwargs)
-            files.append(localpath)
-
-            self.sigUpdate.emit(int(100 * (i + 1) / ll))
-        
-        if ll == 1 and len(files):
-            files = files[0]
-        self.sigDone.emit(files)
-
-    def kill(self):
-        self._cancel = True
-
-
 class MainWindow(QtWidgets.QMainWindow):
     PATH = client.PATH
     sigMoved = QtCore.pyqtSignal(QtCore.QPoint)
@@ -80,15 +43,23 @@ class MainWindow(QtWidgets.QMainWindow):
         self.user = user
         self.pwd = pwd
         self.login = login
-        self.server = server
+        # send small requests together:
+        self.server = server = BatchedServer(server)
         FIRST_START = not self.PATH.join(user).exists()
         self.PATH_USER = self.PATH.mkdir(user)
         # TODO: read last root from config
         self.root = self.PATH_USER.mkdir("local")
         self.updateProjectFolder()
 
-        self._downloadQueue = []
-        self._downloadThread = None
+        self._downloader = Downloader(server)
+        self._downloader.sigProgress.connect(self._downloadProgress)
+        self._downloader.sigFileDone.connect(self._downloadFileDone)
+        self._downloader.sigJobDone.connect(self._downloadJobDone)
+        self._downloader.sigIdle.connect(self._downloadDone)
+        self._verifyThreads = []
+        # server changes for all tabs:
+        self.subscriptions = Subscriptions(server)
+        self._hashAlgorithm = None  # see hashAlgorithm
         self._tempview = None
         self._lastW = None
         self._startTourExample = False
@@ -196,6 +167,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self._tempBars = []
         self.tabCheck.checkUpdates()
+        self.subscriptions.start()
 #         FIRST_START = True
 
         self.restoreLastSession()
@@ -218,6 +190,7 @@ Would you like to take a quick tour?''' % self.user,
     def saveSession(self):
         s = self.PATH_USER.join('session.json')
         c = {'config':self.tabConfig.saveState(),
+             'preferences':self.tabConfig.preferences.saveLocalState(),
              'upload':self.tabUpload.saveState(),
              'download':self.tabDownload.saveState(),
              'check':self.tabCheck.saveState(),
@@ -242,14 +215,20 @@ Would you like to take a quick tour?''' % self.user,
                 self.restoreConfigFromServer()
             else:
                 self.tabConfig.restoreState(c['config'])
+                self.tabConfig.preferences.restoreLocalState(
+                    c.get('preferences', {}))
                 self.tabDownload.restoreState(c['download'])
                 self.tabUpload.restoreState(c['upload'])
                 self.tabCheck.restoreState(c['check'])
+                # continue upload interrupted in last session:
+                self.tabUpload.resumeUpload()
 
         except Exception:
             print('Could not restore last session')
 
     def _downloadDoneExampleImages(self, path):
+        if not path:
+            return  # download failed or canceled
         if not hasattr(self, '_tourSa'):
             self._tourExample_init(path)
         else:
@@ -398,10 +377,21 @@ highlight all all input fields with a tooltip'''
 #             print('ERROR loading last config: %s' % c)
 
     def updateWindowTitle(self, project=None):
+        '''
+        ask the server in background, project and credit with one request
+        '''
+        names = [project]
+
+        def setProject(name):
+            names[0] = name
+
+        def setCredit(credit):
+            self.setWindowTitle(
+                'QELA | User: %s | Project: %s | Credit: %s' % (
+                    self.user, names[0], credit))
         if project is None:
-            project = self.server.projectName()
-        self.setWindowTitle('QELA | User: %s | Project: %s | Credit: %s' % (
-            self.user, project, self.server.remainingCredit()))
+            self.server.later('projectName', fn=setProject)
+        self.server.later('remainingCredit', fn=setCredit)
 
     def _menuShowAbout(self):
         if self._about is None:
@@ -434,24 +424,32 @@ highlight all all input fields with a tooltip'''
         ll.extend(self.tabUpload.table.modules())
         return set(ll)
 
-    def verifyFile(self, path, warning=True):
+    def hashAlgorithm(self):
         '''
-        returns True if local file could be verified
+        fastest hash algorithm supported by this PC and the server
         '''
-        localpath = self.projectFolder().join(path)
-        checksum = fileCheckSum(localpath)
-        verified = self.server.verifyFile(path, checksum)
-        if not warning:
-            return verified
-        if not verified:
-            ret = QtWidgets.QMessageBox.warning(self, 'Verification error', '''File <{}> 
-could  not be verified by our server. 
-It is possible, that is has been tampered with. 
-Would you like to  download it again?.
-
-'''.format(path), QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
-            return ret == QtWidgets.QMessageBox.Yes
-        return True
+        if self._hashAlgorithm is None:
+            self._hashAlgorithm = hashing.negotiate(self.server)
+        return self._hashAlgorithm
+
+    def verifyFiles(self, paths, fnDone, fnVerified=None):
+        '''
+        let the server verify local files in background
+        paths ... relative to the project folder
+        fnDone([result, ...]) ... result: True (verified), False (not verified)
+                                  or None (server could not be asked)
+        fnVerified(indices, results) ... [optional] called for every batch
+        '''
+        root = self.projectFolder()
+        t = VerifyThread(self.server, paths, [root.join(p) for p in paths],
+                         algorithm=self.hashAlgorithm())
+        t.sigError.connect(self.statusBar().showError)
+        t.sigDone.connect(fnDone)
+        if fnVerified is not None:
+            t.sigVerified.connect(fnVerified)
+        t.finished.connect(lambda: self._verifyThreads.remove(t))
+        self._verifyThreads.append(t)
+        t.start()
 
     def openImage(self, path, **kwargs):
         txt = self.tabConfig.preferences.cbViewer.currentText()
@@ -503,42 +501,62 @@ Would you like to  download it again?.
         self._close()
 
     def _downloadDone(self):
-        self._downloadThread = None
         self.progressbar.hide()
 
-        if len(self._downloadQueue):
-            # work on next in queue
-            self.addDownload(*self._downloadQueue.pop(0))
+    def _downloadProgress(self, ndone, ntotal):
+        b = self.progressbar
+        b.bar.setValue(int(100 * ndone / ntotal))
+        b.bar.setFormat("Downloading file %i/%i" % (ndone, ntotal))
+
+    def _downloadFileDone(self, localpath, err):
+        if err and err != 'canceled':
+            self.statusBar().showError(
+                'Could not download %s: %s' % (localpath, err))
+
+    def _downloadJobDone(self, job):
+        files = job.files()
+        if job.single and files:
+            files = files[0]
+        # also if nothing was downloaded (error already shown):
+        job.sigDone.emit(files)
 
-    def addDownload(self, paths, root, fnsDone=None, **kwargs):
+    def addDownload(self, paths, root, fnsDone=None, priority=PRIORITY_HIGH,
+                    versions=None, **kwargs):
         '''
         paths tuple/list -> multiple files, str/Pathstr -> single file
         fnsDone tuple/list -> multiple functions, else -> single function
         
         roon ... either local to-file or download folder
+        priority ... files with lower values are downloaded first,
+                     e.g. PRIORITY_LOW for background sync
+        versions ... server (date, size) of [paths], see Downloader.download
         '''
+        d = self._downloader
+        d.nstreams = self.tabConfig.preferences.downloadStreams()
+        d.algorithm = self.hashAlgorithm()
+        job = d.download(paths, root, priority, versions, **kwargs)
+        if fnsDone is not None:
+            if type(fnsDone) not in (tuple, list):
+                fnsDone = [fnsDone]
+            for fn in fnsDone:
+                job.sigDone.connect(fn)
+
         b = self.progressbar
-        if self._downloadThread is None:
-            d = self._downloadThread = _DownloadThread(self, paths, root, **kwargs)
-            if fnsDone is not None:
-                if type(fnsDone) not in  (tuple, list):
-                    fnsDone = [fnsDone]
-                for fn in fnsDone:
-                    d.sigDone.connect(fn)
-            d.sigUpdate.connect(b.bar.setValue)
-            d.sigDone.connect(self._downloadDone)
-            d.start()
-
-            b.setColor('darkblue')
-            b.bar.setFormat("Downloading %p%")
-            b.setCancel(d.kill)
-            b.show()
-        else:
-            # already downloading something: add this one to queue
-            self._downloadQueue.append((paths, root, fnsDone))
+        b.setColor('darkblue')
+        b.setCancel(d.cancelAll)
+        b.show()
+
+    def cancelDownload(self, localpaths):
+        '''
+        stop downloading [localpaths] - running downloads after their
+        current chunk
+        '''
+        for p in localpaths:
+            self._downloader.cancel(p)
 
     def _close(self):
         self.saveSession()
+        self.subscriptions.stop()
         if self.server.isReady():
             self.hide()  # yieldOtherProgramInstances is quite slow, so close win first
             if not len(list(yieldOtherProgramInstances())):
@@ -1,18 +1,85 @@
 # -*- coding: utf-8 -*-
+import bisect
+from itertools import chain, zip_longest
+
 import numpy as np
 from PyQt5 import QtWidgets, QtCore, QtGui
 
 from fancytools.utils import json2 as json
+from fancytools.os.PathStr import PathStr
 
 # local
 from client.communication.utils import agendaFromChanged
+from client.communication.subscriptions import CHECK_TREE
 from client.widgets.Contact import Contact
 from client.widgets.GridEditor import CompareGridEditor
 from client.widgets._Base import QMenu
+from client.previews import PreviewCache, N_PREFETCH
 import client
 
 
 class QTreeWidget(QtWidgets.QTreeWidget):
+    '''
+    items are indexed by key: (ID,), (ID, meas) or (ID, meas, current)
+    and kept sorted by name - use insertKeyItem/removeKeyItem
+    ID items without measurements are hidden, not removed - their data
+    is only sent once
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._items = {}  # {key: item}
+        self._names = {}  # {parent key: [sorted child names]}
+
+    def itemFromKey(self, key):
+        if not key:
+            return self.invisibleRootItem()
+        return self._items.get(key)
+
+    def insertKeyItem(self, key):
+        '''
+        return item of [key], create it (and its parents) if missing
+        '''
+        item = self._items.get(key)
+        if item is None:
+            parent = self.insertKeyItem(key[:-1]) if len(key) > 1 \
+                else self.invisibleRootItem()
+            names = self._names.setdefault(key[:-1], [])
+            i = bisect.bisect_left(names, key[-1])
+            names.insert(i, key[-1])
+            item = self._items[key] = QtWidgets.QTreeWidgetItem([key[-1]])
+            parent.insertChild(i, item)
+            if parent.isHidden():
+                parent.setHidden(False)
+        return item
+
+    def removeKeyItem(self, key):
+        '''
+        remove item of [key] with all children and measurements left empty
+        '''
+        if key not in self._items:
+            return
+        self._forget(key)
+        pkey = key[:-1]
+        names = self._names[pkey]
+        i = bisect.bisect_left(names, key[-1])
+        del names[i]
+        parent = self.itemFromKey(pkey)
+        parent.takeChild(i)
+        if not names:
+            if len(pkey) > 1:
+                self.removeKeyItem(pkey)
+            elif pkey:
+                parent.setHidden(True)
+
+    def _forget(self, key):
+        for name in self._names.pop(key, ()):
+            self._forget(key + (name,))
+        del self._items[key]
+
+    @classmethod
+    def itemKey(cls, item):
+        return tuple(cls.itemInheranceText(item))
 
     def getAffectedItems(self):
         '''return list of all items in currently selected tree
@@ -69,12 +136,6 @@ class QTreeWidget(QtWidgets.QTreeWidget):
     def itemInheranceText(cls, item, col=0):
         return [i.text(col) for i in cls.itemInherence(item)]
 
-    @staticmethod
-    def findChildItem(parent, name, col=0):
-        for i in range(parent.childCount()):
-            if parent.child(i).text(col) == name:
-                return parent.child(i)
-
     def buildCheckTree(self, item=None, nintent=0):
         """
         output:
@@ -202,10 +263,9 @@ image within the image set.''')
         self.list.currentItemChanged.connect(self._loadImg)
 
         if self.gui is not None:
-            self._timer = QtCore.QTimer()
-            self._timer.setInterval(5000)
-            self._timer.timeout.connect(self.checkUpdates)
-            self._timer.start()
+            self.gui.subscriptions.subscribe(CHECK_TREE, self.buildTree)
+            self._previews = PreviewCache(self.gui.server)
+            self._previews.sigLoaded.connect(self._previewLoaded)
          
     def saveState(self):
         
@@ -229,19 +289,11 @@ image within the image set.''')
         self._selectFromName(state['selected'])
 
     def _selectFromName(self, ll):
+        # try to select item by listed name ll=[ID,meas,current]
         if ll:
-            root = self.list.invisibleRootItem()
-            
-            def fn(name, parent, ll):  # try to select item by listed name ll=[ID,meas,current]
-                for i in range(parent.childCount()):
-                    child = parent.child(i)
-                    if child.text(0) == name:
-                        if ll:
-                            return fn(ll.pop(0), child, ll)
-                        else:
-                            self.list.setCurrentItem(child)
-    
-            fn(ll.pop(0), root, ll)                    
+            item = self.list.itemFromKey(tuple(ll))
+            if item is not None:
+                self.list.setCurrentItem(item)
 
     def _toggleExpandAll(self, checked):
         if checked:
@@ -294,11 +346,8 @@ image within the image set.''')
                 if res != 'OK':
                     QtWidgets.QMessageBox.critical(self, 'Error removing measurements', res)
                 else:
-                    item = self.list.currentItem()
-                    parent = item.parent()
-                    if  parent is None:
-                        parent = self.list.invisibleRootItem()
-                    parent.removeChild(item)
+                    self.list.removeKeyItem(
+                        self.list.itemKey(self.list.currentItem()))
 
 #                 self.checkUpdates()
 
@@ -392,12 +441,13 @@ image within the image set.''')
 #             for j in range(meas.childCount()):
 #                 current = meas.child(j)
 
-    def _getIDmeasCur(self):
+    def _getIDmeasCur(self, item=None):
         '''
         returns ID, meas, cur, typ
         of current item index(0...id,1...meas,2...current)
         '''
-        item = self.list.currentItem()
+        if item is None:
+            item = self.list.currentItem()
         p = item.parent()
         if p is not None:
             pp = p.parent()
@@ -413,28 +463,60 @@ image within the image set.''')
             index = 'device'
         return ID, meas, cur, index
 
+    def _itemFolder(self, item=None):
+        '''
+        measurement folder of [item] relative to the project folder
+        '''
+        ID, meas, cur = self._getIDmeasCur(item)[:-1]
+        return PathStr(ID.text(0)).join(meas.text(0), cur.text(0))
+
+    def _neighbourFolders(self, item, folder):
+        '''
+        folders of the next and previous N_PREFETCH items, closest first
+        '''
+        below, above = [], []
+        for ll, fn in ((below, self.list.itemBelow),
+                       (above, self.list.itemAbove)):
+            i = item
+            while len(ll) < N_PREFETCH:
+                i = fn(i)
+                if i is None:
+                    break
+                try:
+                    f = self._itemFolder(i)
+                except AttributeError:
+                    # no current
+                    continue
+                if f != folder and f not in ll:
+                    ll.append(f)
+        return [f for f in chain(*zip_longest(below, above)) if f is not None]
+
+    def _previewLoaded(self, path, imgs):
+        if path == self._lastP:
+            self._grid.setImg1(imgs[0])
+            self._grid.setImg2(imgs[1])
+
     def _loadImg(self):
-        if not self.list.currentItem():
+        item = self.list.currentItem()
+        if not item:
             return
         try:
             ID, meas, cur = self._getIDmeasCur()[:-1]
-            txt = ID.text(0), meas.text(0), cur.text(0)
+            folder = self._itemFolder()
             root = self.gui.projectFolder()
-            p = root.join(*txt)
+            p = root.join(folder)
             if p == self._lastP:
                 return
             self._lastP = p
 
-            p0 = p.join(".prev_A.jpg")
-            p1 = p.join(".prev_B.jpg")
-            ll = len(root) + 1
-            if not p0.exists():
-                self.gui.server.download(p0[ll:], root.join(p0[ll:]))
-            if not p1.exists():
-                self.gui.server.download(p1[ll:], root.join(p1[ll:]))
-
-            self._grid.readImg1(p0)
-            self._grid.readImg2(p1)
+            # previews are downloaded and decoded in background:
+            imgs = self._previews.request(root, folder)
+            if imgs is None:
+                self._grid.clearImgs()
+            else:
+                self._previewLoaded(p, imgs)
+            self._previews.prefetch(
+                root, [folder] + self._neighbourFolders(item, folder))
 
             # load/change grid
             idata = ID.data(0, QtCore.Qt.UserRole)
@@ -455,87 +537,63 @@ image within the image set.''')
             self._grid.edBBX.setValue(nsublines[1])
             self._grid.edBBY.setValue(nsublines[0])
             self._updateBtnVerified(cdata['verified'])
-        except AttributeError as e:
+        except (AttributeError, TypeError) as e:
             print('error loading image: ', e)
 
     def toggleShowTab(self, show):
         t = self.gui.tabs
         t.setTabEnabled(t.indexOf(self), show)
 
-    def buildTree(self, tree):
-        show = bool(tree)
+    def buildTree(self, delta):
+        '''
+        apply changes of the check tree (see communication.delta)
+        delta.changed ... {(ID,): data, (ID, meas, current): data}
+        delta.removed ... {key, ...}
+        '''
+        citem = self.list.currentItem()
+        root = self.list.invisibleRootItem()
+        entries = self.gui.subscriptions.snapshots[CHECK_TREE].entries
+
+        def _addParam(key, params):
+            item = self.list.itemFromKey(key)
+            if item is None:
+                # sorted in at the right position:
+                item = self.list.insertKeyItem(key)
+                if params:
+                    if len(key) == 3:
+                        # modifiable:
+                        item.setData(0, QtCore.Qt.UserRole,
+                                     self._excludeUnchangableKeys(params))
+                    else:
+                        # ID -> grid
+                        item.setData(0, QtCore.Qt.UserRole, params)
+
+                    self._changeVerifiedColor(item)
+            if params:
+                # original:
+                item.setData(1, QtCore.Qt.UserRole, params)
+
+        # only touch changed items:
+        for key in delta.removed:
+            self.list.removeKeyItem(key)
+        # IDs first:
+        for key in sorted(delta.changed, key=len):
+            _addParam(key, delta.changed[key])
+            ID = key[:1]
+            item = self.list.itemFromKey(ID)
+            if (ID not in delta.changed and ID in entries and
+                    item.data(0, QtCore.Qt.UserRole) is None):
+                # ID item recreated, e.g. after its removal,
+                # but its data is unchanged - not in [delta]:
+                item.setData(0, QtCore.Qt.UserRole, entries[ID])
+                item.setData(1, QtCore.Qt.UserRole, entries[ID])
+
+        show = any(not root.child(i).isHidden()
+                   for i in range(root.childCount()))
         if show:
             self.list.show()
-            citem = self.list.currentItem()
-            
-            root = self.list.invisibleRootItem()
-            last = [root, None, None]
-
-            def _addParam(name, params, nindents):
-                if nindents:
-                    parent = last[nindents - 1]
-                else:
-                    parent = root
-                item = self.list.findChildItem(parent, name)
-                if item is None:
-                    item = QtWidgets.QTreeWidgetItem(parent, [name])
-                    if params:
-                        if nindents == 2:
-                            # modifiable:
-                            item.setData(0, QtCore.Qt.UserRole,
-                                         self._excludeUnchangableKeys(params))
-                        else:
-                            # nindents==1 -> grid
-                            item.setData(0, QtCore.Qt.UserRole, params)
-
-                        self._changeVerifiedColor(item)
-
-                last[nindents] = item
-                if params:
-                    params = params
-                    # original:
-                    item.setData(1, QtCore.Qt.UserRole, params)
-
-            # add new items / update existing:
-            IDdict = {}
-            for ID, data, meas in tree:
-                _addParam(ID, data, 0)
-                measdict = {}
-                IDdict[ID] = measdict
-#                 treenames.append([ID])
-                for m, currents in meas:
-                    _addParam(m, None, 1)
-                    curlist = []
-                    measdict[m] = curlist
-                    for current, data in currents:
-                        _addParam(current, data, 2)
-                        curlist.append(current)
-
-            # remove old ones:
-            def iterremove(parent, dic):
-                c = parent.childCount()
-                i = 0
-                while i < c:
-                    child = parent.child(i)
-                    txt = child.text(0)
-                    if isinstance(dic, dict):
-                        iterremove(child, dic[txt])
-                        if not child.childCount():
-                            # ... or empty parent items
-                            parent.removeChild(child)
-                            c -= 1
-                            i -= 1
-                    elif txt not in dic:
-                        # only remove 'current' items
-                        parent.removeChild(child)
-                        c -= 1
-                        i -= 1
-                    i += 1
-
-            iterremove(root, IDdict)
-                    
-            root.sortChildren(0, QtCore.Qt.AscendingOrder)
-            self.list.resizeColumnToContents(0)
+            if delta.changed:
+                self.list.resizeColumnToContents(0)
             if citem is None or citem.parent() is None:
                 self.list.setCurrentItem(self.list.itemAt(0, 0))
         self.toggleShowTab(show)
@@ -546,11 +604,13 @@ image within the image set.''')
         '''
         item = self.list.invisibleRootItem()
         for i in range(item.childCount()):
-            yield item.child(i).text(0)
+            ch = item.child(i)
+            if not ch.isHidden():
+                yield ch.text(0)
 
     def checkUpdates(self):
-        if self.gui.server.isReady() and self.gui.server.hasNewCheckTree():
-            self.buildTree(self.gui.server.checkTree())
+        # get the full tree, e.g. after the project changed:
+        self.gui.subscriptions.refresh(CHECK_TREE)
 
     def _toggleVerified(self):
         item = self._getIDmeasCur()[2]
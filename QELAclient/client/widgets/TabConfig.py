@@ -13,6 +13,9 @@ from client._html import toHtml
 from client.widgets.Projects import PNameValidator
 from client.widgets._Base import QMenu
 from client.widgets.base.Table import Table
+from client.communication.uploader import N_STREAMS
+from client.communication import downloader
+from client import imageCache
 
 IMG_HELP = PathStr(__file__).dirname().dirname().join('media', 'help')
 
@@ -577,8 +580,47 @@ until this option is switched off.""" % self._filePwd)
                 self._cb2fa.setEnabled(False)
         autologin.clicked.connect(self._changeAutologin)
 
+        self.sbStreams = QtWidgets.QSpinBox()
+        self.sbStreams.setRange(1, 32)
+        self.sbStreams.setValue(N_STREAMS)
+        self.sbStreams.setToolTip("""Number of parallel upload streams.
+Increase on fast connections to speed up uploading large agendas.""")
+        self.sbBandwidth = QtWidgets.QDoubleSpinBox()
+        self.sbBandwidth.setRange(0, 1000)
+        self.sbBandwidth.setSingleStep(0.5)
+        self.sbBandwidth.setSpecialValueText('unlimited')
+        self.sbBandwidth.setToolTip("""Maximum upload rate in MB/s.
+Limit to keep the network usable for others during large uploads.""")
+        l02 = QtWidgets.QHBoxLayout()
+        l02.addWidget(self.sbStreams)
+        l02.addWidget(QtWidgets.QLabel(" Upload streams  "))
+        l02.addWidget(self.sbBandwidth)
+        l02.addWidget(QtWidgets.QLabel(" Upload limit [MB/s]"))
+        l02.addStretch()
+
+        self.sbDownloads = QtWidgets.QSpinBox()
+        self.sbDownloads.setRange(1, 32)
+        self.sbDownloads.setValue(downloader.N_STREAMS)
+        self.sbDownloads.setToolTip("""Number of files downloaded in parallel.""")
+        self.sbImageCache = QtWidgets.QSpinBox()
+        self.sbImageCache.setRange(0, 64 * 1024)
+        self.sbImageCache.setSingleStep(128)
+        self.sbImageCache.setValue(imageCache.BUDGET // 2 ** 20)
+        self.sbImageCache.setToolTip("""Memory for decoded images in MB.
+Recently viewed images are shown without reading them again.""")
+        self.sbImageCache.valueChanged.connect(
+            lambda mb: imageCache.CACHE.setBudget(mb * 2 ** 20))
+        l03 = QtWidgets.QHBoxLayout()
+        l03.addWidget(self.sbDownloads)
+        l03.addWidget(QtWidgets.QLabel(" Download streams  "))
+        l03.addWidget(self.sbImageCache)
+        l03.addWidget(QtWidgets.QLabel(" Image cache [MB]"))
+        l03.addStretch()
+
         g0.setLayout(l0)
         l0.addLayout(l01)
+        l0.addLayout(l02)
+        l0.addLayout(l03)
         l0.addWidget(self._cb2fa)
         l0.addWidget(autologin)
 
@@ -871,6 +913,35 @@ Its reduction quality influences the overall calculation speed.
 #         self._btnCamReport.setEnabled(
 #             self.gui.server.cameraReportAvailable(cam))
 
+    def uploadStreams(self):
+        return self.sbStreams.value()
+
+    def downloadStreams(self):
+        return self.sbDownloads.value()
+
+    def uploadBandwidth(self):
+        '''
+        max. upload rate in bytes/s, 0 = unlimited
+        '''
+        return int(self.sbBandwidth.value() * 1024 ** 2)
+
+    def saveLocalState(self):
+        '''
+        client side preferences, which are not send to the server
+        '''
+        return {'upload_streams': self.sbStreams.value(),
+                'upload_bandwidth': self.sbBandwidth.value(),
+                'download_streams': self.sbDownloads.value(),
+                'image_cache': self.sbImageCache.value()}
+
+    def restoreLocalState(self, c):
+        self.sbStreams.setValue(c.get('upload_streams', N_STREAMS))
+        self.sbBandwidth.setValue(c.get('upload_bandwidth', 0))
+        self.sbDownloads.setValue(
+            c.get('download_streams', downloader.N_STREAMS))
+        self.sbImageCache.setValue(
+            c.get('image_cache', imageCache.BUDGET // 2 ** 20))
+
     def _removeCurrentCamera(self):
         cam = self.camOpts.currentText()
         ret = QtWidgets.QMessageBox.warning(self, 'Removing calibration for camera <%s>' % cam,
@@ -885,7 +956,11 @@ Its reduction quality influences the overall calculation speed.
             'No PDF report available for the chosen camera. Calibrate first!')
         else:
             local = self.gui.root.mkdir('cameras').join(cam + '.pdf')
-            self.gui.addDownload(cam, local, os.startfile, cmd='downloadCameraReport(%s)' % cam)
+            self.gui.addDownload(cam, local, self._openCameraReport, cmd='downloadCameraReport(%s)' % cam)
+
+    def _openCameraReport(self, path):
+        if path:  # else download failed or canceled
+            os.startfile(path)
 
     def _changeAutologin(self, enable):
         if not enable:
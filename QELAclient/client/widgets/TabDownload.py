@@ -1,11 +1,15 @@
 import numpy as np
-from PyQt5 import QtWidgets, QtCore, QtGui
+from PyQt5 import QtWidgets, QtGui
 
 from fancytools.os.PathStr import PathStr
 
 # Local:
 from client.widgets.FileTableView import FileTableView
+from client.communication.downloader import PRIORITY_HIGH
+from client.communication.subscriptions import FILES
+from client.communication.delta import Delta
 from client import IO_
+from client.fileIndex import FileIndex
 
 
 class TabDownload(QtWidgets.QWidget):
@@ -24,18 +28,18 @@ class TabDownload(QtWidgets.QWidget):
         ll = QtWidgets.QHBoxLayout()
         self.setLayout(ll)
         self._dFiles = []
+        self._newFiles = None  # Delta of server files not shown yet
+        self._ndownloads = 0
 
-        self._timerFiles = QtCore.QTimer()
-        self._timerFiles.setInterval(1000)
-        self._timerFiles.timeout.connect(self._checkFiles)
-        self._timerFiles.start()
+        gui.subscriptions.subscribe(FILES, self._serverFilesChanged)
         self.labelLocalPath = QtWidgets.QLabel('Local file path: ')
 
         leftL = QtWidgets.QVBoxLayout()
         lSyn = QtWidgets.QHBoxLayout()
 
         self.fileTableView = _MyFileTableView(
-            gui, self._fnDownload, self.gui.verifyFile)
+            gui, self._fnDownload, self.gui.verifyFiles,
+            self.gui.cancelDownload)
 
         self.btnSync = QtWidgets.QPushButton('Sync All Files')
         self.btnSync.clicked.connect(lambda: self.fileTableView.sync())
@@ -65,12 +69,19 @@ class TabDownload(QtWidgets.QWidget):
         leftL.addWidget(self.fileTableView, stretch=1)
         ll.addLayout(leftL, stretch=1)
 
+    def _serverFilesChanged(self, delta):
+        if self._newFiles is None:
+            self._newFiles = Delta()
+        self._newFiles.update(delta)
+        self._checkFiles()
+
     def _checkFiles(self):
-        if not self.isVisible() or not self.gui.server.isReady():
+        # only update visible table and not while downloading:
+        if self._newFiles is None or not self.isVisible() or self._ndownloads:
             return
-        if self.gui.server.hasNewFiles():
-            self.fileTableView.updateServerFiles(self.gui.server.availFiles())
-            self.updateStats()
+        delta, self._newFiles = self._newFiles, None
+        self.fileTableView.applyServerDelta(delta)
+        self.updateStats()
 
     def updateStats(self):
         (nlocal, nserver, noutdated,
@@ -88,12 +99,15 @@ class TabDownload(QtWidgets.QWidget):
 
         self.btnSync.setEnabled(nserver or noutdated)
 
-    def _fnDownload(self, paths, root, fnDone):
-        self._timerFiles.stop()
-        self.gui.addDownload(paths, root, (fnDone, self._downloadDone))
+    def _fnDownload(self, paths, root, fnDone, priority=PRIORITY_HIGH,
+                    versions=None):
+        self._ndownloads += 1
+        self.gui.addDownload(paths, root, (fnDone, self._downloadDone),
+                             priority, versions)
 
     def _downloadDone(self):
-        self._timerFiles.start()
+        self._ndownloads -= 1
+        self._checkFiles()
         self.updateStats()
 
     def _chooseRootPath(self):
@@ -131,6 +145,7 @@ class _MyFileTableView(FileTableView):
         self.gui = gui
         self._filter = None
         super(). __init__(IO_.hirarchy, self._open, *args)
+        self.fileIndex = FileIndex(gui.PATH_USER.join('files.db'))
 
     def _openNextRow(self):
         r = self.currentRow()
@@ -143,6 +158,7 @@ class _MyFileTableView(FileTableView):
     def _open(self, path):
         self.gui.openImage(path, prevFn=self._openPrevRow,
                                nextFn=self._openNextRow)
+        self.readAhead()
 
     def _openPrevRow(self):
         r = self.currentRow()
@@ -190,11 +206,12 @@ class _MyFileTableView(FileTableView):
             raise Exception('Filter type unknown')
 
         for c, hide in enumerate(h):
-            self.setColumnHidden(self.col(c), bool(hide))
+            self.setColumnHidden(c, bool(hide))
         self.update()
 
-    def filter(self, data):
+    def filter(self, model):
         if self._filter is None:
-            return data
-        ind = np.char.startswith(data[:, self.col(5)], self._filter)
-        return data[ind]
+            return None
+        names = model.column(5)
+        return np.fromiter((n.startswith(self._filter) for n in names),
+                           dtype=bool, count=len(names))
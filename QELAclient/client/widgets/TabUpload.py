@@ -1,28 +1,116 @@
+import os
+import time
+
 from PyQt5 import QtWidgets, QtCore, QtGui
 
 from fancytools.os.PathStr import PathStr
 # LOCAL
 from client.widgets._table import ImageTable, DragWidget
 from client.widgets._Base import QMessageBox
+from client.communication.uploader import Uploader, UploadJournal
+from client.communication.subscriptions import PROCESSING
+from client.checksumCache import ChecksumCache
 
 IMG_FILETYPES = ('tiff', 'tif', 'jpg', 'jpeg',
                  'bmp', 'jp2', 'png')
 
 
-class _UploadThread(QtCore.QThread):
-    sigUpdate = QtCore.pyqtSignal(bool)
-    sigDone = QtCore.pyqtSignal(int)
+class _HashThread(QtCore.QThread):
+    sigUpdate = QtCore.pyqtSignal(int)  # progress [%]
+    sigDone = QtCore.pyqtSignal(object)  # list of checksums
+
+    def __init__(self, paths):
+        super().__init__()
+        self.paths = paths
+        self._cancel = False
+
+    def kill(self):
+        self._cancel = True
+
+    def run(self):
+        # images are hashed in parallel, unchanged images are taken from cache
+        # (always sha256 - checksums are stored in the agenda):
+        cache = ChecksumCache()
+        try:
+            out = cache.checkSums(
+                self.paths, lambda: self._cancel,
+                fnProgress=lambda n, ntotal: self.sigUpdate.emit(
+                    int(100 * n / max(1, ntotal))))
+        finally:
+            cache.close()
+        if not self._cancel:
+            self.sigDone.emit(out)
+
+
+class _ScanThread(QtCore.QThread):
+    '''
+    walk through all dropped files and folders using os.scandir
+    and emit found images in batches, so the table can be filled
+    while scanning large (network) folders
+    '''
+    sigImages = QtCore.pyqtSignal(object)  # list of image paths
+    sigUpdate = QtCore.pyqtSignal(int, int)  # n images, n folders
+    sigDone = QtCore.pyqtSignal(object)  # list of agenda paths
+    interval = 0.3  # sec between two batches
 
-    def __init__(self, paths, table, server):
+    def __init__(self, paths):
         super().__init__()
         self.paths = paths
-        self.table = table
-        self.server = server
+        self._cancel = False
+
+    def kill(self):
+        self._cancel = True
 
     def run(self):
-        for index, p in enumerate(self.paths):
-            self.server.upload(p, self.sigUpdate)
-            self.sigDone.emit(index)
+        limg, lagenda = [], []
+        nimg, ndirs = 0, 0
+        t0 = time.time()
+        dirs = []
+
+        def add(path, name):
+            ftype = name[name.rfind('.') + 1:].lower()
+            if ftype in IMG_FILETYPES:
+                limg.append(path)
+            elif ftype == 'csv':
+                lagenda.append(path)
+
+        for path in self.paths:
+            if os.path.isdir(path):
+                dirs.append(path)
+            else:
+                add(path, path)
+        while dirs and not self._cancel:
+            d = dirs.pop()
+            ndirs += 1
+            try:
+                entries = list(os.scandir(d))
+            except OSError:
+                continue  # no permission, folder removed...
+            subdirs = []
+            # file type is known from directory listing in most cases,
+            # so no further stat calls are needed:
+            for e in sorted(entries, key=lambda e: e.name):
+                try:
+                    if e.is_dir():
+                        subdirs.append(e.path)
+                    elif e.is_file():
+                        add(PathStr(e.path), e.name)
+                except OSError:
+                    pass
+            # process sub folders in alphabetical order:
+            dirs.extend(reversed(subdirs))
+            t1 = time.time()
+            if t1 - t0 > self.interval:
+                t0 = t1
+                nimg += len(limg)
+                self.sigUpdate.emit(nimg, ndirs)
+                if limg:
+                    self.sigImages.emit(limg)
+                    limg = []
+        if limg:
+            self.sigImages.emit(limg)
+        self.sigUpdate.emit(nimg + len(limg), ndirs)
+        self.sigDone.emit(lagenda)
 
 
 class _ServerAgendas(QtWidgets.QWidget):
@@ -194,13 +282,17 @@ class TabUpload(QtWidgets.QWidget):
 
         self.gui = gui
         self._tableTempState = ()
+        self._uploader = Uploader(gui.server)
+        self._journal = None
+        self._processing = False  # images are processed on the server
+        gui.subscriptions.subscribe(PROCESSING, self._processingChanged)
         self.setAcceptDrops(True)
         lheader = QtWidgets.QHBoxLayout()
 
         self.cbMetaData = btn1 = QtWidgets.QCheckBox('Read image meta data')
         self.cbMetaData.setChecked(True)
         self.cbMetaData.setToolTip(
-            'Read camera parameters from file meta data / this will slow the import down')
+            'Read camera parameters from file meta data')
         self.cbMetaData.clicked.connect(self._btnAddMetaDataClicked)
 
         self.serverAgendas = _ServerAgendas(self)
@@ -300,11 +392,14 @@ class TabUpload(QtWidgets.QWidget):
         return False
 
     def _updateContingentMsg(self):
-        if self.gui.server.isReady():
-            iused, contingent, memused, memavail = self.gui.server.userPlan()
-            self.labelState.setText(
-                'Measurements: %s / %s daily    Memory: %s / %s GB' % (
-                    iused, contingent, memused, memavail))
+        self.gui.server.later('userPlan', fn=self._showContingentMsg,
+                              ifReady=True)
+
+    def _showContingentMsg(self, plan):
+        iused, contingent, memused, memavail = plan
+        self.labelState.setText(
+            'Measurements: %s / %s daily    Memory: %s / %s GB' % (
+                iused, contingent, memused, memavail))
 
     def activate(self):
         self._updateContingentMsg()
@@ -349,9 +444,40 @@ class TabUpload(QtWidgets.QWidget):
             return self._progressImgs()
 
         # upload new agenda and images
+        # hash all images first, to only upload what is not already on the server:
+        self.btnUpload.setEnabled(False)
+        self._hashThread = h = _HashThread(self.table.paths)
+        b = self.gui.progressbar
+        b.setColor('darkred')
+        b.bar.setFormat("Hashing images %p%")
+        b.setCancel(self._cancelHashing)
+        b.show()
+        h.sigUpdate.connect(b.bar.setValue)
+        h.sigDone.connect(self._uploadAgenda)
+        h.start()
+
+    def _cancelHashing(self):
+        self._hashThread.kill()
+        self._enableUpbloadBtn()
+
+    def _uploadAgenda(self, checksums):
+        self.gui.progressbar.hide()
+        CC = QtWidgets.QMessageBox.critical
+        # files removed or not readable since they were added:
+        missing = [str(p) for p, c in zip(self.table.paths, checksums)
+                   if c is None]
+        if missing:
+            self._enableUpbloadBtn()
+            if len(missing) > 20:
+                missing = missing[:20] + ['...']
+            return CC(self, "Could not read images",
+                      'Please remove these images from the table:\n%s'
+                      % '\n'.join(missing), QtWidgets.QMessageBox.Ok)
+        fol = self.gui.PATH_USER.join('upload')
         # AGENDA:
             # upload server version
-        csvstr, new_paths = self.table.toCSVStr(local=False)        
+        csvstr, new_paths = self.table.toCSVStr(local=False,
+                                                checksums=checksums)
         status, agenada_name = self.gui.server.setAgenda(csvstr)
         self._currentJob = agenada_name
 
@@ -359,6 +485,7 @@ class TabUpload(QtWidgets.QWidget):
             plocal = fol.join('FAIL') + '.csv'
             with open(plocal, 'w') as f:
                 f.write(csvstr)
+            self._enableUpbloadBtn()
             return CC(self, "Could not upload agenda ",
                             agenada_name , QtWidgets.QMessageBox.Ok)
 
@@ -376,28 +503,100 @@ class TabUpload(QtWidgets.QWidget):
                               icon=QtWidgets.QMessageBox.Information,
                               text='''If you proceed,\nyour account will be credited:\n%s''' % price)
             if box.exec_() == QtWidgets.QMessageBox.Cancel:
+                self._enableUpbloadBtn()
                 return    
 
+        # ask the server in one call which images it already holds:
+        try:
+            known = set(self.gui.server.knownChecksums(list(set(checksums))))
+        except (AttributeError, NotImplementedError):
+            # old server - upload all images
+            known = set()
+        rows, upaths, unew_paths, skipped = [], [], [], []
+        for row, (p, n, c) in enumerate(zip(paths, new_paths, checksums)):
+            if c in known:
+                skipped.append(row)
+            else:
+                # same image twice in agenda -> upload only once
+                known.add(c)
+                rows.append(row)
+                upaths.append(p)
+                unew_paths.append(n)
+
+        # record upload progress, to be able to continue after a restart:
+        journal = UploadJournal.new(self._journalPath(), agenada_name,
+                                    rows, upaths, unew_paths, skipped)
+        self._startUpload(journal)
+
+    def _journalPath(self):
+        # not in the upload folder, which only contains agendas:
+        return self.gui.PATH_USER.join('upload_journal.json')
+
+    def resumeUpload(self):
+        '''
+        continue upload, which was interrupted in the last session
+        '''
+        journal = UploadJournal.load(self._journalPath())
+        if journal is None:
+            return
+        agenda = self.gui.PATH_USER.join('upload', journal.agenda + '.csv')
+        if not agenda.exists():
+            return journal.remove()
+        try:
+            if self.gui.server.resumeUpload(journal.agenda) != 'OK':
+                # agenda not known anymore - start from scratch
+                return journal.remove()
+        except (AttributeError, NotImplementedError):
+            # old server cannot continue files - upload them again:
+            for f in journal.files:
+                f['done'] = []
+            journal.save()
+        self.setViewFilled()
+        self.table.fillFromFile(agenda)
+        self._currentJob = journal.agenda
+        self._startUpload(journal)
+
+    def _startUpload(self, journal):
+        self._journal = journal
+        rows = [f['row'] for f in journal.files]
         self.table.uploadStart()
         self.setAcceptDrops(False)
         self.dragW.setEnabled(False)
         self.btnUpload.setEnabled(False)
-        
-        h = QtWidgets.QTableWidgetItem()
-        h.setText('Progress')
+
         b = self.gui.progressbar
         b.setColor('darkred')
         b.setCancel(self.cancelUpload)
+        b.setPause(self._pauseUpload, self._resumeUpload)
         b.show()
-        self.gui.server.upload(paths, new_paths,
-            self.table.uploadUpdate, self._uploadDone, self._uploadError)
+        for row in journal.skipped:
+            self.table.uploadUpdate(row, 100)
+        prefs = self.gui.tabConfig.preferences
+        self._uploader.nstreams = prefs.uploadStreams()
+        self._uploader.bandwidth = prefs.uploadBandwidth()
+        self._uploader.upload([f['path'] for f in journal.files],
+                              [f['new_path'] for f in journal.files],
+            lambda index, val: self.table.uploadUpdate(rows[index], val),
+            self._uploadDone, self._uploadError, journal)
+
+    def _pauseUpload(self):
+        self._uploader.pause()
+        self.gui.progressbar.bar.setFormat('Upload paused')
+
+    def _resumeUpload(self):
+        # bandwidth limit could have been changed in the meantime:
+        self._uploader.bandwidth = \
+            self.gui.tabConfig.preferences.uploadBandwidth()
+        self._uploader.resume()
 
     def _uploadError(self, msg):
         QtWidgets.QMessageBox.critical(self, "Error uploading file",
                     msg, QtWidgets.QMessageBox.Ok)
-        self.cancelUpload()
+        # keep journal, so upload can be continued at next start:
+        self._stopUpload()
 
     def _uploadDone(self):
+        self._journal.remove()
         self.serverAgendas._buildAgendaMenu()
 
         self.gui.progressbar.hide()
@@ -423,17 +622,18 @@ class TabUpload(QtWidgets.QWidget):
             return
             
         self.btnUpload.setEnabled(False)
-        
-        self._timer = QtCore.QTimer()
-        self._timer.setInterval(1000)
-        self._timer.timeout.connect(self._updateProgressImages)
-        self._timer.start()
-        
+
+        self._processing = True
+        # dispatch processing state even if it didn't change
+        # since last job:
+        self.gui.subscriptions.refresh(PROCESSING)
+
         b = self.gui.progressbar
         b.setColor('purple')
         b.setCancel(self._processingCanceled)
         b.show()
         
+        # all sent with one request:
         self._updateProgressImages()
         self._updateContingentMsg()
         self.gui.updateWindowTitle()
@@ -447,8 +647,11 @@ class TabUpload(QtWidgets.QWidget):
             self.btnUpload.setEnabled(True)
 
     def _updateProgressImages(self):
-        if self.gui.server.isReady():
-            s = self.gui.server.stateProcessing()
+        self.gui.server.later('stateProcessing', fn=self._processingChanged,
+                              ifReady=True)
+
+    def _processingChanged(self, s):
+        if self._processing:
             b = self.gui.progressbar
             try:
                 # extract value from e.g. 'Correct Images 13%'
@@ -462,9 +665,8 @@ class TabUpload(QtWidgets.QWidget):
             except ValueError:
                 
                 def finish():
-                    self._timer.stop()
+                    self._processing = False
                     b.hide()
-                    del self._timer
                     self._enableUpbloadBtn()
                     
                 if s == 'DONE':
@@ -479,7 +681,14 @@ class TabUpload(QtWidgets.QWidget):
 
     def cancelUpload(self):
 #         self.gui.progressbar.hide()
+        self._uploader.cancel()
+        self._journal.remove()
         self.gui.server.cancelUpload()
+        self._stopUpload()
+
+    def _stopUpload(self):
+        self._uploader.cancel()
+        self.gui.progressbar.hide()
         self.table.uploadCancel()
 
         self.setAcceptDrops(True)
@@ -499,28 +708,11 @@ class TabUpload(QtWidgets.QWidget):
 
     def _getFilePathsFromUrls(self, urls):
         '''
-        return a list of all file paths in event.mimeData.urls()
+        return a list of all local file paths in event.mimeData.urls()
         '''
-        limg, lagenda = [], []
-
-        def _appendRecursive(path):
-            if path.isfile():
-                if path.filetype() in IMG_FILETYPES:
-                    limg.append(path)
-                elif path.filetype() == 'csv':
-                    lagenda.append(path)
-            else:
-                for f in path:
-                    # for all files in folder
-                    _appendRecursive(path.join(f))
-
         # one or more files/folders are dropped
-        for url in urls:
-            if url.isLocalFile():
-                path = PathStr(url.toLocalFile())
-                if path.exists():
-                    _appendRecursive(path)
-        return limg, lagenda
+        return [PathStr(url.toLocalFile()) for url in urls
+                if url.isLocalFile()]
 
     def setViewFilled(self, filled=True):
         self.lab.setVisible(not filled)
@@ -536,16 +728,45 @@ class TabUpload(QtWidgets.QWidget):
     def dropEvent(self, event):
         m = event.mimeData()
         if m.hasUrls():
+            paths = self._getFilePathsFromUrls(m.urls())
+            if not paths:
+                return
             self.btnUpload.setEnabled(False)
-
-            pathimgs, pathagendas = self._getFilePathsFromUrls(m.urls())
-            if pathimgs or pathagendas:
-                self.setViewFilled()
-            if pathimgs:
-                self.setAcceptDrops(False)
-#                 self.dragW.setExamplePath(pathimgs[0])
-                self.table.fillFromPaths(pathimgs)
-            for p in pathagendas:
-                self.table.fillFromFile(p, appendRows=True)
-            if not pathimgs and pathagendas:
-                self.setAcceptDrops(True)
+            self.setAcceptDrops(False)
+            # scan folders in thread to not block the GUI:
+            self._scan = th = _ScanThread(paths)
+            th.sigImages.connect(self._scanImagesFound)
+            th.sigUpdate.connect(self._scanUpdate)
+            th.sigDone.connect(self._scanDone)
+            self._nScannedImages = 0
+
+            self._bScan = b = self.gui.addTemporaryProcessBar()
+            b.bar.setRange(0, 0)  # unknown number of files: busy indicator
+            b.setCancel(th.kill)
+            b.show()
+            th.start()
+
+    def _scanUpdate(self, nimg, ndirs):
+        self._bScan.bar.setFormat(
+            "Scanning folders: %i images found in %i folders" % (nimg, ndirs))
+
+    def _scanImagesFound(self, paths):
+        if not self._nScannedImages:
+            self.setViewFilled()
+            self.table.beginFill()
+        self._nScannedImages += len(paths)
+        self.table.appendPaths(paths)
+
+    def _scanDone(self, pathagendas):
+        self.gui.removeTemporaryProcessBar(self._bScan)
+        if self._nScannedImages:
+            self.table.endFill()
+        elif pathagendas:
+            self.setViewFilled()
+        for p in pathagendas:
+            self.table.fillFromFile(p, appendRows=True)
+        if not self._nScannedImages:
+            if self.table.isEmpty():
+                self._initState()
+            else:
+                self._tableFilled()
@@ -1,3 +1,4 @@
+import os
 import numpy as np
 from datetime import datetime
 from PyQt5 import QtWidgets, QtCore, QtGui
@@ -5,12 +6,14 @@ from PyQt5 import QtWidgets, QtCore, QtGui
 from fancytools.utils import json2 as json
 from fancytools.os.PathStr import PathStr
 
-from imgProcessor.utils.metaData import metaData
-
 # local
+from client.metaDataCache import MetaDataReader
+from client.thumbnails import ThumbnailCache
+from client import imageCache
 from client.widgets.GridEditor import GridEditorDialog
-from client.parsePath import CAT_FUNCTIONS, parsePath, toRow
-from client.widgets.base.Table import Table
+from client.parsePath import CAT_FUNCTIONS, parsePath, compileStyle, toRow
+from client.widgets.base.TableView import TableView
+from client.widgets.base.ColumnTableModel import ColumnTableModel
 
 MATRIX_HEADER = ['Path',
                   "Measurement name",
@@ -19,8 +22,12 @@ MATRIX_HEADER = ['Path',
 MATRIX_HEADER_WIDTH = [335, 120,
                        # 57,
                         80, 70, 110, 100, 64, 62]
+MATRIX_DTYPES = [str, str, str, float, str, float, float, float, str]
+MATRIX_HEADER_TOOLTIPS = {1: '''If left empty: measurement name is set to measurement date. 
+In other words: A measurement will be defined as all images taken of one module at the same date'''}
 MANDATORY_COLS = [2, 3, 4]
 DELIMITER = ',\t'
+N_PREFETCH = 5  # number of previews to load above/below the current row
 
 
 class _OnlyIntDelegate(QtWidgets.QItemDelegate):
@@ -54,21 +61,151 @@ class _OnlyDateDelegate(QtWidgets.QItemDelegate):
         model.setData(index, editor.text(), QtCore.Qt.EditRole)
 
 
-class ImageTable(Table):
+class _ProgressDelegate(QtWidgets.QStyledItemDelegate):
+    '''
+    draw a progress bar in every row that is being uploaded
+    '''
+
+    def paint(self, painter, option, index):
+        val = index.data(QtCore.Qt.UserRole)
+        if val is None:
+            return super().paint(painter, option, index)
+        opt = QtWidgets.QStyleOptionProgressBar()
+        opt.rect = option.rect
+        opt.minimum = 0
+        opt.maximum = 100
+        opt.progress = val
+        opt.text = '%i%%' % val
+        opt.textVisible = True
+        QtWidgets.QApplication.style().drawControl(
+            QtWidgets.QStyle.CE_ProgressBar, opt, painter)
+
+
+class _ImageTableModel(ColumnTableModel):
+    '''
+    column based storage of ImageTable
+    path and options column are read-only
+    '''
+
+    def __init__(self):
+        # column 0 (path) is indexed for fast duplicate detection:
+        super().__init__(MATRIX_HEADER, MATRIX_DTYPES,
+                         readonlyCols=(0, len(MATRIX_HEADER) - 1),
+                         indexCol=0)
+        self._readonly = False
+        self._progress = None
+
+        self._fontPath = QtGui.QFont()
+        self._fontPath.setUnderline(True)
+        self._fontBold = QtGui.QFont()
+        self._fontBold.setBold(True)
+
+    def setReadOnly(self, readonly):
+        self._readonly = readonly
+        self.dataChanged.emit(self.index(0, 0),
+                              self.index(self.rowCount() - 1,
+                                         self.columnCount() - 1))
+
+    def flags(self, index):
+        f = super().flags(index)
+        if self._readonly:
+            f &= ~QtCore.Qt.ItemIsEditable
+        return f
+
+    def showProgress(self, show):
+        '''
+        add/remove a progress column in front of all other columns
+        '''
+        if show:
+            self.beginInsertColumns(QtCore.QModelIndex(), 0, 0)
+            self._offs = 1
+            self._progress = np.full(self.rowCount(), -1, dtype=np.int8)
+            self.endInsertColumns()
+        elif self._offs:
+            self.beginRemoveColumns(QtCore.QModelIndex(), 0, 0)
+            self._offs = 0
+            self._progress = None
+            self.endRemoveColumns()
+
+    def _removeBlock(self, row, count, parent=QtCore.QModelIndex()):
+        if self._progress is not None:
+            self._progress = np.delete(self._progress, slice(row, row + count))
+        super()._removeBlock(row, count, parent)
+
+    def _filterRows(self, keep):
+        if self._progress is not None:
+            self._progress = self._progress[keep]
+        super()._filterRows(keep)
+
+    def setProgress(self, row, val):
+        self._progress[row] = val
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        col = index.column() - self._offs
+        if col < 0:
+            if role == QtCore.Qt.UserRole:
+                val = self._progress[index.row()]
+                if val >= 0:
+                    return int(val)
+            return None
+        if col == 0:
+            # path[column 0] as read-only and underlined:
+            if role == QtCore.Qt.TextAlignmentRole:
+                return QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter
+            if role == QtCore.Qt.FontRole:
+                return self._fontPath
+        if role == QtCore.Qt.BackgroundRole and self._readonly:
+            return QtGui.QColor(QtCore.Qt.lightGray)
+        return super().data(index, role)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal:
+            col = section - self._offs
+            if col < 0:
+                if role == QtCore.Qt.DisplayRole:
+                    return 'Progress'
+            elif role == QtCore.Qt.FontRole and col in MANDATORY_COLS:
+                return self._fontBold
+            elif role == QtCore.Qt.ToolTipRole:
+                return MATRIX_HEADER_TOOLTIPS.get(col)
+        elif role == QtCore.Qt.ForegroundRole:
+            return self.rowColor(section)
+        return super().headerData(section, orientation, role)
+
+    def rowColor(self, row):
+        # color row index number:
+        # check if whole row contains data (ignore the options column):
+        ncol = len(MATRIX_HEADER) - 1
+        if '' not in (self.text(row, c) for c in range(ncol)):
+            color = QtCore.Qt.darkGreen
+        elif '' not in (self.text(row, c) for c in MANDATORY_COLS):
+            color = QtCore.Qt.darkYellow
+        else:
+            color = QtCore.Qt.red
+        return QtGui.QColor(color)
+
+
+class ImageTable(TableView):
     filled = QtCore.pyqtSignal()  # whether to modify contents 
     sigIsEmpty = QtCore.pyqtSignal()
 
     def __init__(self, imgTab):
-        super().__init__(1, len(MATRIX_HEADER))  # int rows, int columns
+        self._model = _ImageTableModel()
+        super().__init__(self._model)
+        self._previewEnabled = True
+        self._previewPath = None
+        self._thumbnails = ThumbnailCache()
+        self._thumbnails.sigLoaded.connect(self._thumbnailLoaded)
 
-        self.cellDoubleClicked.connect(self._cellDoubleClicked)
-        self.currentCellChanged.connect(self._showPreview)
+        self.doubleClicked.connect(self._cellDoubleClicked)
+        self.selectionModel().currentChanged.connect(self._currentChanged)
 
         self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.showContextMenu)
 
         self.setTextElideMode(QtCore.Qt.ElideLeft)
-        self.itemChanged.connect(self._updateRowNumberColor)
 
         # draw top header frame :
         header = self.horizontalHeader()
@@ -76,19 +213,6 @@ class ImageTable(Table):
         header.setDefaultAlignment(QtCore.Qt.AlignLeft)
         header.setFrameStyle(QtWidgets.QFrame.Box | QtWidgets.QFrame.Plain)
         header.setLineWidth(1)
-        self.setHorizontalHeader(header)
-
-        self.setHorizontalHeaderLabels(MATRIX_HEADER)
-        for col in MANDATORY_COLS:
-            item = self.horizontalHeaderItem(col)
-            font = item.font()
-            font.setBold(True)
-            item.setFont(font)
-            self.setHorizontalHeaderItem(col, item)
-        for col, tip in {1:'''If left empty: measurement name is set to measurement date. 
-In other words: A measurement will be defined as all images taken of one module at the same date'''}.items():
-            item = self.horizontalHeaderItem(col)
-            item.setToolTip(tip)
 
         [self.setColumnWidth(n, width)
          for n, width in enumerate(MATRIX_HEADER_WIDTH)]
@@ -102,7 +226,7 @@ In other words: A measurement will be defined as all images taken of one module
         self.filled.connect(self.valsFromPath)
         
         self.threadAddMetadata = None
-        self.paths = []
+        self._allowModelToModifyCells = False
 
         # need to add to self, otherwise garbage collector removes delegates
         self._delegates = {  # 1: _OnlyIntDelegate(),  # measurement number
@@ -112,103 +236,111 @@ In other words: A measurement will be defined as all images taken of one module
                            6: _OnlyNumberDelegate(),  # iso
                            7: _OnlyNumberDelegate()  # fnumber
                            }  
-
-        for i, d in self._delegates.items():
-            self.setItemDelegateForColumn(i, d)
+        self._progressDelegate = _ProgressDelegate()
+        self._setDelegates()
 
         self.hide()
-        self.setRowCount(0)
+
+    @property
+    def paths(self):
+        return self._model.column(0)
+
+    def _setDelegates(self, offs=0):
+        # column delegates don't move, when a column is inserted, so
+        # shift them by [offs]:
+        for i in range(self.columnCount()):
+            self.setItemDelegateForColumn(i, None)
+        for i, d in self._delegates.items():
+            self.setItemDelegateForColumn(i + offs, d)
+        if offs:
+            self.setItemDelegateForColumn(0, self._progressDelegate)
 
     def uploadStart(self):
-        self.currentCellChanged.disconnect(self._showPreview)
+        self._previewEnabled = False
         self._closePreview()
-        self.insertColumn(0)
-        
+        self._model.showProgress(True)
+        self._setDelegates(1)
+        self._uploaded = set()
+        self._nHiddenRows = 0
+
     def uploadUpdate(self, index, val):
-#         if val != 100:
-        # show a progress bar  is every top  table cell that is being uploaded:
-        bar = self.cellWidget(index, 0)
-        if not bar:
-            bar = QtWidgets.QProgressBar()
-            self.setCellWidget(index, 0, bar)
-            # hide all top rows:
-            [self.hideRow(i) for i in range(index)]
-            bar.setValue(val)
-    
-        i, j = index + 1, len(self.paths)
+        # show a progress bar in every table row that is being uploaded.
+        # several files are uploaded in parallel, so more than one bar can be active:
+        self._model.setProgress(index, val)
+        if val == 100:
+            self._uploaded.add(index)
+            # hide all top rows that are completely uploaded:
+            while self._nHiddenRows in self._uploaded:
+                self.hideRow(self._nHiddenRows)
+                self._nHiddenRows += 1
+
+        i, j = len(self._uploaded), len(self.paths)
         b = self.gui.progressbar
-        b.bar.setValue(100 * i / j)
+        b.bar.setValue(int(100 * i / j))
         b.bar.setFormat("Uploading image %i/%i" % (i, j))
 
+    def _uploadStop(self):
+        self._model.showProgress(False)
+        self._setDelegates()
+        self._previewEnabled = True
+
     def uploadDone(self, hide=True):
-        self.removeColumn(0)
+        self._uploadStop()
         if hide:
             self.clearContents()
             self.hide()
         else:
-            show()
-        self.currentCellChanged.connect(self._showPreview)
+            self.show()
 
     def uploadCancel(self):
-        self.removeColumn(0)
-
-        for row in range(self.rowCount()):
+        self._uploadStop()
+        for row in range(self._nHiddenRows):
             self.showRow(row)
 
     def _applyForAll(self):
-        txt = self.currentItem().text()
-        col = self.currentColumn()
-        for row in range(self.rowCount()):
-            self.item(row, col).setText(txt)
+        index = self.currentIndex()
+        m = self._model
+        # model columns are shifted, while the progress column is shown:
+        col = m.dataColumn(index)
+        if col < 0 or not m.flags(index) & QtCore.Qt.ItemIsEditable:
+            return
+        txt = m.text(index.row(), col)
+        m.setColumn(col, [txt] * self.rowCount())
 
     def _selectAllOfCurrentValue(self):
-        txt = self.currentItem().text()
-        col = self.currentColumn()
-# #         self.setSelectionMode(QtWidgets.QAbstractItemView.MultiSelection)
-#         self.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectItems)
-        rows = []
-        for row in range(self.rowCount()):
-            if self.itemText(row, col) == txt:
-                rows.append(row)
-#                 self.selectRow(row)
-
-        indexes = [self.model().index(r, 0) for r in rows]
-        mode = QtCore.QItemSelectionModel.Select | QtCore.QItemSelectionModel.Rows
-        [self.selectionModel().select(i, mode) for i in indexes]
-
-#         self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
-        
+        index = self.currentIndex()
+        m = self._model
+        col = m.dataColumn(index)
+        if col < 0:
+            return
+        txt = m.text(index.row(), col)
+        last = m.columnCount() - 1
+        sel = QtCore.QItemSelection()
+        for row in range(m.rowCount()):
+            if m.text(row, col) == txt:
+                sel.select(m.index(row, 0), m.index(row, last))
+        self.selectionModel().select(sel, QtCore.QItemSelectionModel.Select)
+
     def _invertSelection(self):
-        model = self.model()
-        for i in range(model.rowCount()):
-            for j in range(model.columnCount()):
-                ix = model.index(i, j)
-                self.selectionModel().select(ix, QtCore.QItemSelectionModel.Toggle)
-
-    def removeRow(self, row):
-        self.paths.pop(row)
-        super().removeRow(row)
-        if not len(self.paths):
+        m = self._model
+        sel = QtCore.QItemSelection(
+            m.index(0, 0), m.index(m.rowCount() - 1, m.columnCount() - 1))
+        self.selectionModel().select(sel, QtCore.QItemSelectionModel.Toggle)
+
+    def removeRows(self, rows):
+        self._model.removeRowList(rows)
+        if self.isEmpty():
             self.sigIsEmpty.emit()
             self._showOptionsColumn(False)
 
     def clearContents(self):
-        for row in range(len(self.paths) - 1, -1, -1):
-            super().removeRow(row)
-        self.paths = []
+        self._model.clear()
 
     def saveState(self):
-        rows = []
-        for row in range(self.rowCount()):
-            line = []
-            for col in range(self.columnCount()):
-                item = self.item(row, col)
-                if item:
-                    line.append(str(item.text()))
-                else:
-                    line.append(None)
-            rows.append(line)
-        return rows
+        m = self._model
+        ncols = len(MATRIX_HEADER)
+        return [[m.text(row, col) for col in range(ncols)]
+                for row in range(m.rowCount())]
 
     def _closePreview(self):
         try:
@@ -233,19 +365,21 @@ In other words: A measurement will be defined as all images taken of one module
         r = self.currentRow()
         if r < self.rowCount() - 1:
             self.selectRow(r + 1)
-            path = self.item(r + 1, 0).text()
-            self._open(path)
+            self._open(self.paths[r + 1])
 
     def _open(self, path):
         self.gui.openImage(path, prevFn=self._openPrevRow,
                                nextFn=self._openNextRow)
+        # decode next and previous image in background:
+        r = self.currentRow()
+        imageCache.readAhead(self.paths[i] for i in (r + 1, r - 1)
+                             if 0 <= i < len(self.paths))
 
     def _openPrevRow(self):
         r = self.currentRow()
         if r > 0:
             self.selectRow(r - 1)
-            path = self.item(r - 1, 0).text()
-            self._open(path)
+            self._open(self.paths[r - 1])
 
     def _doShowPreview(self, path, row, pixmap):
         if pixmap and row == self.currentRow():
@@ -286,24 +420,36 @@ In other words: A measurement will be defined as all images taken of one module
             if menu_visible:
                 self._menu.setVisible(True)
 
+    def _currentChanged(self, current, _previous):
+        if self._previewEnabled:
+            self._showPreview(current.row(), current.column())
+
     def _showPreview(self, row, col):
         self._closePreview()
+        self._previewPath = None
         # show an image preview
         if col == 0:
             r = self.selectedRanges()
             # check whether only one cell (and not whole row) selected:
-            if r and r[0].rowCount() == 1 and r[0].columnCount() == 1:
-                path = self.item(row, col).text()
+            if r and r[0].height() == 1 and r[0].width() == 1:
+                path = self._previewPath = self.paths[row]
                 self._Lrow = row
-                # load image in thread to not block GUI:
-                self._L = _LoadPreviewThread(path, row)
-                self._L.sigDone.connect(self._doShowPreview)
-                self._L.start()
-
-    def _cellDoubleClicked(self, row, col):
-        if col == 0:
-            path = self.item(row, col).text()
-            self._open(path)
+                # thumbnails are loaded in background if not cached:
+                pm = self._thumbnails.request(path)
+                if pm is not None:
+                    self._doShowPreview(path, row, pm)
+                # load previews of neighbouring rows, so scrolling is fast:
+                self._thumbnails.prefetch(
+                    self.paths[max(0, row - N_PREFETCH):row + N_PREFETCH + 1])
+
+    def _thumbnailLoaded(self, path, pixmap):
+        if path == self._previewPath and self._previewEnabled:
+            self._previewPath = None
+            self._doShowPreview(path, self._Lrow, pixmap)
+
+    def _cellDoubleClicked(self, index):
+        if index.column() == 0:
+            self._open(self.paths[index.row()])
 
     def hasEmptyCells(self, cols=None, select=True) -> bool:
         '''
@@ -311,33 +457,34 @@ In other words: A measurement will be defined as all images taken of one module
 
         if <select> == True: select all empty cells
         '''
+        m = self._model
         if cols is None:
             cols = range(1, self.columnCount())
+        hidden = np.array([self.isRowHidden(row)
+                           for row in range(m.rowCount())], dtype=bool)
         has_empty = False
-        for row in range(self.rowCount()):
-            if not self.isRowHidden(row):
-                for col in cols:
-                    if not self.isColumnHidden(col):
-                        item = self.item(row, col)
-                        if not item or not item.text():
-                            if not select:
-                                return True
-                            has_empty = True
-                            index = self.model().index(row, col)
-                            self.selectionModel().select(
-                                index, QtCore.QItemSelectionModel.Select)
+        sel = QtCore.QItemSelection()
+        for col in cols:
+            if self.isColumnHidden(col):
+                continue
+            empty = m.isEmpty(col) & ~hidden
+            if empty.any():
+                if not select:
+                    return True
+                has_empty = True
+                for row in np.flatnonzero(empty):
+                    index = m.index(int(row), col)
+                    sel.select(index, index)
+        if has_empty:
+            self.selectionModel().select(sel, QtCore.QItemSelectionModel.Select)
         return has_empty
 
     def modules(self):
         '''
         return list of module IDs within table
         '''
-        ll = set()
-        col = MATRIX_HEADER.index('Module ID')
-        for row in range(self.rowCount()):
-            item = self.item(row, col)
-            if item is not None:
-                ll.add(item.text())
+        ll = set(self._model.column(MATRIX_HEADER.index('Module ID')))
+        ll.discard('')
         return ll
 
     def showContextMenu(self, pos):
@@ -356,22 +503,12 @@ In other words: A measurement will be defined as all images taken of one module
         if readonly:
             tr = QtWidgets.QAbstractItemView.NoEditTriggers
             self.setContextMenuPolicy(QtCore.Qt.NoContextMenu)
-            col = QtGui.QColor(QtCore.Qt.lightGray)
-            for r, c in self.iterInd():
-                self.setCell(r, c).setBackground(col)
         else:
             tr = QtWidgets.QAbstractItemView.AllEditTriggers 
             self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
-            col = QtWidgets.QTableWidgetItem().background()  # QtGui.QColor(QtCore.Qt.white)
-            for r, c in self.iterInd():
-                self.setCell(r, c).setBackground(col)
+        self._model.setReadOnly(readonly)
         self.setEditTriggers(tr)
 
-    def iterInd(self):
-        for row in range(self.rowCount()):
-            for col in range(self.columnCount()):
-                yield row, col
-
     def _manualGridDetection(self):
         row = self.currentRow()
 
@@ -387,13 +524,16 @@ In other words: A measurement will be defined as all images taken of one module
         if g.result() == g.Accepted:
             row = self.currentRow()
             col = len(MATRIX_HEADER) - 1
-            self.setCell(row, col, json.dumps(g.values))
+            self._model.setText(row, col, json.dumps(g.values))
             self._showOptionsColumn(True)
 
-    def toCSVStr(self, local=True):
+    def toCSVStr(self, local=True, checksums=None):
         '''
         local ... whether csv str contains local file paths
                set to False t anonymize paths to NUMBER.FTYPE 
+        checksums ... [optional] list of file checksums (one per row)
+               if given, anonymized paths are CHECKSUM.FTYPE, so that the server
+               can reference images it already holds
         returns:
             local=True:
                 str, paths
@@ -402,29 +542,28 @@ In other words: A measurement will be defined as all images taken of one module
         '''
         out = ''
         new_paths = []
-        for row in range(self.rowCount()):
+        m = self._model
+        lines = []
+        for row, path in enumerate(self.paths):
             # only same image index and ftype to protect the clients
             # data"
-            path = self.paths[row]
             if local:
                 rowl = [path]
             else:
-                new_path = '%i.%s' % (row, path.filetype())
+                if checksums is None:
+                    new_path = '%i.%s' % (row, path.filetype())
+                else:
+                    new_path = '%s.%s' % (checksums[row], path.filetype())
                 new_paths.append(new_path)
                 rowl = [new_path]
             for col in range(1, len(MATRIX_HEADER)):
-                rowl.append(self.itemText(row, col))
+                rowl.append(m.text(row, col))
             rowl.append(str(path.size()))
-            line = DELIMITER.join(rowl)
-            if line[-1] != '\n':
-                line += '\n'
-            out += line
-        # remove last \n:
-        if out[-1] == '\n':
-            out = out[:-1]
+            lines.append(DELIMITER.join(rowl))
+        out = '\n'.join(lines)
         if not local:
             return out, new_paths
-        return out, self.paths
+        return out, list(self.paths)
 
     def fillFromFile(self, path, appendRows=False):
         with open(path, 'r', encoding='utf-8-sig') as f:
@@ -443,104 +582,96 @@ In other words: A measurement will be defined as all images taken of one module
     def fillFromState(self, lines, appendRows=False):
         self._allowModelToModifyCells = False
 
-        if appendRows:
-            row0 = self.rowCount()
-        else:
-            row0 = 0
+        if not appendRows:
             self.clearContents()
-            self.paths = []
-        nrows = row0 + len(lines)
-        self.setRowCount(nrows)
-        self._new_rows = []
-        for row, line in enumerate(lines):
-
-            row += row0
-            for col, txt in enumerate(line):
-                if txt != '':
-                    self.setCell(row, col, txt)
-            item = self.item(row, 0)
-            if len(line) and item:
-                self.paths.append(PathStr(item.text()))
-                self._setPathItem(row)
-                self._setRowItem(row)
-                self._new_rows.append(row)
-            else:
-                nrows -= 1
-            
+        # ignore lines without path:
+        lines = [line for line in lines if len(line) and line[0]]
+        ncols = len(MATRIX_HEADER)
+        # transpose rows to columns, additional columns (e.g. file size) are ignored:
+        columns = [[] for _ in range(ncols)]
+        for line in lines:
+            line = line[:ncols]
+            if len(line) < ncols:
+                line = line + [''] * (ncols - len(line))
+            for c, txt in zip(columns, line):
+                c.append('' if txt is None else txt)
+        columns[0] = [PathStr(p) for p in columns[0]]
+        invalid = []
+        row0 = self._model.appendRows(columns, invalid)
+        self._new_rows = list(range(row0, self.rowCount()))
+        if invalid:
+            self._reportInvalid(invalid)
+
         self.drawWidget.setExamplePath(self.paths[0])
-        self.setRowCount(nrows)
         self._checkShowOptionsColumn()
         self._new_paths = self.paths[row0:]
         self.filled.emit()
 
+    def _reportInvalid(self, invalid):
+        '''
+        show imported values, which are no numbers (and are left empty)
+        '''
+        lines = ['row %i, %s: %s' % (row + 1, MATRIX_HEADER[col], val)
+                 for row, col, val in invalid[:20]]
+        if len(invalid) > 20:
+            lines.append('...')
+        QtWidgets.QMessageBox.warning(
+            self, "Invalid values",
+            "These values are no numbers and were not imported:\n"
+            + '\n'.join(lines), QtWidgets.QMessageBox.Ok)
+
     def _checkShowOptionsColumn(self):
-        hasOptions = False
-        c = len(MATRIX_HEADER) - 1
-        for row in range(self.rowCount()):
-            item = self.item(row, c)
-            if item and item.text():
-                # TODO: this check is only needed because csv reading incl.
-                # last sign currently. remove
-                if item.text() != '\n':
-                    hasOptions = True
-                    break
+        # TODO: the check for '\\n' is only needed because csv reading incl.
+        # last sign currently. remove
+        hasOptions = any(txt and txt != '\n' for txt in
+                         self._model.column(len(MATRIX_HEADER) - 1))
         self._showOptionsColumn(hasOptions)
 
     def _showOptionsColumn(self, show):
+        # options column is always read-only (see _ImageTableModel):
         c = len(MATRIX_HEADER) - 1
-        if show:
-            # make sure whole options column is readonly:
-            for row in range(self.rowCount()):
-                item = self.setCell(row, c)
-                self.mkItemReadonly(item)
-        
         self.setColumnHidden(c, not show)  # show/hide options
 
-    def _setRowItem(self, row):
-        # for colored row indices:
-        rowitem = QtWidgets.QTableWidgetItem()
-        # previous row item number:
-        if row == 0:
-            prev = 0
-        else:
-            item = self.verticalHeaderItem(row - 1)
-            if item:
-                prev = int(item.text())
-            else:
-                prev = row - 1
-        rowitem.setText(str(prev + 1))
-        self.setVerticalHeaderItem(row, rowitem)
-
     def fillFromPaths(self, paths):
         '''
         paths ... [path/to/img.png, ...]
         '''
+        self.beginFill()
+        self.appendPaths(paths)
+        self.endFill()
+
+    def beginFill(self):
+        '''
+        start adding images - to be followed by one or more
+        appendPaths and a final endFill
+        '''
         self.show()
         self._allowModelToModifyCells = True
-        self._new_paths = paths
-        row0 = len(self.paths)
-        self.setRowCount(len(paths) + row0)
-        self.drawWidget.setExamplePath(paths[0])
-        # <<<
-        # adds ...
-        # - path to FIRST ROWfile
-        # - change date
-        # row index
-        offs = len(self.paths)
+        self._new_paths = []
         self._new_rows = []
-        for r, p in enumerate(self._new_paths):
-            if p in self.paths:
-                continue  # duplicate found - ignore
-            row = r + offs
-            # path[column 0] as read-only and underlined:
-            self.paths.append(p)
-            self._setPathItem(row, p)
-            self._setRowItem(row)
 
-            self._new_rows.append(row)
-        # >>>
-
-        if self.cbMetaData.isChecked():
+    def appendPaths(self, paths):
+        '''
+        add rows for [paths], without reading values from path or meta data
+        '''
+        if not self._new_paths and paths:
+            self.drawWidget.setExamplePath(paths[0])
+        # ignore duplicates - within [paths] and already in table:
+        new = [p for p in dict.fromkeys(paths)
+               if not self._model.contains(p)]
+        # only path column is filled, all other values are read from path and
+        # image meta data
+        columns = [None] * len(MATRIX_HEADER)
+        columns[0] = new
+        row0 = self._model.appendRows(columns)
+        self._new_paths.extend(new)
+        self._new_rows.extend(range(row0, self.rowCount()))
+
+    def endFill(self):
+        '''
+        read values of all added images from path and meta data
+        '''
+        if self.cbMetaData.isChecked() and self._new_paths:
             self.addMetaData()
         else:
             self.filled.emit()
@@ -575,66 +706,33 @@ might use false parapeters.""",
                 return False
         return True
 
-    def valsFromPath(self): 
-        colDate = MATRIX_HEADER.index('Date') 
-        for row in range(self.rowCount()):  
-            if self._allowModelToModifyCells:
-                path = PathStr(self.item(row, 0).text())
-                _success, entries = self.drawWidget.model(path)
-
-                for col, e in enumerate(entries):
-                    col += 1
-#                     if e == '':
-#                         item = self.item(row, col)
-#                         if hasattr(item, 'metaText'):
-#                             e = self.item(row, col).metaText
-                    if e != '':
-                        self.setCell(row, col, str(e))
-                # add date from file date is not already given:
-                if not self.itemText(row, colDate):
-                    self.setCell(row, colDate, datetime.fromtimestamp(
-                        path.date()).strftime('%Y/%m/%d %H:%M:%S'))
-#             self._updateRowNumberColor(row)
-            
-    def _updateRowNumberColor(self, item):
-        row = item.row()
-        ncol = self.columnCount() - 1  # ignore the options column
-        # color row index number:
-        # check if whole row contains data:
-        if '' not in (self.itemText(row, c) for c in range(ncol)):
-            color = QtCore.Qt.darkGreen
-        elif '' not in (self.itemText(row, c) for c in MANDATORY_COLS):
-            color = QtCore.Qt.darkYellow
-        else:
-            color = QtCore.Qt.red
-        rowitem = self.verticalHeaderItem(row)
-        if rowitem:
-            rowitem.setForeground(color)
-            self.setVerticalHeaderItem(row, rowitem)
-
-    def itemText(self, row, col):
-        item = self.item(row, col)
-        if item is None:
-            return ''
-        return item.text()
-
-    def mkItemReadonly(self, item):
-        flags = item.flags()
-        flags |= QtCore.Qt.ItemIsSelectable
-        flags &= ~QtCore.Qt.ItemIsEditable  # reset/clear the flag
-        item.setFlags(flags)
-
-    def _setPathItem(self, row, path=None):
-        item = self.setCell(row, 0, path)
-        item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
-        self.mkItemReadonly(item)
-        f = item.font()
-        f.setUnderline(True)
-        item.setFont(f)
+    def valsFromPath(self):
+        if not self._allowModelToModifyCells:
+            return
+        m = self._model
+        colDate = MATRIX_HEADER.index('Date')
+        # collect values column wise, so the model is only updated once per column:
+        ncols = len(MATRIX_HEADER)
+        rows = [[] for _ in range(ncols)]
+        vals = [[] for _ in range(ncols)]
+        paths = self.paths
+        for row, entries in enumerate(self.drawWidget.models(paths)):
+            for col, e in enumerate(entries):
+                col += 1
+                if e != '':
+                    rows[col].append(row)
+                    vals[col].append(str(e))
+            # add date from file date is not already given:
+            if not m.text(row, colDate) and row not in rows[colDate][-1:]:
+                rows[colDate].append(row)
+                vals[colDate].append(datetime.fromtimestamp(
+                    paths[row].date()).strftime('%Y/%m/%d %H:%M:%S'))
+        for col in range(1, ncols):
+            m.setColumn(col, vals[col], rows[col])
 
     def addMetaData(self):
         self.threadAddMetadata = _ProcessThread(self._new_rows, self._new_paths)
-        self.threadAddMetadata.rowDone.connect(self._fillRow)
+        self.threadAddMetadata.rowsDone.connect(self._fillRows)
         self.threadAddMetadata.finished.connect(self._fillFinished)
 
         self._b = self.gui.addTemporaryProcessBar()
@@ -644,14 +742,14 @@ might use false parapeters.""",
 
         self.threadAddMetadata.start()
 
-    def _fillRow(self, progress, row, meta):
+    def _fillRows(self, progress, rows, metas):
         b = self._b
         b.bar.setValue(progress)
         b.bar.setFormat(
             "Reading image meta data %s" % int(progress) + '%')
-        for i, t in enumerate(meta):
-            self.setCell(row, 4 + i, t)
-#             item.metaText = t
+        # meta = (date, exposure time, iso, f-number):
+        for i, vals in enumerate(zip(*metas)):
+            self._model.setColumn(4 + i, vals, rows)
 
     def _fillFinished(self):
         self.gui.removeTemporaryProcessBar(self._b)
@@ -822,24 +920,59 @@ class DragWidget(QtWidgets.QGroupBox):
         depending on adjusted label positions,
         split given path into MATRIX row
         '''
-        names = path.splitNames()[-self.N_LAST_FOLDERS:]
-        names[-1] = PathStr(names[-1]).rmFileType()
+        return True, self.models([path])[0]
 
-        out = [''] * (len(MATRIX_HEADER) - 1)
-        success = True
-        for i, n in enumerate(names):
+    def _labelFunctions(self):
+        '''
+        return one function fn(row, name) for every folder/file name position
+        '''
+        fns = []
+        for i in range(self.N_LAST_FOLDERS):
             item = self._lGrid.itemAtPosition(1, (2 * i) + 1)
-            if item:
-                txt = item.widget().text()
-                try:
-                    fn = CAT_FUNCTIONS[txt]
-                    fn(out, n)
-                except KeyError:
-                    toRow(out, parsePath(n, txt))
-                except IndexError:
-                    pass
+            if not item:
+                fns.append(None)
+                continue
+            txt = item.widget().text()
+            try:
+                fns.append(CAT_FUNCTIONS[txt])
+            except KeyError:
+                parser = compileStyle(txt)
+                fns.append(lambda row, n, parser=parser: toRow(row, parser(n)))
+        return fns
+
+    def models(self, paths):
+        '''
+        same as model, but for many paths at once:
+        label positions are only evaluated once and
+        all files within the same folder share the folder values
+        '''
+        fns = self._labelFunctions()
+        ndirs = self.N_LAST_FOLDERS - 1
+        ncols = len(MATRIX_HEADER) - 1
+        dirs = {}
+        out = []
+        for path in paths:
+            d, fname = os.path.split(path)
+            try:
+                row0, i = dirs[d]
+            except KeyError:
+                names = PathStr(d).splitNames()[-ndirs:] if ndirs else []
+                row0, i = [''] * ncols, len(names)
+                for fn, n in zip(fns, names):
+                    self._applyLabel(fn, row0, n)
+                dirs[d] = row0, i
+            row = list(row0)
+            self._applyLabel(fns[i], row, PathStr(fname).rmFileType())
+            out.append(row)
+        return out
 
-        return success, out
+    @staticmethod
+    def _applyLabel(fn, row, name):
+        if fn is not None:
+            try:
+                fn(row, name)
+            except IndexError:
+                pass
 
 
 class _RemovableLabel(QtWidgets.QLabel):
@@ -902,42 +1035,30 @@ class _LabelParsePath(_RemovableLabel):
         self.setText(self._editor.text())
 
 
-class _LoadPreviewThread(QtCore.QThread):
-    sigDone = QtCore.pyqtSignal(str, int, QtGui.QPixmap)  # , QtGui.QIcon)
-
-    def __init__(self, path, row):
-        QtCore.QThread.__init__(self)
-        self.path = path
-        self.row = row
-
-    def run(self):
-        pm = QtGui.QIcon(self.path).pixmap(100, 100)
-        self.sigDone.emit(self.path, self.row, pm)
-
-
 class _ProcessThread(QtCore.QThread):
     '''
     Thread to be used in tool.activate in order not to block
     the gui
     '''
-    rowDone = QtCore.pyqtSignal(object, object, object)
+    rowsDone = QtCore.pyqtSignal(object, object, object)  # progress, rows, metas
 
     def __init__(self, rows, paths):
         QtCore.QThread.__init__(self)
         self.rows = rows
         self.paths = paths
+        self._reader = MetaDataReader(paths, self._batchDone)
+        self._ndone = 0
 
     def kill(self):
-        self.terminate()
+        self._reader.kill()
 
-    def run(self):
-
-        for i, (row, path) in enumerate(zip(self.rows, self.paths)):
-            # try to read metadata:
-            out = metaData(path)
+    def _batchDone(self, indices, metas):
+        self._ndone += len(indices)
+        progress = self._ndone / len(self.paths) * 100  # %
+        self.rowsDone.emit(progress, [self.rows[i] for i in indices], metas)
 
-            progress = (i + 1) / len(self.paths) * 100  # %
-            self.rowDone.emit(progress, row, out)
+    def run(self):
+        self._reader.run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+import numpy as np
+from PyQt5 import QtCore
+
+
+class ColumnSortProxyModel(QtCore.QAbstractProxyModel):
+    '''
+    Sort and filter proxy for a ColumnTableModel.
+    In contrast to QSortFilterProxyModel no values are compared in python:
+    sorting by multiple columns is a single np.lexsort over
+    ColumnTableModel.sortKey and filtering uses a bool array.
+
+    sort keys ... [(column, ascending), ...], first key has highest priority
+    filter ... fn(sourceModel) -> bool array (True=show row) or None
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._keys = []
+        self._filter = None
+        self._rows = np.arange(0)  # proxy row -> source row
+        self._inv = np.arange(0)  # source row -> proxy row, -1 if filtered
+        # {column: QIcon} shown in horizontal header, e.g. sort order:
+        self.headerIcons = {}
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelReset.connect(self.invalidate)
+        model.rowsInserted.connect(self.invalidate)
+        model.rowsRemoved.connect(self.invalidate)
+        model.dataChanged.connect(self._sourceDataChanged)
+        self.invalidate()
+
+    def setSortKeys(self, keys):
+        self._keys = list(keys)
+        self.invalidate()
+
+    def setFilter(self, fn):
+        self._filter = fn
+        self.invalidate()
+
+    def _mapping(self):
+        m = self.sourceModel()
+        n = m.rowCount()
+        rows = np.arange(n)
+        if self._filter is not None:
+            show = self._filter(m)
+            if show is not None:
+                rows = rows[show]
+        if self._keys and len(rows):
+            # np.lexsort: last key has highest priority
+            keys = []
+            for col, ascending in reversed(self._keys):
+                k = m.sortKey(col)[rows]
+                keys.append(k if ascending else -k)
+            rows = rows[np.lexsort(keys)]
+        inv = np.full(n, -1)
+        inv[rows] = np.arange(len(rows))
+        return rows, inv
+
+    def invalidate(self):
+        '''
+        sort and filter again
+        '''
+        if self.sourceModel() is None:
+            return
+        rows, inv = self._mapping()
+        if len(rows) != len(self._rows):
+            self.beginResetModel()
+            self._rows, self._inv = rows, inv
+            self.endResetModel()
+            return
+        # same rows, new order: keep selection
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        src = [self.mapToSource(i) for i in old]
+        self._rows, self._inv = rows, inv
+        self.changePersistentIndexList(
+            old, [self.mapFromSource(i) for i in src])
+        self.layoutChanged.emit()
+
+    def _sourceDataChanged(self, i0, i1, roles=()):
+        # values are not sorted again, see invalidate
+        if len(self._rows):
+            self.dataChanged.emit(self.index(0, i0.column()),
+                                  self.index(len(self._rows) - 1, i1.column()),
+                                  roles)
+
+    def sourceRow(self, row):
+        return int(self._rows[row])
+
+    def sourceRows(self, rows):
+        return self._rows[np.asarray(rows, dtype=int)]
+
+    def proxyRows(self, sourceRows):
+        '''
+        map source rows, filtered rows are omitted
+        '''
+        rows = self._inv[np.asarray(sourceRows, dtype=int)]
+        return rows[rows >= 0]
+
+    # <<<< QAbstractProxyModel interface:
+    def mapToSource(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        return self.sourceModel().index(int(self._rows[index.row()]),
+                                        index.column())
+
+    def mapFromSource(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        row = int(self._inv[index.row()])
+        if row < 0:
+            return QtCore.QModelIndex()
+        return self.index(row, index.column())
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal:
+            if role == QtCore.Qt.DecorationRole:
+                return self.headerIcons.get(section)
+            return self.sourceModel().headerData(section, orientation, role)
+        if role == QtCore.Qt.DisplayRole:
+            return str(section + 1)
+        return None
+    # >>>>
+
+
+if __name__ == '__main__':
+    import time
+    from client.widgets.base.ColumnTableModel import ColumnTableModel
+    # benchmark: sort 100k rows by all columns
+    n = 100000
+    rnd = np.random.RandomState(0)
+    m = ColumnTableModel(['module', 'file', 'date', 'size'],
+                         [str, str, float, int])
+    m.appendRows([['module%i' % i for i in rnd.randint(0, 100, n)],
+                  ['file%i.tiff' % i for i in rnd.randint(0, n, n)],
+                  rnd.rand(n) * 1e9, rnd.randint(0, 2 ** 30, n)])
+    p = ColumnSortProxyModel()
+    p.setSourceModel(m)
+    keys = [(0, True), (1, False), (2, True), (3, True)]
+    t0 = time.time()
+    p.setSortKeys(keys)
+    t1 = time.time()
+    p.setSortKeys(keys[::-1])
+    t2 = time.time()
+    p.setFilter(lambda m: m.column(3) > 2 ** 29)
+    t3 = time.time()
+    print('%i rows\n  first sort: %.1f ms\n  sort: %.1f ms\n  filter+sort: '
+          '%.1f ms' % (n, 1e3 * (t1 - t0), 1e3 * (t2 - t1), 1e3 * (t3 - t2)))
@@ -0,0 +1,369 @@
+import math
+from fractions import Fraction
+from itertools import compress
+
+import numpy as np
+from PyQt5 import QtCore
+
+# column types stored as np.ndarray:
+_ARRAY_TYPES = (float, int)
+
+
+def toFloat(txt):
+    '''
+    str -> float
+    also accepts fractions, e.g. '1/60' (as returned by exif readers)
+    empty str -> nan
+    '''
+    if txt is None or txt == '':
+        return np.nan
+    try:
+        return float(txt)
+    except ValueError:
+        return float(Fraction(txt))  # raises ValueError if not a number
+
+
+def floatToStr(val):
+    if math.isnan(val):
+        return ''
+    return '%.10g' % val
+
+
+class ColumnTableModel(QtCore.QAbstractTableModel):
+    '''
+    Table model storing all values column wise:
+        str columns ... python list
+        float columns ... np.ndarray, empty cells are nan
+        int columns ... np.ndarray (int64), empty cells are 0
+    In contrast to QTableWidget no Qt objects are created for any cell.
+
+    header ... [name0, name1...]
+    dtypes ... [str, float, int...] one for every column
+    indexCol ... [optional] column to keep a hash index of {value: row},
+                 so rows can be found without searching the whole column
+    '''
+    # number of columns shown in front of the data columns
+    # (e.g. to display a progress bar)
+    _offs = 0
+    # removing more blocks of rows at once resets the model:
+    MAX_REMOVE_BLOCKS = 20
+
+    def __init__(self, header, dtypes, readonlyCols=(), indexCol=None):
+        super().__init__()
+        self._header = list(header)
+        self._dtypes = list(dtypes)
+        self._readonlyCols = set(readonlyCols)
+        self._indexCol = indexCol
+        self._index = {}
+        self._nrows = 0
+        self._cols = [self._emptyColumn(t) for t in self._dtypes]
+        self._sortKeys = {}  # cache, see sortKey
+
+    @staticmethod
+    def _emptyColumn(dtype, n=0):
+        if dtype is float:
+            return np.full(n, np.nan)
+        if dtype is int:
+            return np.zeros(n, dtype=np.int64)
+        return [''] * n
+
+    def _parse(self, col, val):
+        dtype = self._dtypes[col]
+        if dtype is float:
+            if isinstance(val, str) or val is None:
+                return toFloat(val)
+            return float(val)
+        if dtype is int:
+            if val is None or val == '':
+                return 0
+            return int(val)
+        if val is None:
+            return ''
+        return val
+
+    # <<<< QAbstractTableModel interface:
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._nrows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._header) + self._offs
+
+    def dataColumn(self, index):
+        '''
+        return data column of model [index], -1 for columns in front
+        '''
+        return index.column() - self._offs
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            col = index.column() - self._offs
+            if col >= 0:
+                return self.text(index.row(), col)
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if role != QtCore.Qt.EditRole:
+            return False
+        col = index.column() - self._offs
+        if col < 0 or col in self._readonlyCols:
+            return False
+        return self.setText(index.row(), col, value)
+
+    def flags(self, index):
+        f = QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled
+        if index.column() - self._offs not in self._readonlyCols:
+            f |= QtCore.Qt.ItemIsEditable
+        return f
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole:
+            if orientation == QtCore.Qt.Horizontal:
+                col = section - self._offs
+                if col >= 0:
+                    return self._header[col]
+            else:
+                return str(section + 1)
+        return None
+
+    def removeRows(self, row, count, parent=QtCore.QModelIndex()):
+        self._removeBlock(row, count, parent)
+        self._buildIndex()
+        return True
+    # >>>>
+
+    def _removeBlock(self, row, count, parent=QtCore.QModelIndex()):
+        self.beginRemoveRows(parent, row, row + count - 1)
+        self._sortKeys.clear()
+        for i, c in enumerate(self._cols):
+            if self._dtypes[i] in _ARRAY_TYPES:
+                self._cols[i] = np.delete(c, slice(row, row + count))
+            else:
+                del c[row:row + count]
+        self._nrows -= count
+        self.endRemoveRows()
+
+    def removeRowList(self, rows):
+        '''
+        remove multiple (not necessarily contiguous) rows at once
+        '''
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if not len(rows):
+            return
+        # contiguous blocks, starting from the bottom:
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        firsts = rows[np.r_[0, breaks]]
+        lasts = rows[np.r_[breaks - 1, len(rows) - 1]]
+        blocks = list(zip(firsts[::-1].tolist(),
+                          (lasts - firsts + 1)[::-1].tolist()))
+        if len(blocks) > self.MAX_REMOVE_BLOCKS:
+            # many scattered rows: filter all columns in one go
+            keep = np.ones(self._nrows, dtype=bool)
+            for first, n in blocks:
+                keep[first:first + n] = False
+            self.beginResetModel()
+            self._filterRows(keep)
+            self.endResetModel()
+        else:
+            for first, n in blocks:
+                self._removeBlock(first, n)
+        self._buildIndex()
+
+    def _filterRows(self, keep):
+        '''
+        only keep rows where bool array [keep] is True
+        '''
+        self._sortKeys.clear()
+        for i, c in enumerate(self._cols):
+            if self._dtypes[i] in _ARRAY_TYPES:
+                self._cols[i] = c[keep]
+            else:
+                self._cols[i] = list(compress(c, keep))
+        self._nrows = int(keep.sum())
+
+    def clear(self):
+        self.beginResetModel()
+        self._nrows = 0
+        self._cols = [self._emptyColumn(t) for t in self._dtypes]
+        self._index = {}
+        self._sortKeys.clear()
+        self.endResetModel()
+
+    def _buildIndex(self, row0=0):
+        '''
+        add rows >= [row0] to the hash index
+        '''
+        if self._indexCol is None:
+            return
+        if not row0:
+            self._index = {}
+        index = self._index
+        for row, val in enumerate(self._cols[self._indexCol][row0:], row0):
+            index.setdefault(val, row)
+
+    def _updateIndex(self, changed):
+        '''
+        update the hash index after values in the index column changed
+        changed ... [(row, old value), ...]
+        '''
+        c = self._cols[self._indexCol]
+        index = self._index
+        for row, old in changed:
+            if index.get(old) == row and c[row] != old:
+                # next row with the old value becomes the first one:
+                nxt = np.flatnonzero(np.asarray(c[row + 1:]) == old)
+                if len(nxt):
+                    index[old] = row + 1 + int(nxt[0])
+                else:
+                    del index[old]
+            new = c[row]
+            if index.get(new, self._nrows) > row:
+                index[new] = row
+
+    def find(self, value):
+        '''
+        return first row of [value] in the index column or None
+        '''
+        return self._index.get(value)
+
+    def contains(self, value):
+        return value in self._index
+
+    def _parseColumn(self, col, vals, row0, invalid):
+        out = []
+        for row, v in enumerate(vals, row0):
+            try:
+                out.append(self._parse(col, v))
+            except (ValueError, ZeroDivisionError):
+                out.append(self._parse(col, None))
+                invalid.append((row, col, v))
+        return out
+
+    def appendRows(self, columns, invalid=None):
+        '''
+        columns ... one list of values for every column
+                    (values can either be str or already have the right type)
+                    None ... all cells of this column are empty
+                    np.ndarray of a float/int column is taken without parsing
+        values, which cannot be converted into the column type are left empty
+        invalid ... [optional] list, (row, col, value) of these values
+                    is appended, so they can be reported
+        returns index of first added row
+        '''
+        if invalid is None:
+            invalid = []
+        n = len(columns[0])
+        row0 = self._nrows
+        if not n:
+            return row0
+        self.beginInsertRows(QtCore.QModelIndex(), row0, row0 + n - 1)
+        self._sortKeys.clear()
+        for i, vals in enumerate(columns):
+            isArray = self._dtypes[i] in _ARRAY_TYPES
+            if vals is None:
+                vals = self._emptyColumn(self._dtypes[i], n)
+            elif not (isArray and isinstance(vals, np.ndarray)):
+                vals = self._parseColumn(i, vals, row0, invalid)
+            if isArray:
+                c = self._cols[i]
+                self._cols[i] = np.concatenate(
+                    (c, np.asarray(vals, dtype=c.dtype)))
+            else:
+                self._cols[i].extend(vals)
+        self._nrows += n
+        self._buildIndex(row0)
+        self.endInsertRows()
+        return row0
+
+    def text(self, row, col):
+        val = self._cols[col][row]
+        if self._dtypes[col] is float:
+            return floatToStr(val)
+        if self._dtypes[col] is int:
+            return str(val)
+        return val
+
+    def setText(self, row, col, txt):
+        '''
+        returns False if [txt] could not be converted into the column type
+        '''
+        old = self._cols[col][row]
+        try:
+            self._cols[col][row] = self._parse(col, txt)
+        except (ValueError, ZeroDivisionError):
+            return False
+        self._sortKeys.pop(col, None)
+        if col == self._indexCol:
+            self._updateIndex([(row, old)])
+        index = self.index(row, col + self._offs)
+        self.dataChanged.emit(index, index)
+        self.headerDataChanged.emit(QtCore.Qt.Vertical, row, row)
+        return True
+
+    def column(self, col):
+        '''
+        return raw column values (list or np.ndarray)
+        '''
+        return self._cols[col]
+
+    def isEmpty(self, col):
+        '''
+        return bool array, True where cell in column [col] is empty
+        '''
+        c = self._cols[col]
+        if self._dtypes[col] is float:
+            return np.isnan(c)
+        if self._dtypes[col] is int:
+            return np.zeros(len(c), dtype=bool)
+        return np.fromiter((not v for v in c), dtype=bool, count=len(c))
+
+    def setColumn(self, col, values, rows=None):
+        '''
+        set many values of one column at once
+        rows ... [optional] row indices for [values], default: all rows
+        values, which cannot be converted into the column type are ignored
+        '''
+        if rows is None:
+            rows = range(self._nrows)
+        if not len(rows):
+            return
+        c = self._cols[col]
+        changed = []
+        for row, v in zip(rows, values):
+            old = c[row]
+            try:
+                c[row] = self._parse(col, v)
+            except (ValueError, ZeroDivisionError):
+                continue
+            changed.append((row, old))
+        self._sortKeys.pop(col, None)
+        if col == self._indexCol:
+            if len(changed) > self._nrows // 4:
+                self._buildIndex()
+            else:
+                self._updateIndex(changed)
+        r0, r1 = min(rows), max(rows)
+        col += self._offs
+        self.dataChanged.emit(self.index(r0, col), self.index(r1, col))
+        self.headerDataChanged.emit(QtCore.Qt.Vertical, r0, r1)
+
+    def sortKey(self, col):
+        '''
+        return numeric np.ndarray of column [col], which sorts like its values
+        str columns are converted into ranks (cached until column changes)
+        '''
+        c = self._cols[col]
+        if self._dtypes[col] in _ARRAY_TYPES:
+            return c
+        try:
+            return self._sortKeys[col]
+        except KeyError:
+            # np.array chooses the length of the longest string
+            # - nothing is truncated:
+            key = np.unique(np.array(c, dtype=str),
+                            return_inverse=True)[1].ravel()
+            self._sortKeys[col] = key
+            return key
@@ -0,0 +1,149 @@
+from PyQt5 import QtWidgets, QtGui, QtCore
+
+from client.widgets._Base import QMenu
+
+
+class TableView(QtWidgets.QTableView):
+    '''
+    model/view version of base.Table.Table enabling ...
+    delete (only,  multiple items)
+    copy/paste from clipboard (excel) of from same table
+    '''
+
+    def __init__(self, model):
+        super().__init__()
+        self.setModel(model)
+        self._lastCellRange = None
+
+    def rowCount(self):
+        return self.model().rowCount()
+
+    def columnCount(self):
+        return self.model().columnCount()
+
+    def currentRow(self):
+        return self.currentIndex().row()
+
+    def currentColumn(self):
+        return self.currentIndex().column()
+
+    def text(self, row, col):
+        txt = self.model().index(row, col).data()
+        if txt is None:
+            return ''
+        return txt
+
+    def setText(self, row, col, txt):
+        m = self.model()
+        return m.setData(m.index(row, col), txt)
+
+    def selectedRanges(self):
+        return list(self.selectionModel().selection())
+
+    def keyPressEvent(self, evt):
+        if evt.matches(QtGui.QKeySequence.Delete):
+            self.deleteSelection()
+        elif evt.matches(QtGui.QKeySequence.SelectAll):
+            self.selectAll()
+        elif evt.matches(QtGui.QKeySequence.Copy):
+            self.copyToClipboard()
+        elif evt.matches(QtGui.QKeySequence.Paste):
+            self.pasteFromClipboard()
+        else:
+            super().keyPressEvent(evt)
+
+    def createContextMenu(self):
+        m = QMenu()
+        m.addAction("Remove row(s)").triggered.connect(self.removeSelectedRows)
+        m.addAction("Select all").triggered.connect(self.selectAll)
+        return m
+
+    def deleteSelection(self):
+        n = self.visibleColumnCount()
+        rows = []
+        for ran in self.selectedRanges():
+            if ran.width() >= n:
+                rows.extend(range(ran.top(), ran.bottom() + 1))
+            else:
+                for row in range(ran.top(), ran.bottom() + 1):
+                    for col in range(ran.left(), ran.right() + 1):
+                        self.setText(row, col, '')
+        if rows:
+            self.removeRows(rows)
+
+    def visibleColumnCount(self):
+        c = self.columnCount()
+        for col in range(c):
+            if self.isColumnHidden(col):
+                c -= 1
+        return c
+
+    def removeSelectedRows(self):
+        rows = []
+        for ran in self.selectedRanges():
+            rows.extend(range(ran.top(), ran.bottom() + 1))
+        self.removeRows(rows)
+
+    def removeRows(self, rows):
+        self.model().removeRowList(rows)
+
+    def pasteFromClipboard(self):
+        if self._lastCellRange is None:
+            txt = QtWidgets.QApplication.clipboard().text()
+            self.pasteTable(self.strToTable(txt),
+                            self.currentRow(),
+                            self.currentColumn())
+            QtWidgets.QApplication.clipboard().clear()
+        else:
+            self._pasteFromRange(self._lastCellRange,
+                                 self.currentRow(),
+                                 self.currentColumn())
+            self._lastCellRange = None
+
+    def strToTable(self, text, separator='\t'):
+        return [line.split(separator) for line in text.split('\n')
+                if line.split(separator) != ['']]
+
+    def _pasteFromRange(self, rang, startRow, startCol):
+        table = [[self.text(row, col)
+                  for col in range(rang.left(), rang.right() + 1)]
+                 for row in range(rang.top(), rang.bottom() + 1)]
+        self.pasteTable(table, startRow, startCol)
+
+    def pasteTable(self, table, startRow=0, startCol=0):
+        # values outside the table are ignored:
+        rows, cols = self.rowCount(), self.columnCount()
+        for row, line in enumerate(table):
+            r = row + startRow
+            if r >= rows:
+                break
+            for col, text in enumerate(line):
+                c = col + startCol
+                if c < cols:
+                    self.setText(r, c, str(text))
+
+    def copyToClipboard(self, cellrange=None):
+        if cellrange is None:
+            cellrange = self.selectedRanges()[0]
+        self._lastCellRange = cellrange
+        # deselect all other ranges, to show that only the first one will
+        # copied
+        self.selectionModel().select(
+            QtCore.QItemSelection(cellrange.topLeft(), cellrange.bottomRight()),
+            QtCore.QItemSelectionModel.ClearAndSelect)
+        QtWidgets.QApplication.clipboard().setText(self.toStr(cellrange))
+
+    def _getRange(self, cellrange):
+        if cellrange is None:
+            return 0, self.columnCount(), 0, self.rowCount()
+        return (cellrange.left(), cellrange.right() + 1,
+                cellrange.top(), cellrange.bottom() + 1)
+
+    def toStr(self, cellrange=None):
+        return '\n'.join('\t'.join(line)
+                         for line in self.toTable(cellrange)) + '\n'
+
+    def toTable(self, cellrange=None):
+        firstCol, lastCol, firstRow, lastRow = self._getRange(cellrange)
+        return [[self.text(row, col) for col in range(firstCol, lastCol)]
+                for row in range(firstRow, lastRow)]
@@ -4,7 +4,8 @@ from pyqtgraph_karl.imageview.ImageView import ImageView
 from fancytools.os.PathStr import PathStr
 
 import client
-from client.imread import imread
+from client.imageCache import imread
+from client.imread import overview
 from imgProcessor.transformations import toGray
 
 # def _prep(V, path):
@@ -168,20 +169,22 @@ class InlineView_image(ImageView, _InlineBase):
         self.new(path)
         
     def new(self, path):
-        self.img = imread(path)
+        # large images are shown downscaled:
+        self.img, step = overview(imread(path))
+        self._scale = (step, step)
         self._toggleGray(forceGray=True)
 
     def _toggleGray(self, forceGray=False):
         if forceGray or self.image.ndim == 3:
             img = toGray(self.img)
-            self.setImage(img)
+            self.setImage(img, scale=self._scale)
             if self.img.ndim > 2:
                 self.btn.setText('RGB')
             else:
                 self.btn.hide()
             self.ui.histogram.show()
         else:
-            self.setImage(self.img)
+            self.setImage(self.img, scale=self._scale)
             self.btn.setText('Gray')
             self.ui.histogram.hide()
 
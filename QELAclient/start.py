@@ -9,6 +9,7 @@ sys.excepthook = lambda t, v, b: sys.__excepthook__(t, v, b)
 #######################
 
 import importlib
+import multiprocessing
 import os
 import traceback
 
@@ -180,7 +181,9 @@ class _StartThread(QtCore.QThread):
 
 
 if __name__ == '__main__':
-    
+    # needed for process pools (e.g. image meta data) in frozen executables:
+    multiprocessing.freeze_support()
+
     ICON = os.path.join(getcwd(), 'client')
     ICON = os.path.join(ICON, 'media')
     ICON = os.path.join(ICON, 'logo.svg')